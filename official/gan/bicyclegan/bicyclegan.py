@@ -16,6 +16,7 @@ from torch.autograd import Variable
 
 from models import *
 from datasets import *
+from common.amp import MixedPrecision
 
 import torch.nn as nn
 import torch.nn.functional as F
@@ -30,6 +31,7 @@ parser.add_argument("--lr", type=float, default=0.0002, help="adam: learning rat
 parser.add_argument("--b1", type=float, default=0.5, help="adam: decay of first order momentum of gradient")
 parser.add_argument("--b2", type=float, default=0.999, help="adam: decay of first order momentum of gradient")
 parser.add_argument("--n_cpu", type=int, default=8, help="number of cpu threads to use during batch generation")
+parser.add_argument("--packed", action="store_true", help="read <dataset>.records shards from common/records.py")
 parser.add_argument("--img_height", type=int, default=128, help="size of image height")
 parser.add_argument("--img_width", type=int, default=128, help="size of image width")
 parser.add_argument("--channels", type=int, default=3, help="number of image channels")
@@ -38,6 +40,9 @@ parser.add_argument(
     "--sample_interval", type=int, default=400, help="interval between sampling of images from generators"
 )
 parser.add_argument("--checkpoint_interval", type=int, default=-1, help="interval between model checkpoints")
+parser.add_argument(
+    "--precision", type=str, default="fp32", choices=["fp32", "bf16", "fp16"], help="bf16 on CPU or CUDA, fp16 on CUDA"
+)
 opt = parser.parse_args()
 print(opt)
 
@@ -64,6 +69,10 @@ if cuda:
     D_LR = D_LR.cuda()
     mae_loss.cuda()
 
+# Mixed precision, normalization layers stay in float32
+amp = MixedPrecision(opt.precision, "cuda" if cuda else "cpu")
+amp.keep_fp32(generator, encoder, D_VAE, D_LR)
+
 if opt.epoch != 0:
     # Load pretrained models
     generator.load_state_dict(torch.load("saved_models/%s/generator_%d.pth" % (opt.dataset_name, opt.epoch)))
@@ -96,13 +105,13 @@ transforms_ = [
     transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5)),
 ]
 dataloader = DataLoader(
-    ImageDataset("../../data/%s" % opt.dataset_name, transforms_=transforms_),
+    ImageDataset("../../data/%s" % opt.dataset_name, transforms_=transforms_, packed=opt.packed),
     batch_size=opt.batch_size,
     shuffle=True,
     num_workers=opt.n_cpu,
 )
 val_dataloader = DataLoader(
-    ImageDataset("../../data/%s" % opt.dataset_name, transforms_=transforms_, mode="val"),
+    ImageDataset("../../data/%s" % opt.dataset_name, transforms_=transforms_, mode="val", packed=opt.packed),
     batch_size=8,
     shuffle=True,
     num_workers=1,
@@ -165,27 +174,30 @@ for epoch in range(opt.epoch, opt.n_epochs):
         # cVAE-GAN
         # ----------
 
-        # Produce output using encoding of B (cVAE-GAN)
-        mu, logvar = encoder(real_B)
-        encoded_z = reparameterization(mu, logvar)
-        fake_B = generator(real_A, encoded_z)
+        with amp.autocast():
+            # Produce output using encoding of B (cVAE-GAN)
+            mu, logvar = encoder(real_B)
+            encoded_z = reparameterization(mu, logvar)
+            fake_B = generator(real_A, encoded_z)
 
-        # Pixelwise loss of translated image by VAE
-        loss_pixel = mae_loss(fake_B, real_B)
-        # Kullback-Leibler divergence of encoded B
-        loss_kl = torch.sum(0.5 * (mu ** 2 + torch.exp(logvar) - logvar - 1))
-        # Adversarial loss
-        loss_VAE_GAN = D_VAE.compute_loss(fake_B, valid)
+            # Pixelwise loss of translated image by VAE
+            loss_pixel = mae_loss(fake_B, real_B)
+            # Kullback-Leibler divergence of encoded B, summed in float32
+            mu, logvar = mu.float(), logvar.float()
+            loss_kl = torch.sum(0.5 * (mu ** 2 + torch.exp(logvar) - logvar - 1))
+            # Adversarial loss
+            loss_VAE_GAN = D_VAE.compute_loss(fake_B, valid)
 
         # ---------
         # cLR-GAN
         # ---------
 
-        # Produce output using sampled z (cLR-GAN)
-        sampled_z = Variable(Tensor(np.random.normal(0, 1, (real_A.size(0), opt.latent_dim))))
-        _fake_B = generator(real_A, sampled_z)
-        # cLR Loss: Adversarial loss
-        loss_LR_GAN = D_LR.compute_loss(_fake_B, valid)
+        with amp.autocast():
+            # Produce output using sampled z (cLR-GAN)
+            sampled_z = Variable(Tensor(np.random.normal(0, 1, (real_A.size(0), opt.latent_dim))))
+            _fake_B = generator(real_A, sampled_z)
+            # cLR Loss: Adversarial loss
+            loss_LR_GAN = D_LR.compute_loss(_fake_B, valid)
 
         # ----------------------------------
         # Total Loss (Generator + Encoder)
@@ -193,19 +205,20 @@ for epoch in range(opt.epoch, opt.n_epochs):
 
         loss_GE = loss_VAE_GAN + loss_LR_GAN + lambda_pixel * loss_pixel + lambda_kl * loss_kl
 
-        loss_GE.backward(retain_graph=True)
-        optimizer_E.step()
+        amp.backward(loss_GE, retain_graph=True)
+        amp.step(optimizer_E)
 
         # ---------------------
         # Generator Only Loss
         # ---------------------
 
         # Latent L1 loss
-        _mu, _ = encoder(_fake_B)
-        loss_latent = lambda_latent * mae_loss(_mu, sampled_z)
+        with amp.autocast():
+            _mu, _ = encoder(_fake_B)
+            loss_latent = lambda_latent * mae_loss(_mu, sampled_z)
 
-        loss_latent.backward()
-        optimizer_G.step()
+        amp.backward(loss_latent)
+        amp.step(optimizer_G)
 
         # ----------------------------------
         #  Train Discriminator (cVAE-GAN)
@@ -213,10 +226,11 @@ for epoch in range(opt.epoch, opt.n_epochs):
 
         optimizer_D_VAE.zero_grad()
 
-        loss_D_VAE = D_VAE.compute_loss(real_B, valid) + D_VAE.compute_loss(fake_B.detach(), fake)
+        with amp.autocast():
+            loss_D_VAE = D_VAE.compute_loss(real_B, valid) + D_VAE.compute_loss(fake_B.detach(), fake)
 
-        loss_D_VAE.backward()
-        optimizer_D_VAE.step()
+        amp.backward(loss_D_VAE)
+        amp.step(optimizer_D_VAE)
 
         # ---------------------------------
         #  Train Discriminator (cLR-GAN)
@@ -224,10 +238,12 @@ for epoch in range(opt.epoch, opt.n_epochs):
 
         optimizer_D_LR.zero_grad()
 
-        loss_D_LR = D_VAE.compute_loss(real_B, valid) + D_VAE.compute_loss(_fake_B.detach(), fake)
+        with amp.autocast():
+            loss_D_LR = D_VAE.compute_loss(real_B, valid) + D_VAE.compute_loss(_fake_B.detach(), fake)
 
-        loss_D_LR.backward()
-        optimizer_D_LR.step()
+        amp.backward(loss_D_LR)
+        amp.step(optimizer_D_LR)
+        amp.update()
 
         # --------------
         #  Log Progress
@@ -163,7 +163,7 @@ class MultiDiscriminator(nn.Module):
 
     def compute_loss(self, x, gt):
         """Computes the MSE between model output and scalar gt"""
-        loss = sum([torch.mean((out - gt) ** 2) for out in self.forward(x)])
+        loss = sum([torch.mean((out.float() - gt) ** 2) for out in self.forward(x)])
         return loss
 
     def forward(self, x):
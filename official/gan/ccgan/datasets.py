@@ -1,22 +1,24 @@
-import glob
 import random
 import os
+import sys
 import numpy as np
 
 from torch.utils.data import Dataset
-from PIL import Image
 import torchvision.transforms as transforms
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.records import list_images, load_image
+
 class ImageDataset(Dataset):
-    def __init__(self, root, transforms_x=None, transforms_lr=None, mode='train'):
+    def __init__(self, root, transforms_x=None, transforms_lr=None, mode='train', packed=False):
         self.transform_x = transforms.Compose(transforms_x)
         self.transform_lr = transforms.Compose(transforms_lr)
 
-        self.files = sorted(glob.glob('%s/*.*' % root))
+        self.files = list_images(root, packed)
 
     def __getitem__(self, index):
 
-        img = Image.open(self.files[index % len(self.files)])
+        img = load_image(self.files, index % len(self.files))
 
         x = self.transform_x(img)
         x_lr = self.transform_lr(img)
@@ -0,0 +1,189 @@
+"""
+Mixed-precision training of the image-to-image GANs.
+
+``--precision bf16`` runs the forward passes under ``torch.autocast`` in
+bfloat16, on the CPU as well as on CUDA; ``fp16`` (CUDA only) adds a
+``GradScaler``. The training loops use the same calls in every mode:
+
+    >>> amp = MixedPrecision(opt.precision, device)
+    >>> amp.keep_fp32(generator, discriminator)
+    >>> with amp.autocast():
+    ...     loss_G = criterion_GAN(discriminator(generator(real_A)), valid)
+    >>> amp.backward(loss_G)
+    >>> amp.step(optimizer_G)
+    >>> amp.update()
+
+Convolutions run in reduced precision. Autocast already evaluates the MSE
+and L1 losses in float32; ``keep_fp32`` does the same for the normalization
+layers, whose mean and variance lose too many bits in bfloat16.
+
+Step time and peak memory of the CycleGAN and Pix2Pix generators against
+float32 can be measured with:
+
+    $ python3 -m common.amp --batch_size 4 --img_size 128
+
+(``--img_size`` applies to CycleGAN, the Pix2Pix U-Net always uses 256x256.)
+Autocast casts every weight once per step, so the weight-heavy U-Net only
+gains from bfloat16 at batch sizes of a few images and more.
+"""
+import argparse
+import contextlib
+import multiprocessing
+import resource
+import time
+
+import torch
+
+__all__ = ["MixedPrecision"]
+
+DTYPES = {"fp32": None, "bf16": torch.bfloat16, "fp16": torch.float16}
+
+
+def _to_fp32(module, inputs):
+    return tuple(x.float() if torch.is_tensor(x) and x.is_floating_point() else x for x in inputs)
+
+
+def _to_autocast_dtype(module, inputs, output):
+    device_type = output.device.type
+    if torch.is_autocast_enabled(device_type):
+        return output.to(torch.get_autocast_dtype(device_type))
+    return output
+
+
+class MixedPrecision(object):
+    """Autocast context, loss scaling and optimizer steps of one precision mode.
+
+    Arguments:
+        precision (str): ``"fp32"``, ``"bf16"`` or ``"fp16"``
+        device (torch.device or str): device the models are trained on
+    """
+
+    def __init__(self, precision="fp32", device="cpu"):
+        if precision not in DTYPES:
+            raise ValueError("precision must be one of %s, got %r" % (tuple(DTYPES), precision))
+        self.device_type = torch.device(device).type
+        if precision == "fp16" and self.device_type != "cuda":
+            raise ValueError("fp16 needs a CUDA device, use bf16 on the CPU")
+        self.precision = precision
+        self.dtype = DTYPES[precision]
+        # bfloat16 has the exponent range of float32, only float16 gradients underflow
+        self.scaler = torch.amp.GradScaler(self.device_type) if precision == "fp16" else None
+
+    @property
+    def enabled(self):
+        return self.dtype is not None
+
+    def autocast(self):
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return torch.autocast(self.device_type, dtype=self.dtype)
+
+    def keep_fp32(self, *modules):
+        """Runs every ``*Norm*`` layer of ``modules`` in float32, returning its output in the autocast dtype."""
+        if not self.enabled:
+            return
+        for module in modules:
+            for m in module.modules():
+                if m.__class__.__name__.find("Norm") != -1:
+                    m.register_forward_pre_hook(_to_fp32)
+                    m.register_forward_hook(_to_autocast_dtype)
+
+    def backward(self, loss, **kwargs):
+        if self.scaler is not None:
+            loss = self.scaler.scale(loss)
+        loss.backward(**kwargs)
+
+    def step(self, optimizer):
+        if self.scaler is not None:
+            self.scaler.step(optimizer)
+        else:
+            optimizer.step()
+
+    def update(self):
+        """Ends an iteration, after the steps of all optimizers."""
+        if self.scaler is not None:
+            self.scaler.update()
+
+    def state_dict(self):
+        return {} if self.scaler is None else self.scaler.state_dict()
+
+    def load_state_dict(self, state_dict):
+        if self.scaler is not None and state_dict:
+            self.scaler.load_state_dict(state_dict)
+
+
+def _build(name, img_size):
+    if name == "cyclegan":
+        from cyclegan.models import GeneratorResNet, Discriminator
+
+        G = GeneratorResNet((3, img_size, img_size), 9)
+        D = Discriminator((3, img_size, img_size))
+        return G, D, lambda real_A, fake_B: D(fake_B), img_size
+    from pix2pix.models import GeneratorUNet, Discriminator
+
+    # the U-Net downsamples eight times, it needs 256x256 images
+    G = GeneratorUNet()
+    D = Discriminator()
+    return G, D, lambda real_A, fake_B: D(fake_B, real_A), 256
+
+
+def _benchmark(name, precision, batch_size, img_size, iters, queue):
+    torch.manual_seed(0)
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    G, D, discriminate, img_size = _build(name, img_size)
+    G.to(device)
+    D.to(device)
+    amp = MixedPrecision(precision, device)
+    amp.keep_fp32(G, D)
+    optimizer = torch.optim.Adam(G.parameters(), lr=2e-4)
+    real_A = torch.randn(batch_size, 3, img_size, img_size, device=device)
+    real_B = torch.randn(batch_size, 3, img_size, img_size, device=device)
+    criterion_GAN = torch.nn.MSELoss()
+    criterion_pixel = torch.nn.L1Loss()
+
+    def step():
+        optimizer.zero_grad()
+        with amp.autocast():
+            fake_B = G(real_A)
+            pred_fake = discriminate(real_A, fake_B)
+            loss = criterion_GAN(pred_fake, torch.ones_like(pred_fake)) + 10 * criterion_pixel(fake_B, real_B)
+        amp.backward(loss)
+        amp.step(optimizer)
+        amp.update()
+        return loss
+
+    for _ in range(2):
+        step()
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+        torch.cuda.reset_peak_memory_stats()
+    start = time.time()
+    for _ in range(iters):
+        loss = step()
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+        peak = torch.cuda.max_memory_allocated() / 2 ** 20
+    else:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put(((time.time() - start) / iters * 1000, peak, loss.item()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generator step time and peak memory per precision.")
+    parser.add_argument("--batch_size", type=int, default=4, help="size of the batches")
+    parser.add_argument("--img_size", type=int, default=128, help="size of each image dimension")
+    parser.add_argument("--iters", type=int, default=5, help="number of timed generator steps")
+    opt = parser.parse_args()
+
+    precisions = ["fp32", "bf16"] + (["fp16"] if torch.cuda.is_available() else [])
+    # a fresh process per run, so the peak memory of one does not hide another
+    ctx = multiprocessing.get_context("spawn")
+    print("%-10s %-6s %12s %14s %10s" % ("model", "mode", "ms/step", "peak MiB", "G loss"))
+    for name in ("cyclegan", "pix2pix"):
+        for precision in precisions:
+            queue = ctx.Queue()
+            process = ctx.Process(target=_benchmark, args=(name, precision, opt.batch_size, opt.img_size, opt.iters, queue))
+            process.start()
+            ms, peak, loss = queue.get()
+            process.join()
+            print("%-10s %-6s %12.2f %14.1f %10.4f" % (name, precision, ms, peak, loss))
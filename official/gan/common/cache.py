@@ -0,0 +1,168 @@
+"""
+Decoded-image LRU cache shared by DataLoader workers.
+
+Every image is decoded and resized once, then kept as a uint8 array in a
+fixed-slot arena allocated in shared memory. All workers of a DataLoader see
+the same arena, so an image decoded by one worker is a hit for every other.
+When the byte budget is exhausted the least recently used slot is reused.
+
+    >>> dataset = cached(ImageDataset(root, transforms_), max_bytes=2 << 30, size=286)
+    >>> ...
+    >>> print(cache_stats(dataset))
+"""
+import multiprocessing
+
+import numpy as np
+import torch
+from PIL import Image
+
+from .records import load_image
+
+__all__ = ["ImageCache", "cached", "cache_stats"]
+
+# dataset attributes holding the lists built by ``records.list_images``
+FILE_LISTS = ("files", "files_A", "files_B")
+
+
+class ImageCache(object):
+    """LRU cache of decoded, resized images in front of a file list.
+
+    Drop-in replacement for the lists returned by ``list_images``: indexing
+    returns file names and ``load_image(cache, i)`` returns the cached image.
+
+    Arguments:
+        files (list or RecordReader): images to serve
+        max_bytes (int): size of the shared arena in bytes
+        size (int or tuple): an int resizes the shorter side of every image to ``size`` before caching,
+            keeping the aspect ratio like ``transforms.Resize(size)``; ``(height, width)`` resizes to that box
+        mode (str): PIL mode images are converted to, ``"RGB"`` or ``"L"``
+        max_aspect (float): longest aspect ratio a slot holds with an int ``size``; wider
+            images are decoded on every access instead of being cached
+    """
+
+    def __init__(self, files, max_bytes, size, mode="RGB", max_aspect=2.0):
+        self.files = files
+        self.size = size if isinstance(size, int) else tuple(size)
+        self.mode = mode
+        self.channels = 3 if mode == "RGB" else 1
+        if isinstance(self.size, int):
+            slot_bytes = self.size * int(self.size * max_aspect) * self.channels
+        else:
+            slot_bytes = self.size[0] * self.size[1] * self.channels
+        self.slot_bytes = slot_bytes
+        num_slots = min(len(files), max_bytes // slot_bytes)
+        if num_slots < 1:
+            raise ValueError("max_bytes=%d cannot hold a single image of %d bytes" % (max_bytes, slot_bytes))
+
+        # every slot stores its image flat, ``shapes`` holds its height and width
+        self.data = torch.empty((num_slots, slot_bytes), dtype=torch.uint8).share_memory_()
+        self.shapes = torch.zeros((num_slots, 2), dtype=torch.int64).share_memory_()
+        # index -> slot, slot -> index, slot -> last use tick
+        self.slot_of = torch.full((len(files),), -1, dtype=torch.int64).share_memory_()
+        self.owner = torch.full((num_slots,), -1, dtype=torch.int64).share_memory_()
+        self.last_use = torch.zeros(num_slots, dtype=torch.int64).share_memory_()
+        # tick, used slots, hits, misses, evictions
+        self.counters = torch.zeros(5, dtype=torch.int64).share_memory_()
+        self.lock = multiprocessing.Lock()
+
+    def __len__(self):
+        return len(self.files)
+
+    def __getitem__(self, index):
+        return self.files[index]
+
+    def _touch(self, slot):
+        self.counters[0] += 1
+        self.last_use[slot] = self.counters[0]
+
+    def _resized_size(self, width, height):
+        """``(width, height)`` of an image after the resize, the rounding of ``transforms.Resize``."""
+        if not isinstance(self.size, int):
+            return self.size[1], self.size[0]
+        if width <= height:
+            return self.size, int(self.size * height / width)
+        return int(self.size * width / height), self.size
+
+    def array(self, index):
+        """Returns image ``index`` as a ``(height, width, channels)`` uint8 array."""
+        with self.lock:
+            slot = int(self.slot_of[index])
+            if slot >= 0:
+                self._touch(slot)
+                self.counters[2] += 1
+                height, width = self.shapes[slot].tolist()
+                # copy while holding the lock, the slot may be reused right after
+                return self.data[slot, :height * width * self.channels].numpy().reshape(height, width, -1).copy()
+            self.counters[3] += 1
+
+        img = load_image(self.files, index).convert(self.mode)
+        img = img.resize(self._resized_size(*img.size), Image.BICUBIC)
+        array = np.array(img).reshape(img.size[1], img.size[0], self.channels)
+        if array.nbytes > self.slot_bytes:
+            return array
+
+        with self.lock:
+            if int(self.slot_of[index]) < 0:
+                used = int(self.counters[1])
+                if used < len(self.owner):
+                    slot = used
+                    self.counters[1] += 1
+                else:
+                    slot = int(torch.argmin(self.last_use))
+                    self.slot_of[self.owner[slot]] = -1
+                    self.counters[4] += 1
+                self.data[slot, :array.nbytes].copy_(torch.from_numpy(array).view(-1))
+                self.shapes[slot, 0] = array.shape[0]
+                self.shapes[slot, 1] = array.shape[1]
+                self.owner[slot] = index
+                self.slot_of[index] = slot
+                self._touch(slot)
+        return array
+
+    def image(self, index):
+        array = self.array(index)
+        return Image.fromarray(array[:, :, 0] if self.mode == "L" else array)
+
+    def stats(self):
+        """Returns hits, misses, evictions, hit rate and bytes in use."""
+        with self.lock:
+            _, used, hits, misses, evictions = self.counters.tolist()
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "evictions": evictions,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "bytes": used * self.slot_bytes,
+        }
+
+
+def cached(dataset, max_bytes, size, mode="RGB", max_aspect=2.0):
+    """Wraps the file lists of a gan dataset in :class:`ImageCache` objects.
+
+    Works for every dataset that loads images through ``load_image``; the
+    byte budget is split evenly between its lists (``files_A``/``files_B``).
+    ``size`` is the one of the first ``transforms.Resize`` of the dataset, so
+    that resize leaves the cached images unchanged. Must be called before
+    the DataLoader starts its workers.
+    """
+    names = [name for name in FILE_LISTS if hasattr(dataset, name)]
+    if not names:
+        raise ValueError("%s has no file list to cache" % type(dataset).__name__)
+    for name in names:
+        setattr(dataset, name, ImageCache(getattr(dataset, name), max_bytes // len(names), size, mode, max_aspect))
+    return dataset
+
+
+def cache_stats(dataset):
+    """Sums the statistics of all caches attached to ``dataset`` by :func:`cached`."""
+    total = {"hits": 0, "misses": 0, "evictions": 0, "bytes": 0}
+    for name in FILE_LISTS:
+        cache = getattr(dataset, name, None)
+        if isinstance(cache, ImageCache):
+            for key, value in cache.stats().items():
+                if key in total:
+                    total[key] += value
+    lookups = total["hits"] + total["misses"]
+    total["hit_rate"] = total["hits"] / lookups if lookups else 0.0
+    return total
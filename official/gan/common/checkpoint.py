@@ -0,0 +1,287 @@
+"""
+Checkpoints written off the training thread.
+
+:class:`CheckpointManager` takes ``state_dict`` s only, never pickled modules.
+``save`` copies the state of every object to the CPU and returns; a background
+thread serializes it to a temporary name and renames it into place, so a
+crash never leaves a truncated checkpoint behind. Only the last ``keep_last``
+checkpoints are kept.
+
+    >>> checkpoints = CheckpointManager("out", keep_last=3)
+    >>> checkpoints.save(epoch, netG=netG, netD=netD, optimizerG=optimizerG, optimizerD=optimizerD)
+    >>> ...
+    >>> state = checkpoints.load()  # the latest one
+    >>> netG.load_state_dict(state["netG"])
+    >>> checkpoints.close()
+
+``sharded=True`` writes a directory with one file per object instead of one
+file. Objects whose tensors did not change since the previous checkpoint
+(a frozen net, the fixed noise, ...) are hard-linked instead of written again.
+Both formats are loaded with ``torch.load(mmap=True)``, so loading maps the
+tensor storage instead of reading and copying it.
+"""
+import hashlib
+import json
+import os
+import queue
+import shutil
+import threading
+
+import torch
+
+__all__ = ["CheckpointManager", "load_checkpoint"]
+
+INDEX = "index.json"
+
+
+def _snapshot(obj):
+    """Copy of ``obj`` (a state_dict, possibly nested) with every tensor on the CPU."""
+    if hasattr(obj, "state_dict"):
+        obj = obj.state_dict()
+    if torch.is_tensor(obj):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return type(obj)((k, _snapshot(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_snapshot(v) for v in obj)
+    return obj
+
+
+def _digest(obj, h=None):
+    h = h or hashlib.blake2b(digest_size=16)
+    if torch.is_tensor(obj):
+        h.update(("%s%s" % (obj.dtype, tuple(obj.shape))).encode())
+        h.update(obj.contiguous().view(-1).view(torch.uint8).numpy())
+    elif isinstance(obj, dict):
+        for k, v in obj.items():
+            h.update(repr(k).encode())
+            _digest(v, h)
+    elif isinstance(obj, (list, tuple)):
+        for v in obj:
+            _digest(v, h)
+    else:
+        h.update(repr(obj).encode())
+    return h.hexdigest()
+
+
+def _has_tensors(obj):
+    if torch.is_tensor(obj):
+        return True
+    if isinstance(obj, dict):
+        return any(_has_tensors(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_has_tensors(v) for v in obj)
+    return False
+
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def load_checkpoint(path, key=None, map_location="cpu", mmap=True):
+    """Loads a checkpoint file or sharded directory written by :class:`CheckpointManager`.
+
+    ``key`` returns one entry, e.g. ``"netG"``; a file holding a bare
+    ``state_dict`` is returned as it is.
+    """
+    if os.path.isdir(path):
+        with open(os.path.join(path, INDEX)) as f:
+            index = json.load(f)
+        names = [key] if key is not None and key in index["shards"] else list(index["shards"])
+        state = {}
+        for name in names:
+            shard = torch.load(os.path.join(path, index["shards"][name]["file"]), map_location=map_location,
+                               mmap=mmap, weights_only=True)
+            if name == "meta":
+                state.update(shard)
+            else:
+                state[name] = shard
+    else:
+        state = torch.load(path, map_location=map_location, mmap=mmap, weights_only=True)
+    if key is not None and isinstance(state, dict) and key in state:
+        return state[key]
+    return state
+
+
+class CheckpointManager(object):
+    """Saves ``state_dict`` s asynchronously to ``directory/<prefix>_<tag>.pth``.
+
+    Arguments:
+        directory (str): folder of the checkpoints
+        prefix (str): file name prefix
+        keep_last (int): number of checkpoints to keep, None or 0 keeps all
+        sharded (bool): one file per object in a ``<prefix>_<tag>`` directory,
+            unchanged objects are hard-linked from the previous checkpoint
+        background (bool): write from a background thread
+    """
+
+    def __init__(self, directory, prefix="checkpoint", keep_last=None, sharded=False, background=True):
+        self.directory = directory
+        self.prefix = prefix
+        self.keep_last = keep_last
+        self.sharded = sharded
+        os.makedirs(directory, exist_ok=True)
+        self._saved = self._existing()
+        self._last_index = None
+        self._error = None
+        self._queue = None
+        if background:
+            # at most one checkpoint waits while another is written, which bounds the CPU memory
+            self._queue = queue.Queue(maxsize=1)
+            self._thread = threading.Thread(target=self._run, name="gan-checkpoint", daemon=True)
+            self._thread.start()
+
+    def _existing(self):
+        paths = []
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if not name.startswith(self.prefix + "_") or name.endswith(".tmp"):
+                continue
+            if name.endswith(".old"):
+                # a sharded checkpoint moved aside by a write that did not finish
+                if os.path.exists(path[:-len(".old")]):
+                    _remove(path)
+                    continue
+                os.replace(path, path[:-len(".old")])
+                path = path[:-len(".old")]
+            if name.endswith(".pth") or os.path.isfile(os.path.join(path, INDEX)):
+                paths.append(path)
+        return sorted(paths, key=os.path.getmtime)
+
+    def path(self, tag):
+        """Path of the checkpoint ``tag``, in whichever format it was written."""
+        base = os.path.join(self.directory, "%s_%s" % (self.prefix, tag))
+        if os.path.isfile(base + ".pth"):
+            return base + ".pth"
+        if os.path.isdir(base):
+            return base
+        return base if self.sharded else base + ".pth"
+
+    def latest(self):
+        """Path of the newest complete checkpoint, None if there is none."""
+        self._check()
+        return self._saved[-1] if self._saved else None
+
+    def save(self, tag, **objects):
+        """Snapshots ``objects`` (modules, optimizers, schedulers, tensors, values) and queues the write.
+
+        Returns the path the checkpoint will be written to.
+        """
+        self._check()
+        state = {name: _snapshot(obj) for name, obj in objects.items()}
+        path = os.path.join(self.directory, "%s_%s" % (self.prefix, tag))
+        if not self.sharded:
+            path += ".pth"
+        if self._queue is None:
+            self._write(path, state)
+        else:
+            self._queue.put((path, state))
+        return path
+
+    def load(self, tag=None, map_location="cpu", mmap=True):
+        """Loads the checkpoint ``tag``, the latest one by default; None if there is none."""
+        self.wait()
+        path = self.latest() if tag is None else self.path(tag)
+        if path is None:
+            return None
+        return load_checkpoint(path, map_location=map_location, mmap=mmap)
+
+    def _write(self, path, state):
+        tmp = path + ".tmp"
+        _remove(tmp)
+        if self.sharded:
+            self._write_sharded(tmp, state)
+        else:
+            torch.save(state, tmp)
+        # a file is replaced atomically; a directory cannot be, so the old one is moved aside first
+        # and a crash in between leaves it as ``<path>.old``, restored by the next manager
+        if os.path.isdir(path):
+            _remove(path + ".old")
+            os.replace(path, path + ".old")
+        os.replace(tmp, path)
+        _remove(path + ".old")
+        # replaces the checkpoint of the same tag, also if it was written in the other format
+        base = path[:-len(".pth")] if path.endswith(".pth") else path
+        for old in (base, base + ".pth"):
+            if old in self._saved:
+                self._saved.remove(old)
+            if old != path:
+                _remove(old)
+        self._saved.append(path)
+        while self.keep_last and len(self._saved) > self.keep_last:
+            _remove(self._saved.pop(0))
+
+    def _write_sharded(self, tmp, state):
+        os.makedirs(tmp)
+        meta = {name: value for name, value in state.items() if not _has_tensors(value)}
+        shards = {name: value for name, value in state.items() if name not in meta}
+        if meta:
+            shards["meta"] = meta
+        previous = self._previous_index()
+        index = {"format": 1, "shards": {}}
+        for name, value in shards.items():
+            digest = _digest(value)
+            file = name + ".pt"
+            old = previous and previous[1]["shards"].get(name)
+            linked = False
+            if old is not None and old["digest"] == digest:
+                try:
+                    os.link(os.path.join(previous[0], old["file"]), os.path.join(tmp, file))
+                    linked = True
+                except OSError:
+                    pass
+            if not linked:
+                torch.save(value, os.path.join(tmp, file))
+            index["shards"][name] = {"file": file, "digest": digest}
+        with open(os.path.join(tmp, INDEX), "w") as f:
+            json.dump(index, f)
+        self._last_index = (tmp[:-len(".tmp")], index)
+
+    def _previous_index(self):
+        if self._last_index is not None and os.path.isdir(self._last_index[0]):
+            return self._last_index
+        for path in reversed(self._saved):
+            if os.path.isdir(path):
+                with open(os.path.join(path, INDEX)) as f:
+                    return path, json.load(f)
+        return None
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    break
+                if self._error is None:
+                    self._write(*item)
+            except BaseException as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _check(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("writing a checkpoint failed") from error
+
+    def wait(self):
+        """Blocks until every queued checkpoint is written."""
+        if self._queue is not None:
+            self._queue.join()
+        self._check()
+
+    def close(self):
+        if self._queue is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._queue = None
+        self._check()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
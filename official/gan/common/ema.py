@@ -0,0 +1,94 @@
+"""
+Exponential moving average of generator weights.
+
+Sample grids and exported generators come out smoother from the average
+than from the live generator. :class:`EMA` keeps a shadow copy of the
+generator whose parameters are views into one flat, contiguous buffer, and
+updates all of them with one multi-tensor ``lerp`` after the optimizer step:
+
+    >>> ema = EMA(netG, decay=0.999, every=1)
+    >>> for real in dataloader:
+    ...     ...
+    ...     optimizerG.step()
+    ...     ema.update()
+    >>> sampler = AsyncSampler(nets={"netG": ema.module})
+    >>> torch.save(ema.module.state_dict(), "netG_ema.pth")
+
+``every=k`` updates every k-th call with ``decay ** k``, which keeps the
+averaging horizon in steps unchanged. ``decay=0`` disables the average and
+``ema.module`` is then the live generator itself, so the training scripts
+need no separate code path.
+"""
+import copy
+
+import torch
+
+__all__ = ["EMA"]
+
+
+class EMA(object):
+    """Shadow copy of ``model`` updated as ``shadow = decay * shadow + (1 - decay) * model``.
+
+    Arguments:
+        model (nn.Module): the trained generator
+        decay (float): weight of the running average, 0 disables it
+        every (int): update every ``every`` calls, with ``decay ** every``
+
+    Buffers (e.g. BatchNorm running statistics) are copied, not averaged.
+    """
+
+    def __init__(self, model, decay=0.999, every=1):
+        if not 0 <= decay < 1:
+            raise ValueError("decay must be in [0, 1), got %r" % decay)
+        if every < 1:
+            raise ValueError("every must be >= 1, got %d" % every)
+        self.model = model
+        self.decay = decay
+        self.every = every
+        self.steps = 0
+        if not self.enabled:
+            self.module = model
+            return
+
+        self.module = copy.deepcopy(model).eval().requires_grad_(False)
+        shadow = list(self.module.parameters())
+        dtypes = {p.dtype for p in shadow}
+        if len(dtypes) > 1:
+            raise ValueError("EMA needs parameters of one dtype, got %s" % sorted(map(str, dtypes)))
+        # one contiguous buffer, every shadow parameter is a view into it
+        self.flat = torch.cat([p.detach().reshape(-1) for p in shadow]) if shadow else torch.empty(0)
+        offset = 0
+        for p in shadow:
+            p.data = self.flat[offset:offset + p.numel()].view_as(p)
+            offset += p.numel()
+        self._shadow = shadow
+        self._params = list(model.parameters())
+        self._shadow_buffers = [b for b in self.module.buffers()]
+        self._buffers = list(model.buffers())
+
+    @property
+    def enabled(self):
+        return self.decay > 0
+
+    @torch.no_grad()
+    def update(self):
+        """Call after every optimizer step of the generator."""
+        self.steps += 1
+        if not self.enabled or self.steps % self.every != 0:
+            return
+        if self._shadow:
+            torch._foreach_lerp_(self._shadow, self._params, 1 - self.decay ** self.every)
+        if self._buffers:
+            torch._foreach_copy_(self._shadow_buffers, self._buffers)
+
+    def state_dict(self):
+        state = {"decay": self.decay, "every": self.every, "steps": self.steps}
+        if self.enabled:
+            state["module"] = self.module.state_dict()
+        return state
+
+    def load_state_dict(self, state_dict):
+        self.steps = state_dict["steps"]
+        if self.enabled and "module" in state_dict:
+            # copies in place, the parameters stay views into the flat buffer
+            self.module.load_state_dict(state_dict["module"])
@@ -0,0 +1,563 @@
+"""
+One training loop for the unconditional GANs.
+
+The discriminator/generator update, the loss and the regularizer are shared
+by every model registered in ``common.models``; only the nets and their
+defaults differ. The loop never calls ``.item()``: losses and phase times go
+to a ``common.metrics.Metrics`` that is flushed every ``log_interval`` steps.
+Checkpoints hold ``state_dict`` s only and are written by a background thread
+(``common.checkpoint``). They also hold the random number generators and
+the position in the epoch, so ``--resume`` continues at the batch the
+checkpoint was written at (``common.resume``). Sample grids are rendered by a
+background process (``common.sampler``); with ``--ema_decay`` they come from
+an exponential moving average of the generator, which is saved next to it.
+
+    >>> netG, netD = build_model("dcgan", nz=100, channels=1, image_size=28)
+    >>> trainer = Trainer(netG, netD, optimizerG, optimizerD, loss="bce", nz=100, outf="out")
+    >>> trainer.fit(dataloader, epochs=25)
+
+or from the command line:
+
+    $ python3 -m common.engine --model wgan_gp --dataset cifar10 --dataroot ../data/cifar10 --cuda
+    $ python3 -m common.engine --model dcgan --dataset fake --max_steps 200   # step time only
+"""
+import argparse
+import itertools
+import os
+import random
+import time
+
+import torch
+import torch.backends.cudnn as cudnn
+import torch.nn.functional as F
+import torch.optim as optim
+import torch.utils.data
+import torchvision.datasets as dset
+import torchvision.transforms as transforms
+
+from .checkpoint import CheckpointManager, load_checkpoint
+from .ema import EMA
+from .metrics import Metrics
+from .models import MODELS, build_model
+from .penalty import GradientPenalty
+from .sampler import AsyncSampler
+from .resume import ResumableSampler, rng_state, set_rng_state
+
+__all__ = ["LOSSES", "GANLoss", "BCELoss", "LSGANLoss", "WassersteinLoss", "BEGANLoss", "EBGANLoss", "SoftmaxLoss",
+           "Trainer"]
+
+
+class GANLoss(object):
+    """Adversarial loss of the discriminator and generator, given raw ``D`` outputs."""
+
+    def discriminator(self, real_validity, fake_validity):
+        raise NotImplementedError
+
+    def generator(self, fake_validity):
+        raise NotImplementedError
+
+    def state_dict(self):
+        """State carried from step to step, saved with the checkpoints."""
+        return {}
+
+    def load_state_dict(self, state):
+        pass
+
+
+class BCELoss(GANLoss):
+    """Non-saturating loss of the original GAN, on logits: softplus(-x) == -log(sigmoid(x))."""
+
+    def discriminator(self, real_validity, fake_validity):
+        return F.softplus(-real_validity).mean() + F.softplus(fake_validity).mean()
+
+    def generator(self, fake_validity):
+        return F.softplus(-fake_validity).mean()
+
+
+class LSGANLoss(GANLoss):
+    def discriminator(self, real_validity, fake_validity):
+        return 0.5 * ((real_validity - 1).pow(2).mean() + fake_validity.pow(2).mean())
+
+    def generator(self, fake_validity):
+        return (fake_validity - 1).pow(2).mean()
+
+
+class WassersteinLoss(GANLoss):
+    def discriminator(self, real_validity, fake_validity):
+        return fake_validity.mean() - real_validity.mean()
+
+    def generator(self, fake_validity):
+        return -fake_validity.mean()
+
+
+class BEGANLoss(GANLoss):
+    """Boundary equilibrium loss on the reconstruction errors of an autoencoder ``D``.
+
+    ``k`` balances the fake term against the real one and follows
+    ``gamma * real - fake``; it stays a device tensor, like the losses.
+    """
+
+    def __init__(self, gamma=0.75, lambda_k=0.001):
+        self.gamma = gamma
+        self.lambda_k = lambda_k
+        self.k = torch.zeros(())
+
+    def discriminator(self, real_validity, fake_validity):
+        real, fake = real_validity.mean(), fake_validity.mean()
+        self.k = self.k.to(real.device)
+        errD = real - self.k * fake
+        with torch.no_grad():
+            self.k = (self.k + self.lambda_k * (self.gamma * real - fake)).clamp_(0, 1)
+        return errD
+
+    def generator(self, fake_validity):
+        return fake_validity.mean()
+
+    def state_dict(self):
+        return {"k": self.k}
+
+    def load_state_dict(self, state):
+        self.k = state["k"]
+
+
+class EBGANLoss(GANLoss):
+    """Margin loss on the reconstruction errors of an autoencoder ``D`` returning ``(error, embedding)``.
+
+    The generator loss adds the pulling-away term, the mean squared cosine
+    similarity of the fake embeddings, which keeps the samples apart.
+    """
+
+    def __init__(self, margin=1.0, pullaway_weight=0.1):
+        self.margin = margin
+        self.pullaway_weight = pullaway_weight
+
+    def discriminator(self, real_validity, fake_validity):
+        return real_validity[0].mean() + F.relu(self.margin - fake_validity[0].mean())
+
+    def generator(self, fake_validity):
+        error, embedding = fake_validity
+        return error.mean() + self.pullaway_weight * self.pullaway(embedding)
+
+    @staticmethod
+    def pullaway(embedding):
+        normalized = F.normalize(embedding, dim=1)
+        similarity = normalized @ normalized.t()
+        n = embedding.size(0)
+        return (similarity.sum() - n) / (n * (n - 1))
+
+
+class SoftmaxLoss(GANLoss):
+    """Softmax GAN: cross entropy of a softmax over ``-D`` of the whole real and fake batch.
+
+    The generator target is uniform over all ``2N`` images, so its loss also
+    needs ``D`` of the real batch; it reuses the one of the last discriminator step.
+    """
+
+    def __init__(self):
+        self.real_validity = None
+
+    def discriminator(self, real_validity, fake_validity):
+        self.real_validity = real_validity.detach()
+        log_z = torch.logsumexp(-torch.cat([real_validity, fake_validity]), 0)
+        return real_validity.mean() + log_z
+
+    def generator(self, fake_validity):
+        validity = torch.cat([self.real_validity, fake_validity])
+        return validity.mean() + torch.logsumexp(-validity, 0)
+
+
+LOSSES = {
+    "bce": BCELoss,
+    "lsgan": LSGANLoss,
+    "wgan": WassersteinLoss,
+    "began": BEGANLoss,
+    "ebgan": EBGANLoss,
+    "softmax": SoftmaxLoss,
+}
+
+
+LOG_FORMAT = (
+    "[{epoch}/{epochs}][{i}/{num_batches}] Loss_D: {errD:.4f} Loss_G: {errG:.4f} "
+    "data: {data_ms:.1f}ms D: {d_step_ms:.1f}ms G: {g_step_ms:.1f}ms {img_s:.1f} img/s"
+)
+
+
+def _set_requires_grad(net, flag):
+    for p in net.parameters():
+        p.requires_grad_(flag)
+
+
+class Trainer(object):
+    """Alternating discriminator/generator updates shared by every registered model.
+
+    Arguments:
+        netG, netD (nn.Module): generator taking ``(N, nz)`` noise and discriminator returning ``(N,)`` logits,
+            or the outputs ``loss`` expects
+        optimizerG, optimizerD (Optimizer): optimizers of ``netG`` and ``netD``
+        loss (str or GANLoss): key of :data:`LOSSES` or a loss object
+        penalty (GradientPenalty): added to the discriminator loss
+        nz (int): size of the latent vector
+        n_critic (int): discriminator steps per generator step
+        clip_value (float): clamp the discriminator weights to ``[-clip_value, clip_value]`` (WGAN)
+        device (torch.device): device of the nets
+        outf (str): folder of samples and checkpoints
+        log_interval (int): steps between log lines, ignored if ``metrics`` is given
+        sample_interval (int): steps between sample grids of a fixed noise batch, 0 disables
+        checkpoint_interval (int): epochs between checkpoints, 0 disables
+        checkpoint_batches (int): batches between checkpoints within an epoch, 0 disables
+        num_samples (int): images per sample grid
+        metrics (Metrics): receives losses and data/d_step/g_step times, one is created if not given
+        ema (EMA): average of ``netG`` updated after every generator step and used for the samples
+        checkpoints (CheckpointManager): writes the checkpoints, one saving to ``outf`` is created if not given
+        grid_sampler (AsyncSampler): renders the sample grids of ``ema.module``, one is created if not
+            given; it is closed at the end of :meth:`fit`
+    """
+
+    def __init__(self, netG, netD, optimizerG, optimizerD, loss="bce", penalty=None, nz=100, n_critic=1,
+                 clip_value=None, device="cpu", outf=".", log_interval=100, sample_interval=500,
+                 checkpoint_interval=1, checkpoint_batches=0, num_samples=64, metrics=None, ema=None,
+                 checkpoints=None, grid_sampler=None):
+        self.netG = netG
+        self.netD = netD
+        self.optimizerG = optimizerG
+        self.optimizerD = optimizerD
+        self.loss = LOSSES[loss]() if isinstance(loss, str) else loss
+        self.penalty = penalty
+        self.nz = nz
+        self.n_critic = n_critic
+        self.clip_value = clip_value
+        self.device = torch.device(device)
+        self.outf = outf
+        self.sample_interval = sample_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_batches = checkpoint_batches
+        self.metrics = metrics or Metrics(interval=log_interval, fmt=LOG_FORMAT)
+        self.ema = ema or EMA(netG, decay=0)
+        self.checkpoints = checkpoints
+        self.grid_sampler = grid_sampler
+        self.fixed_noise = torch.randn(num_samples, nz, device=self.device)
+        self.epoch = 0
+        self.step = 0
+        # batches of ``self.epoch`` already trained on
+        self.batch = 0
+        self.sampler = None
+        self._sampler_state = None
+
+    def noise(self, n):
+        return torch.randn(n, self.nz, device=self.device)
+
+    def d_step(self, real, fake):
+        """One discriminator update on ``real`` and detached ``fake`` images."""
+        self.optimizerD.zero_grad(set_to_none=True)
+        div = self.penalty is not None and self.penalty.mode == "wgan-div"
+        if div:
+            real = real.requires_grad_(True)
+            fake = fake.requires_grad_(True)
+        real_validity = self.netD(real)
+        fake_validity = self.netD(fake)
+        errD = self.loss.discriminator(real_validity, fake_validity)
+        if div:
+            errD = errD + self.penalty(self.netD, real, fake, real_validity, fake_validity)
+        elif self.penalty is not None:
+            errD = errD + self.penalty(self.netD, real, fake)
+        errD.backward()
+        self.optimizerD.step()
+        if self.clip_value is not None:
+            with torch.no_grad():
+                for p in self.netD.parameters():
+                    p.clamp_(-self.clip_value, self.clip_value)
+        return errD.detach()
+
+    def g_step(self, fake):
+        """One generator update; ``D`` is frozen so its weight gradients are never computed."""
+        self.optimizerG.zero_grad(set_to_none=True)
+        _set_requires_grad(self.netD, False)
+        try:
+            errG = self.loss.generator(self.netD(fake))
+            errG.backward()
+        finally:
+            _set_requires_grad(self.netD, True)
+        self.optimizerG.step()
+        self.ema.update()
+        return errG.detach()
+
+    def train_step(self, real):
+        """Returns ``(errD, errG)`` as device tensors, ``errG`` is None on critic-only steps."""
+        real = real.to(self.device, non_blocking=True)
+        update_g = self.step % self.n_critic == 0
+        with self.metrics.phase("g_step"):
+            if update_g:
+                # one generator forward serves both updates
+                fake = self.netG(self.noise(real.size(0)))
+            else:
+                with torch.no_grad():
+                    fake = self.netG(self.noise(real.size(0)))
+        with self.metrics.phase("d_step"):
+            errD = self.d_step(real, fake.detach())
+        errG = None
+        if update_g:
+            with self.metrics.phase("g_step"):
+                errG = self.g_step(fake)
+        self.step += 1
+        return errD, errG
+
+    def sample(self, path):
+        """Queues the grid of ``fixed_noise`` for ``path``, it is dropped if the sampler falls behind."""
+        if self.grid_sampler is None:
+            self.grid_sampler = AsyncSampler(nets={"netG": self.ema.module})
+        self.grid_sampler.submit(path, self.fixed_noise, normalize=True)
+
+    def state_dict(self):
+        return {
+            "epoch": self.epoch,
+            "step": self.step,
+            "batch": self.batch,
+            "sampler": None if self.sampler is None else self.sampler.state_dict(),
+            "rng": rng_state(),
+            "netG": self.netG.state_dict(),
+            "netD": self.netD.state_dict(),
+            "optimizerG": self.optimizerG.state_dict(),
+            "optimizerD": self.optimizerD.state_dict(),
+            "fixed_noise": self.fixed_noise,
+            "ema": self.ema.state_dict(),
+            "loss": self.loss.state_dict(),
+        }
+
+    def load_state_dict(self, state):
+        self.netG.load_state_dict(state["netG"])
+        self.netD.load_state_dict(state["netD"])
+        self.optimizerG.load_state_dict(state["optimizerG"])
+        self.optimizerD.load_state_dict(state["optimizerD"])
+        self.fixed_noise = state["fixed_noise"].to(self.device)
+        if "ema" in state:
+            self.ema.load_state_dict(state["ema"])
+        if state.get("loss"):
+            self.loss.load_state_dict(state["loss"])
+        self.epoch = state["epoch"]
+        self.step = state["step"]
+        self.batch = state.get("batch", 0)
+        # applied to the sampler of the dataloader passed to ``fit``
+        self._sampler_state = state.get("sampler")
+        if "rng" in state:
+            set_rng_state(state["rng"])
+
+    def save_checkpoint(self, path):
+        torch.save(self.state_dict(), path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    def load_checkpoint(self, path):
+        """Loads a checkpoint file, or a sharded checkpoint directory."""
+        self.load_state_dict(load_checkpoint(path, map_location=self.device))
+
+    def fit(self, dataloader, epochs, max_steps=None):
+        """Trains from ``self.epoch`` up to ``epochs``, or until ``max_steps`` total steps.
+
+        A resumed epoch starts at batch ``self.batch``. With a :class:`ResumableSampler` the skipped
+        batches are not loaded at all, otherwise they are loaded and dropped.
+        """
+        try:
+            self._fit(dataloader, epochs, max_steps)
+        finally:
+            if self.grid_sampler is not None:
+                # waits for the queued grids
+                self.grid_sampler.close()
+                self.grid_sampler = None
+
+    def _fit(self, dataloader, epochs, max_steps):
+        os.makedirs(self.outf, exist_ok=True)
+        if self.checkpoints is None:
+            self.checkpoints = CheckpointManager(self.outf)
+        sampler = getattr(dataloader, "sampler", None)
+        if isinstance(sampler, ResumableSampler):
+            self.sampler = sampler
+            if self._sampler_state is not None:
+                sampler.load_state_dict(self._sampler_state)
+                self._sampler_state = None
+        num_batches = len(dataloader)
+        while self.epoch < epochs:
+            epoch = self.epoch
+            start = self.batch
+            if self.sampler is not None:
+                self.sampler.set_epoch(epoch, start * dataloader.batch_size)
+                batches = dataloader
+            else:
+                batches = itertools.islice(dataloader, start, None)
+            end = time.perf_counter()
+            for i, batch in enumerate(batches, start):
+                real = batch[0] if isinstance(batch, (tuple, list)) else batch
+                self.metrics.add_time("data", time.perf_counter() - end)
+
+                errD, errG = self.train_step(real)
+                self.metrics.update(errD=errD)
+                if errG is not None:
+                    self.metrics.update(errG=errG)
+
+                if self.sample_interval and self.step % self.sample_interval == 0:
+                    with self.metrics.phase("sample"):
+                        self.sample(os.path.join(self.outf, "fake_samples_step_%d.png" % self.step))
+
+                self.metrics.step(images=real.size(0), epoch=epoch + 1, epochs=epochs, i=i, num_batches=num_batches)
+                self.batch = i + 1
+                if max_steps is not None and self.step >= max_steps:
+                    return
+                if self.checkpoint_batches and self.batch % self.checkpoint_batches == 0 and self.batch < num_batches:
+                    self.checkpoints.save("epoch_%d_batch_%d" % (epoch, self.batch), **self.state_dict())
+                end = time.perf_counter()
+            self.epoch = epoch + 1
+            self.batch = 0
+            if self.checkpoint_interval and self.epoch % self.checkpoint_interval == 0:
+                # copied to the CPU here, serialized and written in the background
+                self.checkpoints.save("epoch_%d" % self.epoch, **self.state_dict())
+
+
+def make_dataset(name, root, image_size, size=10000):
+    """Returns ``(dataset, channels)`` normalized to [-1, 1]."""
+    channels = 1 if name == "mnist" else 3
+    transform = transforms.Compose([
+        transforms.Resize(image_size),
+        transforms.CenterCrop(image_size),
+        transforms.ToTensor(),
+        transforms.Normalize([0.5] * channels, [0.5] * channels),
+    ])
+    if name == "mnist":
+        return dset.MNIST(root=root, download=True, transform=transform), channels
+    if name == "cifar10":
+        return dset.CIFAR10(root=root, download=True, transform=transform), channels
+    if name == "cifar100":
+        return dset.CIFAR100(root=root, download=True, transform=transform), channels
+    if name == "folder":
+        return dset.ImageFolder(root=root, transform=transform), channels
+    if name == "fake":
+        return dset.FakeData(size=size, image_size=(channels, image_size, image_size), transform=transform), channels
+    raise ValueError("unknown dataset %r" % name)
+
+
+def make_optimizer(name, params, lr, betas):
+    if name == "adam":
+        return optim.Adam(params, lr=lr, betas=betas)
+    if name == "rmsprop":
+        return optim.RMSprop(params, lr=lr)
+    raise ValueError("unknown optimizer %r" % name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train a registered GAN with the shared engine.")
+    parser.add_argument("--model", required=True, choices=sorted(MODELS), help="registered model")
+    parser.add_argument("--dataset", default="cifar10", help="mnist | cifar10 | cifar100 | folder | fake")
+    parser.add_argument("--dataroot", default="../data", help="path to dataset")
+    parser.add_argument("--workers", type=int, default=4, help="number of data loading workers")
+    parser.add_argument("--batchSize", type=int, default=64, help="inputs batch size")
+    parser.add_argument("--imageSize", type=int, default=32, help="the height / width of the inputs image to network")
+    parser.add_argument("--nz", type=int, default=100, help="size of the latent z vector")
+    parser.add_argument("--ngf", type=int, default=64)
+    parser.add_argument("--ndf", type=int, default=64)
+    parser.add_argument("--niter", type=int, default=25, help="number of epochs to train for")
+    parser.add_argument("--max_steps", type=int, help="stop after this many steps, e.g. to time a model")
+    parser.add_argument("--loss", choices=sorted(LOSSES), help="adversarial loss, default: the model's")
+    parser.add_argument("--penalty", choices=["none", "wgan-gp", "dragan", "wgan-div"], help="gradient penalty")
+    parser.add_argument("--gp_weight", type=float, help="penalty weight, default: 10, 2 for wgan-div")
+    parser.add_argument("--gp_every", type=int, default=1, help="apply the gradient penalty every k critic steps")
+    parser.add_argument("--n_critic", type=int, help="number of training steps for discriminator per iter")
+    parser.add_argument("--clip_value", type=float, help="lower and upper clip value for disc. weights")
+    parser.add_argument("--optimizer", choices=["adam", "rmsprop"], help="optimizer, default: the model's")
+    parser.add_argument("--lr", type=float, help="learning rate, default: the model's")
+    parser.add_argument("--beta1", type=float, help="beta1 for adam")
+    parser.add_argument("--beta2", type=float, help="beta2 for adam")
+    parser.add_argument("--cuda", action="store_true", help="enables cuda")
+    parser.add_argument("--outf", default=".", help="folder to output images and model checkpoints")
+    parser.add_argument("--manualSeed", type=int, help="manual seed")
+    parser.add_argument("--log_interval", type=int, default=100, help="steps between log lines")
+    parser.add_argument("--metrics_file", default="", help="also write every log line to this .csv or .jsonl file")
+    parser.add_argument("--sample_interval", type=int, default=500, help="steps between sample grids, 0 disables")
+    parser.add_argument("--checkpoint_interval", type=int, default=1, help="epochs between checkpoints, 0 disables")
+    parser.add_argument("--checkpoint_batches", type=int, default=0,
+                        help="batches between checkpoints within an epoch, 0 disables")
+    parser.add_argument("--resume", default="",
+                        help="checkpoint file or directory to continue training from, 'latest' for the newest in outf")
+    parser.add_argument("--keep_checkpoints", type=int, default=0, help="keep only the last n checkpoints, 0 keeps all")
+    parser.add_argument("--sharded_checkpoints", action="store_true",
+                        help="one file per net/optimizer, unchanged ones are hard-linked to the previous checkpoint")
+    parser.add_argument("--ema_decay", type=float, default=0, help="decay of the generator weight average, 0 disables")
+    parser.add_argument("--ema_every", type=int, default=1, help="update the generator average every k generator steps")
+    opt = parser.parse_args(argv)
+
+    defaults = MODELS[opt.model].defaults
+    loss = opt.loss or defaults.get("loss", "bce")
+    penalty = opt.penalty or defaults.get("penalty", "none")
+    n_critic = opt.n_critic or defaults.get("n_critic", 1)
+    clip_value = opt.clip_value if opt.clip_value is not None else defaults.get("clip_value")
+    optimizer = opt.optimizer or defaults.get("optimizer", "adam")
+    lr = opt.lr or defaults.get("lr", 0.0002)
+    betas = defaults.get("betas", (0.5, 0.999))
+    betas = (opt.beta1 if opt.beta1 is not None else betas[0], opt.beta2 if opt.beta2 is not None else betas[1])
+    print(opt)
+
+    if opt.manualSeed is None:
+        opt.manualSeed = random.randint(1, 10000)
+    print("Random Seed: ", opt.manualSeed)
+    random.seed(opt.manualSeed)
+    torch.manual_seed(opt.manualSeed)
+
+    cudnn.benchmark = True
+
+    if torch.cuda.is_available() and not opt.cuda:
+        print("WARNING: You have a CUDA device, so you should probably run with --cuda")
+    device = torch.device("cuda:0" if opt.cuda else "cpu")
+
+    dataset, channels = make_dataset(opt.dataset, opt.dataroot, opt.imageSize)
+    dataloader = torch.utils.data.DataLoader(
+        dataset,
+        batch_size=opt.batchSize,
+        sampler=ResumableSampler(dataset),
+        num_workers=opt.workers,
+        pin_memory=opt.cuda,
+        drop_last=True,
+        persistent_workers=opt.workers > 0,
+        # worker seeds come from here, not from the global generator restored on --resume
+        generator=torch.Generator().manual_seed(opt.manualSeed),
+    )
+
+    netG, netD = build_model(opt.model, nz=opt.nz, channels=channels, image_size=opt.imageSize, ngf=opt.ngf, ndf=opt.ndf)
+    netG.to(device)
+    netD.to(device)
+    optimizerG = make_optimizer(optimizer, netG.parameters(), lr, betas)
+    optimizerD = make_optimizer(optimizer, netD.parameters(), lr, betas)
+
+    gradient_penalty = None
+    if penalty != "none":
+        weight = opt.gp_weight or (2.0 if penalty == "wgan-div" else 10.0)
+        gradient_penalty = GradientPenalty(penalty, weight=weight, every=opt.gp_every)
+
+    trainer = Trainer(
+        netG,
+        netD,
+        optimizerG,
+        optimizerD,
+        loss=loss,
+        penalty=gradient_penalty,
+        nz=opt.nz,
+        n_critic=n_critic,
+        clip_value=clip_value,
+        device=device,
+        outf=opt.outf,
+        sample_interval=opt.sample_interval,
+        checkpoint_interval=opt.checkpoint_interval,
+        checkpoint_batches=opt.checkpoint_batches,
+        metrics=Metrics(interval=opt.log_interval, fmt=LOG_FORMAT, path=opt.metrics_file or None),
+        ema=EMA(netG, decay=opt.ema_decay, every=opt.ema_every),
+        checkpoints=CheckpointManager(opt.outf, keep_last=opt.keep_checkpoints, sharded=opt.sharded_checkpoints),
+    )
+    resume = trainer.checkpoints.latest() if opt.resume == "latest" else opt.resume
+    if resume:
+        print("Resuming from", resume)
+        trainer.load_checkpoint(resume)
+    try:
+        trainer.fit(dataloader, opt.niter, max_steps=opt.max_steps)
+    finally:
+        trainer.metrics.close()
+        trainer.checkpoints.close()
+    return trainer
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Non-blocking training metrics.
+
+Losses are summed on the device they were computed on; nothing is copied to
+the host until a flush every ``interval`` steps, and the copy, formatting and
+file writes of a flush run in a background thread. Per-phase wall times (data
+wait, D step, G step, ...) are accumulated next to the losses.
+
+    >>> metrics = Metrics(interval=50, path="log.csv", fmt="[D loss: {loss_D:f}] [G loss: {loss_G:f}]")
+    >>> for i, batch in enumerate(dataloader):
+    ...     with metrics.phase("g_step"):
+    ...         ...
+    ...     metrics.update(loss_D=loss_D, loss_G=loss_G)
+    ...     metrics.step(images=batch_size, epoch=epoch, batch=i)
+    >>> metrics.close()
+
+Every flushed record holds the mean of each metric over the window, the mean
+``<phase>_ms`` of every phase, ``img_s`` and, if ``total_steps`` is known, ``eta``.
+``path`` ending in ``.csv`` writes a CSV file, anything else JSON lines.
+"""
+import contextlib
+import csv
+import datetime
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import torch
+
+__all__ = ["Metrics"]
+
+
+class _Record(dict):
+    # metrics missing from a window, e.g. a generator loss with n_critic > interval
+    def __missing__(self, key):
+        return float("nan")
+
+
+class _CSVLog(object):
+    """Appends records to a CSV file whose columns grow with the records.
+
+    The columns start as the header of an existing file, so a resumed run
+    appends under it. A record with a new key rewrites the file once with
+    the extended header; older rows leave the new columns empty.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fieldnames = []
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, newline="") as f:
+                self.fieldnames = next(csv.reader(f), [])
+        self.f = open(path, "a", newline="")
+        self.writer = csv.DictWriter(self.f, fieldnames=self.fieldnames, restval="")
+
+    def _extend(self, fieldnames):
+        self.f.close()
+        rows = []
+        if os.path.exists(self.path):
+            with open(self.path, newline="") as f:
+                rows = list(csv.DictReader(f))
+        with open(self.path + ".tmp", "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, restval="")
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(self.path + ".tmp", self.path)
+        self.fieldnames = fieldnames
+        self.f = open(self.path, "a", newline="")
+        self.writer = csv.DictWriter(self.f, fieldnames=fieldnames, restval="")
+
+    def write(self, record):
+        new = [key for key in record if key not in self.fieldnames]
+        if new:
+            self._extend(self.fieldnames + new)
+        self.writer.writerow(record)
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class Metrics(object):
+    """Accumulates metrics on the device and writes them from a background thread.
+
+    Arguments:
+        interval (int): steps between flushes, the only host/device synchronization
+        fmt (str): ``str.format`` template of the console line, filled with the
+            flushed record; None prints every field
+        path (str): ``.csv`` or ``.jsonl`` file every record is appended to
+        total_steps (int): steps of the whole run, to estimate ``eta``
+        step (int): step to start counting from, e.g. when resuming
+        stream (file): console stream, None disables console output
+        end (str): written after every console line, ``"\\r"``-style progress lines pass ``""``
+        synchronize (bool): wait for the device at the end of each phase, so phase
+            times are exact instead of host-side launch times
+    """
+
+    def __init__(self, interval=100, fmt=None, path=None, total_steps=None, step=0, stream=sys.stdout, end="\n",
+                 synchronize=False):
+        self.interval = interval
+        self.fmt = fmt
+        self.path = path
+        self.total_steps = total_steps
+        self.steps = step
+        self.stream = stream
+        self.end = end
+        self.synchronize = synchronize and torch.cuda.is_available()
+        self._reset()
+        self._queue = queue.Queue(maxsize=64)
+        self._thread = threading.Thread(target=self._run, name="gan-metrics", daemon=True)
+        self._thread.start()
+
+    def _reset(self):
+        self._sums = {}
+        self._counts = {}
+        self._times = {}
+        self._window_steps = 0
+        self._images = 0
+        self._fields = {}
+        self._start = time.perf_counter()
+
+    def update(self, **values):
+        """Adds tensors (kept on their device) or numbers to the running sums."""
+        for name, value in values.items():
+            if torch.is_tensor(value):
+                value = value.detach()
+            total = self._sums.get(name)
+            # out of place: a flushed sum is still read by the writer thread
+            self._sums[name] = value if total is None else total + value
+            self._counts[name] = self._counts.get(name, 0) + 1
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Adds the wall time of the ``with`` block to phase ``name``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.synchronize:
+                torch.cuda.synchronize()
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        self._times[name] = self._times.get(name, 0.0) + seconds
+
+    def step(self, images=0, **fields):
+        """Ends a training step; flushes with ``fields`` (epoch, batch, ...) every ``interval`` steps."""
+        self.steps += 1
+        self._window_steps += 1
+        self._images += images
+        self._fields = fields
+        if self.steps % self.interval == 0:
+            self.flush(**fields)
+
+    def flush(self, **fields):
+        if not self._window_steps:
+            return
+        fields = fields or self._fields
+        elapsed = time.perf_counter() - self._start
+        record = {"step": self.steps}
+        record.update(fields)
+        for name, seconds in self._times.items():
+            record[name + "_ms"] = seconds / self._window_steps * 1000
+        record["img_s"] = self._images / max(elapsed, 1e-9)
+        if self.total_steps is not None:
+            remaining = max(self.total_steps - self.steps, 0)
+            record["eta"] = str(datetime.timedelta(seconds=int(remaining * elapsed / self._window_steps)))
+
+        names, tensors = [], []
+        for name, total in self._sums.items():
+            if torch.is_tensor(total):
+                names.append(name)
+                tensors.append((total / self._counts[name]).float().reshape(()))
+            else:
+                record[name] = total / self._counts[name]
+        self._queue.put((record, names, tensors))
+        self._reset()
+
+    def _run(self):
+        f = None
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                record, names, tensors = item
+                if tensors:
+                    # the device to host copy waits here, not in the training loop
+                    record.update(zip(names, torch.stack([t.to(tensors[0].device) for t in tensors]).tolist()))
+                if self.stream is not None:
+                    self.stream.write(self._format(record) + self.end)
+                    self.stream.flush()
+                if self.path is not None:
+                    if f is None:
+                        f = _CSVLog(self.path) if self.path.endswith(".csv") else open(self.path, "a", newline="")
+                    if isinstance(f, _CSVLog):
+                        f.write(record)
+                    else:
+                        f.write(json.dumps(record) + "\n")
+                        f.flush()
+        finally:
+            if f is not None:
+                f.close()
+
+    def _format(self, record):
+        if self.fmt is not None:
+            return self.fmt.format_map(_Record(record))
+        return " ".join(
+            "%s: %.4f" % (key, value) if isinstance(value, float) else "%s: %s" % (key, value)
+            for key, value in record.items()
+        )
+
+    def close(self):
+        """Flushes the last partial window and waits for the writer thread."""
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,292 @@
+"""
+Generator/discriminator pairs of the unconditional GANs, looked up by name.
+
+Every entry builds ``(netG, netD)`` for a given image shape and carries the
+training defaults of the original script (loss, penalty, optimizer, n_critic),
+so ``common.engine`` can train any of them with one loop:
+
+    >>> netG, netD = build_model("wgan_gp", nz=100, channels=3, image_size=32)
+    >>> MODELS["wgan_gp"].defaults["penalty"]
+    'wgan-gp'
+
+New models are added with :func:`register_model`.
+"""
+import torch.nn as nn
+
+__all__ = ["MODELS", "register_model", "build_model", "MLPGenerator", "MLPDiscriminator",
+           "DCGANGenerator", "DCGANDiscriminator", "UpsamplingGenerator", "AutoencoderDiscriminator"]
+
+MODELS = {}
+
+
+class ModelEntry(object):
+    def __init__(self, name, builder, defaults):
+        self.name = name
+        self.builder = builder
+        self.defaults = defaults
+
+    def __repr__(self):
+        return "ModelEntry(%r, %r)" % (self.name, self.defaults)
+
+
+def register_model(name, **defaults):
+    """Decorator registering ``builder(nz, channels, image_size, ngf, ndf) -> (netG, netD)``.
+
+    Keyword arguments are the training defaults of the model, e.g.
+    ``loss="wgan"``, ``penalty="wgan-gp"``, ``optimizer="adam"``, ``lr``,
+    ``betas``, ``n_critic`` and ``clip_value``.
+    """
+    def wrapper(builder):
+        if name in MODELS:
+            raise ValueError("model %r is already registered" % name)
+        MODELS[name] = ModelEntry(name, builder, defaults)
+        return builder
+
+    return wrapper
+
+
+def build_model(name, nz=100, channels=3, image_size=32, ngf=64, ndf=64):
+    if name not in MODELS:
+        raise ValueError("unknown model %r, available: %s" % (name, ", ".join(sorted(MODELS))))
+    return MODELS[name].builder(nz=nz, channels=channels, image_size=image_size, ngf=ngf, ndf=ndf)
+
+
+# custom weights initialization called on netG and netD
+def weights_init(m):
+    classname = m.__class__.__name__
+    if classname.find("Conv") != -1:
+        nn.init.normal_(m.weight, 0.0, 0.02)
+    elif classname.find("BatchNorm") != -1:
+        nn.init.normal_(m.weight, 1.0, 0.02)
+        nn.init.zeros_(m.bias)
+
+
+class MLPGenerator(nn.Module):
+    def __init__(self, nz, channels, image_size):
+        super(MLPGenerator, self).__init__()
+        self.shape = (channels, image_size, image_size)
+        self.main = nn.Sequential(
+            nn.Linear(nz, 128),
+            nn.LeakyReLU(0.2, inplace=True),
+            nn.Linear(128, 256),
+            nn.BatchNorm1d(256),
+            nn.LeakyReLU(0.2, inplace=True),
+            nn.Linear(256, 512),
+            nn.BatchNorm1d(512),
+            nn.LeakyReLU(0.2, inplace=True),
+            nn.Linear(512, 1024),
+            nn.BatchNorm1d(1024),
+            nn.LeakyReLU(0.2, inplace=True),
+            nn.Linear(1024, channels * image_size * image_size),
+            nn.Tanh(),
+        )
+
+    def forward(self, z):
+        return self.main(z).view(z.size(0), *self.shape)
+
+
+class MLPDiscriminator(nn.Module):
+    """Returns one logit per image, the losses apply the sigmoid."""
+
+    def __init__(self, channels, image_size):
+        super(MLPDiscriminator, self).__init__()
+        self.main = nn.Sequential(
+            nn.Linear(channels * image_size * image_size, 512),
+            nn.LeakyReLU(0.2, inplace=True),
+            nn.Linear(512, 256),
+            nn.LeakyReLU(0.2, inplace=True),
+            nn.Linear(256, 1),
+        )
+
+    def forward(self, img):
+        return self.main(img.flatten(1)).view(-1)
+
+
+def _dcgan_kernels(image_size):
+    """Kernel sizes of the strided layers, 28x28 (MNIST) needs a 3x3 one to reach 7x7."""
+    if image_size == 28:
+        return [3, 4, 4]
+    if image_size & (image_size - 1) or image_size < 16:
+        raise ValueError("DCGAN nets support 28 or a power of two >= 16 as image size, got %d" % image_size)
+    return [4] * (image_size.bit_length() - 3)
+
+
+class DCGANGenerator(nn.Module):
+    def __init__(self, nz, channels, image_size, ngf=64):
+        super(DCGANGenerator, self).__init__()
+        kernels = _dcgan_kernels(image_size)
+        mult = 2 ** (len(kernels) - 1)
+        # inputs is Z, going into a convolution, state size. (ngf*mult) x 4 x 4
+        layers = [nn.ConvTranspose2d(nz, ngf * mult, 4, 1, 0, bias=False), nn.BatchNorm2d(ngf * mult), nn.ReLU(True)]
+        for kernel in kernels[:-1]:
+            layers += [
+                nn.ConvTranspose2d(ngf * mult, ngf * mult // 2, kernel, 2, 1, bias=False),
+                nn.BatchNorm2d(ngf * mult // 2),
+                nn.ReLU(True),
+            ]
+            mult //= 2
+        layers += [nn.ConvTranspose2d(ngf, channels, kernels[-1], 2, 1, bias=False), nn.Tanh()]
+        self.main = nn.Sequential(*layers)
+
+    def forward(self, z):
+        return self.main(z.view(z.size(0), -1, 1, 1))
+
+
+class DCGANDiscriminator(nn.Module):
+    """Returns one logit per image; ``batch_norm=False`` for the gradient penalty losses."""
+
+    def __init__(self, channels, image_size, ndf=64, batch_norm=True):
+        super(DCGANDiscriminator, self).__init__()
+        kernels = _dcgan_kernels(image_size)[::-1]
+        # inputs is (nc) x image_size x image_size
+        layers = [nn.Conv2d(channels, ndf, kernels[0], 2, 1, bias=False), nn.LeakyReLU(0.2, inplace=True)]
+        mult = 1
+        for kernel in kernels[1:]:
+            layers.append(nn.Conv2d(ndf * mult, ndf * mult * 2, kernel, 2, 1, bias=False))
+            if batch_norm:
+                layers.append(nn.BatchNorm2d(ndf * mult * 2))
+            layers.append(nn.LeakyReLU(0.2, inplace=True))
+            mult *= 2
+        # state size. (ndf*mult) x 4 x 4
+        layers.append(nn.Conv2d(ndf * mult, 1, 4, 1, 0, bias=False))
+        self.main = nn.Sequential(*layers)
+
+    def forward(self, img):
+        return self.main(img).view(-1)
+
+
+class UpsamplingGenerator(nn.Module):
+    """Generator of the BEGAN and EBGAN scripts: a linear layer to ``image_size // 4``, two upsampling convs."""
+
+    def __init__(self, nz, channels, image_size, input_norm=False):
+        super(UpsamplingGenerator, self).__init__()
+        self.init_size = image_size // 4
+        self.l1 = nn.Linear(nz, 128 * self.init_size ** 2)
+        layers = [nn.BatchNorm2d(128)] if input_norm else []
+        layers += [
+            nn.Upsample(scale_factor=2),
+            nn.Conv2d(128, 128, 3, stride=1, padding=1),
+            nn.BatchNorm2d(128, 0.8),
+            nn.LeakyReLU(0.2, inplace=True),
+            nn.Upsample(scale_factor=2),
+            nn.Conv2d(128, 64, 3, stride=1, padding=1),
+            nn.BatchNorm2d(64, 0.8),
+            nn.LeakyReLU(0.2, inplace=True),
+            nn.Conv2d(64, channels, 3, stride=1, padding=1),
+            nn.Tanh(),
+        ]
+        self.conv_blocks = nn.Sequential(*layers)
+
+    def forward(self, z):
+        out = self.l1(z)
+        return self.conv_blocks(out.view(out.size(0), 128, self.init_size, self.init_size))
+
+
+class AutoencoderDiscriminator(nn.Module):
+    """Autoencoder of the energy based GANs, returns the reconstruction error of every image.
+
+    ``distance`` is ``"l1"`` (BEGAN) or ``"mse"`` (EBGAN). ``detach_target`` compares the
+    reconstruction with a detached input, so the generator gets its gradient through the
+    reconstruction only, as in the EBGAN script. ``embedding=True`` returns
+    ``(error, embedding)``, the codes feed the pulling-away term of :class:`~common.engine.EBGANLoss`.
+    """
+
+    def __init__(self, channels, image_size, distance="l1", detach_target=False, embedding=False, code_size=32):
+        super(AutoencoderDiscriminator, self).__init__()
+        if distance not in ("l1", "mse"):
+            raise ValueError("distance has to be 'l1' or 'mse', got %r" % distance)
+        self.distance = distance
+        self.detach_target = detach_target
+        self.return_embedding = embedding
+        self.down_size = image_size // 2
+        down_dim = 64 * self.down_size ** 2
+        self.down = nn.Sequential(nn.Conv2d(channels, 64, 3, 2, 1), nn.ReLU())
+        self.embedding = nn.Linear(down_dim, code_size)
+        self.fc = nn.Sequential(
+            nn.BatchNorm1d(code_size, 0.8),
+            nn.ReLU(inplace=True),
+            nn.Linear(code_size, down_dim),
+            nn.BatchNorm1d(down_dim),
+            nn.ReLU(inplace=True),
+        )
+        self.up = nn.Sequential(nn.Upsample(scale_factor=2), nn.Conv2d(64, channels, 3, 1, 1))
+
+    def forward(self, img):
+        out = self.down(img)
+        embedding = self.embedding(out.flatten(1))
+        out = self.fc(embedding)
+        recon = self.up(out.view(out.size(0), 64, self.down_size, self.down_size))
+        target = img.detach() if self.detach_target else img
+        diff = recon - target
+        error = (diff.abs() if self.distance == "l1" else diff.pow(2)).flatten(1).mean(1)
+        if self.return_embedding:
+            return error, embedding
+        return error
+
+
+def _dcgan(nz, channels, image_size, ngf, ndf, batch_norm=True):
+    netG = DCGANGenerator(nz, channels, image_size, ngf)
+    netD = DCGANDiscriminator(channels, image_size, ndf, batch_norm=batch_norm)
+    netG.apply(weights_init)
+    netD.apply(weights_init)
+    return netG, netD
+
+
+@register_model("gan", loss="bce", optimizer="adam", lr=0.0002, betas=(0.5, 0.999))
+def gan(nz, channels, image_size, ngf, ndf):
+    return MLPGenerator(nz, channels, image_size), MLPDiscriminator(channels, image_size)
+
+
+@register_model("dcgan", loss="bce", optimizer="adam", lr=0.0002, betas=(0.5, 0.999))
+def dcgan(nz, channels, image_size, ngf, ndf):
+    return _dcgan(nz, channels, image_size, ngf, ndf)
+
+
+@register_model("lsgan", loss="lsgan", optimizer="adam", lr=0.0002, betas=(0.5, 0.999))
+def lsgan(nz, channels, image_size, ngf, ndf):
+    return _dcgan(nz, channels, image_size, ngf, ndf)
+
+
+@register_model("wgan", loss="wgan", optimizer="rmsprop", lr=0.00005, n_critic=5, clip_value=0.01)
+def wgan(nz, channels, image_size, ngf, ndf):
+    return _dcgan(nz, channels, image_size, ngf, ndf)
+
+
+@register_model("wgan_gp", loss="wgan", penalty="wgan-gp", optimizer="adam", lr=0.0001, betas=(0.5, 0.9), n_critic=5)
+def wgan_gp(nz, channels, image_size, ngf, ndf):
+    return _dcgan(nz, channels, image_size, ngf, ndf, batch_norm=False)
+
+
+@register_model("wgan_div", loss="wgan", penalty="wgan-div", optimizer="adam", lr=0.0001, betas=(0.5, 0.9), n_critic=5)
+def wgan_div(nz, channels, image_size, ngf, ndf):
+    return _dcgan(nz, channels, image_size, ngf, ndf, batch_norm=False)
+
+
+@register_model("dragan", loss="bce", penalty="dragan", optimizer="adam", lr=0.0002, betas=(0.5, 0.999))
+def dragan(nz, channels, image_size, ngf, ndf):
+    return _dcgan(nz, channels, image_size, ngf, ndf, batch_norm=False)
+
+
+def _autoencoder(nz, channels, image_size, input_norm, **kwargs):
+    if image_size % 4:
+        raise ValueError("the autoencoder nets need an image size divisible by 4, got %d" % image_size)
+    netG = UpsamplingGenerator(nz, channels, image_size, input_norm=input_norm)
+    netD = AutoencoderDiscriminator(channels, image_size, **kwargs)
+    netG.apply(weights_init)
+    netD.apply(weights_init)
+    return netG, netD
+
+
+@register_model("began", loss="began", optimizer="adam", lr=0.0002, betas=(0.5, 0.999))
+def began(nz, channels, image_size, ngf, ndf):
+    return _autoencoder(nz, channels, image_size, input_norm=True, distance="l1")
+
+
+@register_model("ebgan", loss="ebgan", optimizer="adam", lr=0.0002, betas=(0.5, 0.999))
+def ebgan(nz, channels, image_size, ngf, ndf):
+    return _autoencoder(nz, channels, image_size, input_norm=False, distance="mse", detach_target=True, embedding=True)
+
+
+@register_model("softmax_gan", loss="softmax", optimizer="adam", lr=0.0002, betas=(0.5, 0.999))
+def softmax_gan(nz, channels, image_size, ngf, ndf):
+    return MLPGenerator(nz, channels, image_size), MLPDiscriminator(channels, image_size)
@@ -0,0 +1,259 @@
+"""
+Packed record shards for the folder based GAN datasets.
+
+A directory such as ``data/facades/train`` is converted once into
+``data/facades/train.records``:
+
+    meta.json           format version, whether records are decoded
+    index.npy           int64 (N, 6): shard, offset, length, height, width, channels
+    keys.txt            relative file name of every record, one per line
+    shard-00000.rec     concatenated record payloads, at most ``shard_size`` bytes each
+
+A record holds either the original encoded file bytes (``channels == 0``) or
+a decoded uint8 ``height x width x channels`` array, converted to one PIL mode
+(``RGB`` by default) so palette and 16-bit files are stored as the datasets see them. Reading a record costs a
+slice of a memory-mapped shard instead of an ``open``/``stat`` per image.
+
+Convert a folder with:
+
+    $ python3 -m common.records ../data/facades/train
+"""
+import argparse
+import fnmatch
+import glob
+import io
+import json
+import mmap
+import os
+
+import numpy as np
+from PIL import Image
+
+__all__ = ["RecordWriter", "RecordReader", "convert", "list_images", "load_image"]
+
+FORMAT_VERSION = 1
+RECORDS_SUFFIX = ".records"
+# extensions packed by :func:`convert`, those of ``torchvision.datasets.folder``
+IMG_EXTENSIONS = (".jpg", ".jpeg", ".png", ".ppm", ".bmp", ".pgm", ".tif", ".tiff", ".webp")
+
+
+def records_dir(root):
+    return root.rstrip("/\\") + RECORDS_SUFFIX
+
+
+class RecordWriter(object):
+    """Appends records to fixed-size shards and writes the index on ``close``.
+
+    Arguments:
+        out_dir (str): directory the shards are written to
+        decode (bool): store decoded uint8 arrays instead of the encoded file bytes
+        mode (str): PIL mode decoded images are converted to, ``"RGB"`` or ``"L"``
+        shard_size (int): maximum number of bytes per shard file
+    """
+
+    def __init__(self, out_dir, decode=False, mode="RGB", shard_size=256 << 20):
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        self.decode = decode
+        self.mode = mode
+        self.shard_size = shard_size
+        self.index = []
+        self.keys = []
+        self._shard = -1
+        self._file = None
+        self._offset = 0
+
+    def _next_shard(self):
+        if self._file is not None:
+            self._file.close()
+        self._shard += 1
+        self._offset = 0
+        self._file = open(os.path.join(self.out_dir, "shard-%05d.rec" % self._shard), "wb")
+
+    def write(self, key, path):
+        if self.decode:
+            with Image.open(path) as f:
+                img = np.asarray(f.convert(self.mode))
+            if img.ndim == 2:
+                img = img[:, :, None]
+            payload = np.ascontiguousarray(img).tobytes()
+            height, width, channels = img.shape
+        else:
+            with open(path, "rb") as f:
+                payload = f.read()
+            height, width, channels = 0, 0, 0
+        if self._file is None or (self._offset and self._offset + len(payload) > self.shard_size):
+            self._next_shard()
+        self._file.write(payload)
+        self.index.append((self._shard, self._offset, len(payload), height, width, channels))
+        self.keys.append(key)
+        self._offset += len(payload)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        np.save(os.path.join(self.out_dir, "index.npy"), np.array(self.index, dtype=np.int64).reshape(-1, 6))
+        with open(os.path.join(self.out_dir, "keys.txt"), "w") as f:
+            f.write("".join(key + "\n" for key in self.keys))
+        with open(os.path.join(self.out_dir, "meta.json"), "w") as f:
+            json.dump({"version": FORMAT_VERSION, "decoded": self.decode, "shards": self._shard + 1}, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class RecordReader(object):
+    """Random and sequential access to one or more converted directories.
+
+    Behaves like the sorted list of file names the datasets used to glob:
+    ``reader[i]`` is the key of record ``i``, slicing returns a reader over
+    a subset and ``len`` counts records. Shards are memory-mapped lazily,
+    once per process, so the reader is safe to hand to DataLoader workers.
+
+    Arguments:
+        *roots (str): ``.records`` directories, concatenated in order
+    """
+
+    def __init__(self, *roots):
+        self.shards = []
+        index, keys = [], []
+        for root in roots:
+            with open(os.path.join(root, "meta.json")) as f:
+                meta = json.load(f)
+            if meta["version"] != FORMAT_VERSION:
+                raise RuntimeError("Unsupported record format version %d in %s" % (meta["version"], root))
+            part = np.load(os.path.join(root, "index.npy"))
+            part[:, 0] += len(self.shards)
+            index.append(part)
+            with open(os.path.join(root, "keys.txt")) as f:
+                keys.extend(line.rstrip("\n") for line in f)
+            self.shards.extend(os.path.join(root, "shard-%05d.rec" % i) for i in range(meta["shards"]))
+        self.index = np.concatenate(index) if index else np.zeros((0, 6), dtype=np.int64)
+        self.keys = keys
+        self.rows = np.arange(len(self.index))
+        self._maps = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_maps"] = {}
+        return state
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            view = object.__new__(RecordReader)
+            view.__dict__.update(self.__getstate__())
+            view.rows = self.rows[index]
+            return view
+        return self.keys[self.rows[index]]
+
+    def _map(self, shard):
+        m = self._maps.get(shard)
+        if m is None:
+            with open(self.shards[shard], "rb") as f:
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[shard] = m
+        return m
+
+    def read(self, index):
+        """Returns the payload of record ``index`` as a zero-copy memoryview."""
+        shard, offset, length = self.index[self.rows[index], :3]
+        return memoryview(self._map(int(shard)))[offset:offset + length]
+
+    def array(self, index):
+        """Returns record ``index`` as a uint8 HWC array, decoding encoded records."""
+        height, width, channels = self.index[self.rows[index], 3:]
+        if channels == 0:
+            return np.asarray(self.image(index))
+        return np.frombuffer(self.read(index), dtype=np.uint8).reshape(height, width, channels)
+
+    def image(self, index):
+        """Returns record ``index`` as a PIL image."""
+        height, width, channels = self.index[self.rows[index], 3:]
+        if channels == 0:
+            return Image.open(io.BytesIO(self.read(index)))
+        img = np.frombuffer(self.read(index), dtype=np.uint8).reshape(height, width, channels)
+        return Image.fromarray(img[:, :, 0] if channels == 1 else img)
+
+    def __iter__(self):
+        """Streams ``(key, payload)`` pairs in storage order with large sequential reads."""
+        rows = self.rows[np.lexsort((self.index[self.rows, 1], self.index[self.rows, 0]))]
+        shard, f = -1, None
+        try:
+            for row in rows:
+                if self.index[row, 0] != shard:
+                    if f is not None:
+                        f.close()
+                    shard = int(self.index[row, 0])
+                    f = open(self.shards[shard], "rb", buffering=8 << 20)
+                f.seek(self.index[row, 1])
+                yield self.keys[row], f.read(int(self.index[row, 2]))
+        finally:
+            if f is not None:
+                f.close()
+
+
+def convert(root, out_dir=None, decode=False, mode="RGB", pattern="*.*", shard_size=256 << 20):
+    """Packs the images ``root/<pattern>`` into ``out_dir`` (default ``<root>.records``).
+
+    Files without an image extension (:data:`IMG_EXTENSIONS`), such as the
+    attribute list of CelebA, are skipped.
+
+    Returns:
+        The number of records written.
+    """
+    out_dir = out_dir or records_dir(root)
+    files = sorted(path for path in glob.glob(os.path.join(root, pattern)) if path.lower().endswith(IMG_EXTENSIONS))
+    with RecordWriter(out_dir, decode=decode, mode=mode, shard_size=shard_size) as writer:
+        for path in files:
+            writer.write(os.path.relpath(path, root), path)
+    return len(files)
+
+
+def list_images(roots, packed=False, pattern="*.*"):
+    """Returns the sorted image paths of ``roots``, or a RecordReader over their converted shards.
+
+    Arguments:
+        roots (str or list): image directories, concatenated in order
+        packed (bool): read ``<root>.records`` written by :func:`convert` instead
+        pattern (str): glob pattern of the image files, also applied to the keys of packed records
+    """
+    if isinstance(roots, str):
+        roots = [roots]
+    if packed:
+        reader = RecordReader(*[records_dir(root) for root in roots])
+        # a folder converted with a wider pattern also holds e.g. the attribute file of CelebA
+        reader.rows = np.array([row for row in reader.rows if fnmatch.fnmatchcase(reader.keys[row], pattern)],
+                               dtype=np.int64)
+        return reader
+    files = []
+    for root in roots:
+        files.extend(sorted(glob.glob(os.path.join(root, pattern))))
+    return files
+
+
+def load_image(files, index):
+    """``Image.open`` for an entry of :func:`list_images` or of a wrapper with an ``image`` method."""
+    if isinstance(files, (list, tuple)):
+        return Image.open(files[index])
+    return files.image(index)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack an image folder into record shards.")
+    parser.add_argument("roots", nargs="+", help="image folders, each written to <root>.records")
+    parser.add_argument("--decode", action="store_true", help="store decoded uint8 arrays instead of file bytes")
+    parser.add_argument("--mode", type=str, default="RGB", help="PIL mode decoded images are converted to")
+    parser.add_argument("--pattern", type=str, default="*.*", help="glob pattern of the image files")
+    parser.add_argument("--shard_size", type=int, default=256, help="maximum shard size in MiB")
+    opt = parser.parse_args()
+
+    for root in opt.roots:
+        count = convert(root, decode=opt.decode, mode=opt.mode, pattern=opt.pattern,
+                        shard_size=opt.shard_size << 20)
+        print("%s: %d records -> %s" % (root, count, records_dir(root)))
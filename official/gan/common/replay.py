@@ -0,0 +1,81 @@
+"""
+History of generated images for the discriminator updates (Shrivastava et al., 2017).
+
+:class:`ReplayBuffer` keeps the last images in one preallocated tensor on the
+device of the generator. ``push_and_pop`` handles the whole batch with masks
+and index tensors, without a Python loop over the images and without a
+host/device synchronization:
+
+    >>> fake_A_buffer = ReplayBuffer(max_size=50)
+    >>> fake_A_ = fake_A_buffer.push_and_pop(fake_A)
+    >>> loss_fake = criterion_GAN(D_A(fake_A_.detach()), fake)
+
+While the buffer fills up, images are stored and returned as they are.
+Once it is full, every image is swapped with probability ``p`` against a
+random stored one, which is returned in its place.
+"""
+import torch
+
+__all__ = ["ReplayBuffer"]
+
+
+class ReplayBuffer(object):
+    """Ring buffer of the last ``max_size`` images, allocated on the first push.
+
+    Arguments:
+        max_size (int): number of stored images
+        p (float): probability of returning a stored image instead of a new one
+    """
+
+    def __init__(self, max_size=50, p=0.5):
+        assert max_size > 0, "Empty buffer or trying to create a black hole. Be careful."
+        self.max_size = max_size
+        self.p = p
+        self.size = 0
+        # rows [max_size:] stage the pushed batch, so one gather returns stored and new images
+        self.data = None
+
+    def _allocate(self, like, batch_size):
+        data = torch.empty((self.max_size + batch_size,) + tuple(like.shape[1:]), dtype=like.dtype, device=like.device)
+        if self.data is not None:
+            data[:self.size] = self.data[:self.size]
+        self.data = data
+
+    @torch.no_grad()
+    def push_and_pop(self, data):
+        data = data.detach()
+        n = data.size(0)
+        if self.data is None or self.data.size(0) < self.max_size + n:
+            self._allocate(data, n)
+        self.data[self.max_size:self.max_size + n] = data
+
+        # the images filling free slots are returned unchanged, the others are
+        # swapped against a random stored image with probability p
+        fill = min(self.max_size - self.size, n)
+        self.data[self.size:self.size + fill] = data[:fill]
+        self.size += fill
+        swap = torch.rand(n, device=data.device) < self.p
+        swap[:fill] = False
+        # swapped images take distinct stored slots, so index_copy_ writes each row once
+        rank = swap.cumsum(0) - 1
+        swap &= rank < self.max_size
+        slots = torch.randperm(self.max_size, device=data.device)[rank.clamp(0, self.max_size - 1)]
+        staged = torch.arange(self.max_size, self.max_size + n, device=data.device)
+        index = torch.where(swap, slots, staged)
+        out = self.data.index_select(0, index)
+        # unswapped images are written back onto their own staging row
+        self.data.index_copy_(0, index, data)
+        return out
+
+    def state_dict(self):
+        return {"max_size": self.max_size, "p": self.p, "size": self.size,
+                "data": None if self.data is None else self.data[:self.size]}
+
+    def load_state_dict(self, state_dict):
+        self.max_size = state_dict["max_size"]
+        self.p = state_dict["p"]
+        self.size = state_dict["size"]
+        self.data = None
+        if state_dict["data"] is not None:
+            self._allocate(state_dict["data"], 0)
+            self.data[:self.size] = state_dict["data"]
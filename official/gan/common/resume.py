@@ -0,0 +1,115 @@
+"""
+Resuming training at the exact batch it stopped at.
+
+Besides the weights, a checkpoint needs the optimizer and scheduler state,
+the random number generators and the position in the epoch. The position is
+restored by :class:`ResumableSampler`, which shuffles every epoch from its
+own seed; ``set_epoch(epoch, start)`` starts the order of ``epoch`` at sample
+``start``, so the skipped images are never read or decoded:
+
+    >>> sampler = ResumableSampler(dataset)
+    >>> dataloader = DataLoader(dataset, batch_size=64, sampler=sampler)
+    >>> for epoch in range(start_epoch, n_epochs):
+    ...     sampler.set_epoch(epoch, start_batch * 64)
+    ...     for i, batch in enumerate(dataloader, start_batch):
+    ...         ...
+    ...         checkpoints.save(tag, netG=netG, ..., sampler=sampler, rng=rng_state(),
+    ...                          progress={"epoch": epoch, "batch": i + 1})
+    ...     start_batch = 0
+
+and after loading the checkpoint ``state``:
+
+    >>> sampler.load_state_dict(state["sampler"])
+    >>> set_rng_state(state["rng"])
+    >>> start_epoch, start_batch = state["progress"]["epoch"], state["progress"]["batch"]
+"""
+import random
+
+import torch
+from torch.utils.data import Sampler
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__all__ = ["ResumableSampler", "rng_state", "set_rng_state"]
+
+
+def rng_state():
+    """States of the Python, NumPy, torch and CUDA generators, loadable with ``weights_only``."""
+    state = {"python": random.getstate(), "torch": torch.get_rng_state()}
+    if np is not None:
+        kind, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+        state["numpy"] = (kind, torch.from_numpy(keys.astype(np.int64)), pos, has_gauss, cached_gaussian)
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    random.setstate(_tuples(state["python"]))
+    torch.set_rng_state(state["torch"].cpu())
+    if np is not None and "numpy" in state:
+        kind, keys, pos, has_gauss, cached_gaussian = state["numpy"]
+        np.random.set_state((kind, keys.numpy().astype(np.uint32), pos, has_gauss, cached_gaussian))
+    if "cuda" in state and torch.cuda.is_available():
+        # a job may come back on fewer GPUs
+        for device, cuda_state in enumerate(state["cuda"][:torch.cuda.device_count()]):
+            torch.cuda.set_rng_state(cuda_state.cpu(), device)
+
+
+def _tuples(obj):
+    """``random.setstate`` needs tuples, a checkpoint may hand back lists."""
+    return tuple(_tuples(x) for x in obj) if isinstance(obj, (list, tuple)) else obj
+
+
+class ResumableSampler(Sampler):
+    """Random order per epoch derived from ``seed``, which can start at any position.
+
+    Arguments:
+        data_source (Dataset): dataset to sample from
+        shuffle (bool): shuffle every epoch, otherwise keep the dataset order
+        seed (int): seed of the orders, drawn from the torch generator by default
+
+    ``len`` stays the length of a whole epoch, so a resumed epoch keeps
+    counting its batches from the resumed position.
+    """
+
+    def __init__(self, data_source, shuffle=True, seed=None):
+        self.num_samples = len(data_source)
+        self.shuffle = shuffle
+        if seed is None:
+            seed = int(torch.randint(2 ** 31, ()).item())
+        self.seed = seed
+        self.epoch = 0
+        self.start = 0
+
+    def set_epoch(self, epoch, start=0):
+        """Call before every epoch; the next iteration yields the order of ``epoch`` from sample ``start`` on."""
+        self.epoch = epoch
+        self.start = start
+
+    def __iter__(self):
+        if self.shuffle:
+            generator = torch.Generator()
+            generator.manual_seed(self.seed + self.epoch)
+            order = torch.randperm(self.num_samples, generator=generator)
+        else:
+            order = torch.arange(self.num_samples)
+        return iter(order[self.start:].tolist())
+
+    def __len__(self):
+        return self.num_samples
+
+    def state_dict(self):
+        return {"seed": self.seed, "shuffle": self.shuffle, "num_samples": self.num_samples}
+
+    def load_state_dict(self, state_dict):
+        if state_dict["num_samples"] != self.num_samples:
+            raise ValueError(
+                "the checkpoint was written for %d samples, the dataset has %d"
+                % (state_dict["num_samples"], self.num_samples)
+            )
+        self.seed = state_dict["seed"]
+        self.shuffle = state_dict["shuffle"]
@@ -0,0 +1,173 @@
+"""
+Sample grids rendered and encoded off the training thread.
+
+``sample_images`` used to run the generators, ``make_grid`` and the PNG
+encoder inside the training loop. :class:`AsyncSampler` forks a worker process
+holding CPU copies of the generators. ``submit`` only copies the current
+weights into a shared-memory slot and hands the inputs over; the worker loads
+the snapshot, renders the grid and writes the file.
+
+At most ``max_pending`` frames are in flight. When the worker falls behind,
+``submit`` drops the frame instead of waiting, before copying anything.
+
+    >>> def render(nets, real_A):
+    ...     return torch.cat((real_A, nets["G"](real_A)), -2)
+    >>> sampler = AsyncSampler(render, {"G": generator})
+    >>> sampler.submit("images/%d.png" % batches_done, real_A, nrow=5, normalize=True)
+    >>> sampler.close()
+
+``nets`` may hold an EMA copy of a generator instead of the trained one.
+Without ``render`` the first net is applied to the inputs; ``save`` queues
+images that need no rendering at all, e.g. a batch of real samples.
+"""
+import copy
+import multiprocessing
+import queue
+
+import torch
+import torch.nn as nn
+from torchvision.utils import save_image
+
+__all__ = ["AsyncSampler"]
+
+
+def _cpu_copy(net):
+    """Deep copy of ``net`` with every tensor on the CPU, without a temporary copy on the GPU."""
+    memo = {}
+    for p in net.parameters():
+        memo[id(p)] = nn.Parameter(p.detach().to("cpu", copy=True), requires_grad=False)
+    for b in net.buffers():
+        memo[id(b)] = b.detach().to("cpu", copy=True)
+    return copy.deepcopy(net, memo)
+
+
+def _load(nets, slot):
+    with torch.no_grad():
+        for name, net in nets.items():
+            for dst, src in zip(net.state_dict().values(), slot[name]):
+                dst.copy_(src)
+
+
+def _render(render, nets, inputs, path, save_kwargs):
+    with torch.no_grad():
+        if render is not None:
+            images = render(nets, *inputs)
+        elif nets:
+            images = next(iter(nets.values()))(*inputs)
+        else:
+            images = inputs[0]
+        save_image(images, path, **save_kwargs)
+
+
+def _worker(render, nets, slots, tasks, free, num_threads):
+    torch.set_num_threads(num_threads)
+    while True:
+        item = tasks.get()
+        if item is None:
+            break
+        slot, path, inputs, save_kwargs = item
+        try:
+            if inputs is None:
+                _render(None, {}, [save_kwargs.pop("images")], path, save_kwargs)
+            else:
+                _load(nets, slots[slot])
+                _render(render, nets, inputs, path, save_kwargs)
+        except Exception as e:
+            print("[AsyncSampler] failed to render %s: %r" % (path, e))
+        finally:
+            free.put(slot)
+
+
+class AsyncSampler(object):
+    """Renders sample grids from weight snapshots in a background process.
+
+    Arguments:
+        render (callable): ``render(nets, *inputs) -> images`` run in the worker
+            under ``no_grad``, with the snapshots in ``nets`` and the inputs on the CPU;
+            by default the first net of ``nets`` is applied to the inputs
+        nets (dict): name -> module whose weights are snapshot on every ``submit``
+        max_pending (int): frames in flight before ``submit`` drops new ones
+        num_threads (int): torch threads of the worker
+        inline (bool): render synchronously in the calling thread, the default
+            where processes cannot be forked
+    """
+
+    def __init__(self, render=None, nets=None, max_pending=2, num_threads=2, inline=None):
+        self.render = render
+        self.nets = dict(nets or {})
+        self.submitted = 0
+        self.dropped = 0
+        if inline is None:
+            inline = "fork" not in multiprocessing.get_all_start_methods()
+        self.inline = inline
+        if inline:
+            return
+
+        # forked, so ``render`` may be any function of the training script
+        ctx = multiprocessing.get_context("fork")
+        self.slots = [
+            {name: [t.detach().to("cpu", copy=True).share_memory_() for t in net.state_dict().values()]
+             for name, net in self.nets.items()}
+            for _ in range(max_pending)
+        ]
+        self.tasks = ctx.Queue()
+        self.free = ctx.Queue()
+        for slot in range(max_pending):
+            self.free.put(slot)
+        worker_nets = {name: _cpu_copy(net) for name, net in self.nets.items()}
+        self.process = ctx.Process(
+            target=_worker,
+            args=(render, worker_nets, self.slots, self.tasks, self.free, num_threads),
+            name="gan-sampler",
+            daemon=True,
+        )
+        self.process.start()
+
+    def submit(self, path, *inputs, **save_kwargs):
+        """Queues a grid for ``path``; returns False if the frame was dropped.
+
+        ``save_kwargs`` are passed to ``torchvision.utils.save_image``.
+        """
+        if self.inline:
+            device = next((p.device for net in self.nets.values() for p in net.parameters()), None)
+            if device is not None:
+                inputs = [x.to(device) if torch.is_tensor(x) else x for x in inputs]
+            _render(self.render, self.nets, inputs, path, save_kwargs)
+            self.submitted += 1
+            return True
+        try:
+            slot = self.free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return False
+        with torch.no_grad():
+            for name, net in self.nets.items():
+                for dst, src in zip(self.slots[slot][name], net.state_dict().values()):
+                    dst.copy_(src)
+        inputs = [x.detach().cpu() if torch.is_tensor(x) else x for x in inputs]
+        self.tasks.put((slot, path, inputs, save_kwargs))
+        self.submitted += 1
+        return True
+
+    def save(self, path, images, **save_kwargs):
+        """Queues ``images`` to be written as they are, without a weight snapshot."""
+        if self.inline:
+            _render(None, {}, [images.detach()], path, save_kwargs)
+            self.submitted += 1
+            return True
+        try:
+            slot = self.free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return False
+        save_kwargs["images"] = images.detach().cpu()
+        self.tasks.put((slot, path, None, save_kwargs))
+        self.submitted += 1
+        return True
+
+    def close(self):
+        """Waits for the pending frames and stops the worker."""
+        if not self.inline:
+            self.tasks.put(None)
+            self.process.join()
+        return {"submitted": self.submitted, "dropped": self.dropped}
@@ -1,20 +1,22 @@
-import glob
 import random
 import os
+import sys
 import numpy as np
 
 from torch.utils.data import Dataset
-from PIL import Image
 import torchvision.transforms as transforms
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.records import list_images, load_image
+
 
 class ImageDataset(Dataset):
-    def __init__(self, root, transforms_=None, img_size=128, mask_size=64, mode="train"):
+    def __init__(self, root, transforms_=None, img_size=128, mask_size=64, mode="train", packed=False):
         self.transform = transforms.Compose(transforms_)
         self.img_size = img_size
         self.mask_size = mask_size
         self.mode = mode
-        self.files = sorted(glob.glob("%s/*.jpg" % root))
+        self.files = list_images(root, packed, "*.jpg")
         self.files = self.files[:-4000] if mode == "train" else self.files[-4000:]
 
     def apply_random_mask(self, img):
@@ -38,7 +40,7 @@ class ImageDataset(Dataset):
 
     def __getitem__(self, index):
 
-        img = Image.open(self.files[index % len(self.files)])
+        img = load_image(self.files, index % len(self.files))
         img = self.transform(img)
         if self.mode == "train":
             # For training data perform random mask
@@ -8,9 +8,18 @@ from torch.utils.data import DataLoader
 from .models import *
 from .datasets import *
 from .utils import *
+from common.augment import BatchAugment
+from common.cache import cached, cache_stats
+from common.checkpoint import CheckpointManager, load_checkpoint
+from common.metrics import Metrics
+from common.ema import EMA
+from common.sampler import AsyncSampler
+from common.amp import MixedPrecision
+from common.resume import ResumableSampler, rng_state, set_rng_state
 
 import torch.nn as nn
 import torch
+from torch.autograd import Variable
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--epoch", type=int, default=0, help="epoch to start training from")
@@ -22,20 +31,47 @@ parser.add_argument("--b1", type=float, default=0.5, help="adam: decay of first
 parser.add_argument("--b2", type=float, default=0.999, help="adam: decay of first order momentum of gradient")
 parser.add_argument("--decay_epoch", type=int, default=100, help="epoch from which to start lr decay")
 parser.add_argument("--n_cpu", type=int, default=8, help="number of cpu threads to use during batch generation")
+parser.add_argument("--packed", action="store_true", help="read <dataset>.records shards from common/records.py")
+parser.add_argument("--batch_augment", action="store_true", help="augment uint8 batches in the collate stage")
+parser.add_argument(
+    "--cache_mb", type=int, default=0, help="size of the shared decoded-image cache in MiB, 0 disables it"
+)
 parser.add_argument("--img_height", type=int, default=256, help="size of image height")
 parser.add_argument("--img_width", type=int, default=256, help="size of image width")
 parser.add_argument("--channels", type=int, default=3, help="number of image channels")
 parser.add_argument("--sample_interval", type=int, default=100, help="interval between saving generator outputs")
 parser.add_argument("--checkpoint_interval", type=int, default=-1, help="interval between saving model checkpoints")
+parser.add_argument("--keep_checkpoints", type=int, default=0, help="keep only the last n checkpoints, 0 keeps all")
+parser.add_argument(
+    "--sharded_checkpoints", action="store_true", help="one file per net, unchanged ones are hard-linked"
+)
+parser.add_argument(
+    "--checkpoint_batches", type=int, default=0, help="batches between checkpoints within an epoch, 0 disables"
+)
+parser.add_argument(
+    "--resume", type=str, default="", help="checkpoint to continue training from exactly, 'latest' for the newest"
+)
+parser.add_argument("--ema_decay", type=float, default=0, help="decay of the generator weight average, 0 disables")
+parser.add_argument("--ema_every", type=int, default=1, help="update the generator average every k generator steps")
+parser.add_argument("--log_interval", type=int, default=10, help="batches between progress lines")
+parser.add_argument("--metrics_file", type=str, default="", help="also write the losses to this .csv or .jsonl file")
+parser.add_argument(
+    "--precision", type=str, default="fp32", choices=["fp32", "bf16", "fp16"], help="bf16 on CPU or CUDA, fp16 on CUDA"
+)
 parser.add_argument("--n_residual_blocks", type=int, default=9, help="number of residual blocks in generator")
 parser.add_argument("--lambda_cyc", type=float, default=10.0, help="cycle loss weight")
 parser.add_argument("--lambda_id", type=float, default=5.0, help="identity loss weight")
+parser.add_argument("--buffer_size", type=int, default=50, help="size of the buffers of generated images")
 opt = parser.parse_args()
 print(opt)
 
 # Create sample and checkpoint directories
 os.makedirs("images/%s" % opt.dataset_name, exist_ok=True)
 os.makedirs("saved_models/%s" % opt.dataset_name, exist_ok=True)
+# Nets, optimizers and schedulers of an epoch go to one checkpoint, written in the background
+checkpoints = CheckpointManager(
+    "saved_models/%s" % opt.dataset_name, keep_last=opt.keep_checkpoints, sharded=opt.sharded_checkpoints
+)
 
 # Losses
 criterion_GAN = torch.nn.MSELoss()
@@ -61,12 +97,22 @@ if cuda:
     criterion_cycle.cuda()
     criterion_identity.cuda()
 
-if opt.epoch != 0:
+# Mixed precision, normalization layers stay in float32
+amp = MixedPrecision(opt.precision, "cuda" if cuda else "cpu")
+amp.keep_fp32(G_AB, G_BA, D_A, D_B)
+
+resume = checkpoints.latest() if opt.resume == "latest" else opt.resume
+if resume:
+    checkpoint = load_checkpoint(resume, map_location="cuda" if cuda else "cpu")
+elif opt.epoch != 0:
+    checkpoint = checkpoints.load(opt.epoch, map_location="cuda" if cuda else "cpu")
+
+if resume or opt.epoch != 0:
     # Load pretrained models
-    G_AB.load_state_dict(torch.load("saved_models/%s/G_AB_%d.pth" % (opt.dataset_name, opt.epoch)))
-    G_BA.load_state_dict(torch.load("saved_models/%s/G_BA_%d.pth" % (opt.dataset_name, opt.epoch)))
-    D_A.load_state_dict(torch.load("saved_models/%s/D_A_%d.pth" % (opt.dataset_name, opt.epoch)))
-    D_B.load_state_dict(torch.load("saved_models/%s/D_B_%d.pth" % (opt.dataset_name, opt.epoch)))
+    G_AB.load_state_dict(checkpoint["G_AB"])
+    G_BA.load_state_dict(checkpoint["G_BA"])
+    D_A.load_state_dict(checkpoint["D_A"])
+    D_B.load_state_dict(checkpoint["D_B"])
 else:
     # Initialize weights
     G_AB.apply(weights_init_normal)
@@ -95,8 +141,8 @@ lr_scheduler_D_B = torch.optim.lr_scheduler.LambdaLR(
 Tensor = torch.cuda.FloatTensor if cuda else torch.Tensor
 
 # Buffers of previously generated samples
-fake_A_buffer = ReplayBuffer()
-fake_B_buffer = ReplayBuffer()
+fake_A_buffer = ReplayBuffer(opt.buffer_size)
+fake_B_buffer = ReplayBuffer(opt.buffer_size)
 
 # Image transformations
 transforms_ = [
@@ -107,30 +153,56 @@ transforms_ = [
     transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5)),
 ]
 
+# Same transforms applied to whole uint8 batches, A and B are augmented independently
+collate_fn = None
+if opt.batch_augment:
+    collate_fn = BatchAugment(
+        size=int(opt.img_height * 1.12), crop=(opt.img_height, opt.img_width), flip=True, shared=False
+    )
+
 # Training data loader
+dataset = ImageDataset(
+    "../../data/%s" % opt.dataset_name,
+    transforms_=transforms_,
+    unaligned=True,
+    packed=opt.packed,
+    raw=opt.batch_augment,
+)
+if opt.cache_mb > 0:
+    # Keep images decoded at the size the first transform resizes them to
+    dataset = cached(dataset, opt.cache_mb << 20, int(opt.img_height * 1.12))
+# Shuffles every epoch, a resumed epoch starts at its batch without loading the ones before
+train_sampler = ResumableSampler(dataset)
 dataloader = DataLoader(
-    ImageDataset("../../data/%s" % opt.dataset_name, transforms_=transforms_, unaligned=True),
+    dataset,
     batch_size=opt.batch_size,
-    shuffle=True,
+    sampler=train_sampler,
     num_workers=opt.n_cpu,
+    collate_fn=collate_fn,
 )
 # Test data loader
 val_dataloader = DataLoader(
-    ImageDataset("../../data/%s" % opt.dataset_name, transforms_=transforms_, unaligned=True, mode="test"),
+    ImageDataset(
+        "../../data/%s" % opt.dataset_name,
+        transforms_=transforms_,
+        unaligned=True,
+        mode="test",
+        packed=opt.packed,
+        raw=opt.batch_augment,
+    ),
     batch_size=5,
     shuffle=True,
     num_workers=1,
+    collate_fn=collate_fn,
 )
 
 
-def sample_images(batches_done):
-    """Saves a generated sample from the test set"""
-    imgs = next(iter(val_dataloader))
+def render_samples(nets, real_A, real_B):
+    """Renders the sample grid, in the sampler process on a snapshot of the generators"""
+    G_AB, G_BA = nets["G_AB"], nets["G_BA"]
     G_AB.eval()
     G_BA.eval()
-    real_A = Variable(imgs["A"].type(Tensor))
     fake_B = G_AB(real_A)
-    real_B = Variable(imgs["B"].type(Tensor))
     fake_A = G_BA(real_B)
     # Arange images along x-axis
     real_A = make_grid(real_A, nrow=5, normalize=True)
@@ -138,17 +210,83 @@ def sample_images(batches_done):
     fake_A = make_grid(fake_A, nrow=5, normalize=True)
     fake_B = make_grid(fake_B, nrow=5, normalize=True)
     # Arange images along y-axis
-    image_grid = torch.cat((real_A, fake_B, real_B, fake_A), 1)
-    save_image(image_grid, "images/%s/%s.png" % (opt.dataset_name, batches_done), normalize=False)
+    return torch.cat((real_A, fake_B, real_B, fake_A), 1)
+
+
+# Moving average of the generator weights, the generators themselves with --ema_decay 0
+ema = EMA(nn.ModuleDict({"G_AB": G_AB, "G_BA": G_BA}), decay=opt.ema_decay, every=opt.ema_every)
+sampler = AsyncSampler(render_samples, {"G_AB": ema.module["G_AB"], "G_BA": ema.module["G_BA"]})
+
+start_batch = 0
+if resume or opt.epoch != 0:
+    # Continue with the optimizer, scheduler and average state of the checkpoint
+    optimizer_G.load_state_dict(checkpoint["optimizer_G"])
+    optimizer_D_A.load_state_dict(checkpoint["optimizer_D_A"])
+    optimizer_D_B.load_state_dict(checkpoint["optimizer_D_B"])
+    lr_scheduler_G.load_state_dict(checkpoint["lr_scheduler_G"])
+    lr_scheduler_D_A.load_state_dict(checkpoint["lr_scheduler_D_A"])
+    lr_scheduler_D_B.load_state_dict(checkpoint["lr_scheduler_D_B"])
+    ema.load_state_dict(checkpoint["ema"])
+if resume:
+    # Image buffers, loss scale, RNG streams and the position in the epoch
+    fake_A_buffer.load_state_dict(checkpoint["fake_A_buffer"])
+    fake_B_buffer.load_state_dict(checkpoint["fake_B_buffer"])
+    amp.load_state_dict(checkpoint["amp"])
+    train_sampler.load_state_dict(checkpoint["sampler"])
+    set_rng_state(checkpoint["rng"])
+    opt.epoch, start_batch = checkpoint["progress"]["epoch"], checkpoint["progress"]["batch"]
+    print("Resuming from %s at epoch %d, batch %d" % (resume, opt.epoch, start_batch))
+
+
+def training_state(epoch, batch):
+    """Everything needed to continue training at ``batch`` of ``epoch``"""
+    return dict(
+        G_AB=G_AB,
+        G_BA=G_BA,
+        D_A=D_A,
+        D_B=D_B,
+        ema=ema,
+        optimizer_G=optimizer_G,
+        optimizer_D_A=optimizer_D_A,
+        optimizer_D_B=optimizer_D_B,
+        lr_scheduler_G=lr_scheduler_G,
+        lr_scheduler_D_A=lr_scheduler_D_A,
+        lr_scheduler_D_B=lr_scheduler_D_B,
+        fake_A_buffer=fake_A_buffer,
+        fake_B_buffer=fake_B_buffer,
+        amp=amp,
+        sampler=train_sampler,
+        rng=rng_state(),
+        progress={"epoch": epoch, "batch": batch},
+    )
+
+
+def sample_images(batches_done):
+    """Saves a generated sample from the test set"""
+    imgs = next(iter(val_dataloader))
+    sampler.submit("images/%s/%s.png" % (opt.dataset_name, batches_done), imgs["A"], imgs["B"], normalize=False)
 
 
 # ----------
 #  Training
 # ----------
 
-prev_time = time.time()
+metrics = Metrics(
+    interval=opt.log_interval,
+    path=opt.metrics_file or None,
+    total_steps=opt.n_epochs * len(dataloader),
+    step=opt.epoch * len(dataloader) + start_batch,
+    fmt="\r[Epoch {epoch}/{n_epochs}] [Batch {batch}/{batches}] [D loss: {loss_D:f}] "
+    "[G loss: {loss_G:f}, adv: {loss_GAN:f}, cycle: {loss_cycle:f}, identity: {loss_identity:f}] ETA: {eta}",
+    end="",
+)
+
+end = time.perf_counter()
 for epoch in range(opt.epoch, opt.n_epochs):
-    for i, batch in enumerate(dataloader):
+    train_sampler.set_epoch(epoch, start_batch * opt.batch_size)
+    for i, batch in enumerate(dataloader, start_batch):
+        start = time.perf_counter()
+        metrics.add_time("data", start - end)
 
         # Set model input
         real_A = Variable(batch["A"].type(Tensor))
@@ -167,33 +305,37 @@ for epoch in range(opt.epoch, opt.n_epochs):
 
         optimizer_G.zero_grad()
 
-        # Identity loss
-        loss_id_A = criterion_identity(G_BA(real_A), real_A)
-        loss_id_B = criterion_identity(G_AB(real_B), real_B)
+        with amp.autocast():
+            # Identity loss
+            loss_id_A = criterion_identity(G_BA(real_A), real_A)
+            loss_id_B = criterion_identity(G_AB(real_B), real_B)
 
-        loss_identity = (loss_id_A + loss_id_B) / 2
+            loss_identity = (loss_id_A + loss_id_B) / 2
 
-        # GAN loss
-        fake_B = G_AB(real_A)
-        loss_GAN_AB = criterion_GAN(D_B(fake_B), valid)
-        fake_A = G_BA(real_B)
-        loss_GAN_BA = criterion_GAN(D_A(fake_A), valid)
+            # GAN loss
+            fake_B = G_AB(real_A)
+            loss_GAN_AB = criterion_GAN(D_B(fake_B), valid)
+            fake_A = G_BA(real_B)
+            loss_GAN_BA = criterion_GAN(D_A(fake_A), valid)
 
-        loss_GAN = (loss_GAN_AB + loss_GAN_BA) / 2
+            loss_GAN = (loss_GAN_AB + loss_GAN_BA) / 2
 
-        # Cycle loss
-        recov_A = G_BA(fake_B)
-        loss_cycle_A = criterion_cycle(recov_A, real_A)
-        recov_B = G_AB(fake_A)
-        loss_cycle_B = criterion_cycle(recov_B, real_B)
+            # Cycle loss
+            recov_A = G_BA(fake_B)
+            loss_cycle_A = criterion_cycle(recov_A, real_A)
+            recov_B = G_AB(fake_A)
+            loss_cycle_B = criterion_cycle(recov_B, real_B)
 
-        loss_cycle = (loss_cycle_A + loss_cycle_B) / 2
+            loss_cycle = (loss_cycle_A + loss_cycle_B) / 2
 
-        # Total loss
-        loss_G = loss_GAN + opt.lambda_cyc * loss_cycle + opt.lambda_id * loss_identity
+            # Total loss
+            loss_G = loss_GAN + opt.lambda_cyc * loss_cycle + opt.lambda_id * loss_identity
 
-        loss_G.backward()
-        optimizer_G.step()
+        amp.backward(loss_G)
+        amp.step(optimizer_G)
+        ema.update()
+        metrics.add_time("g_step", time.perf_counter() - start)
+        start = time.perf_counter()
 
         # -----------------------
         #  Train Discriminator A
@@ -201,16 +343,17 @@ for epoch in range(opt.epoch, opt.n_epochs):
 
         optimizer_D_A.zero_grad()
 
-        # Real loss
-        loss_real = criterion_GAN(D_A(real_A), valid)
-        # Fake loss (on batch of previously generated samples)
-        fake_A_ = fake_A_buffer.push_and_pop(fake_A)
-        loss_fake = criterion_GAN(D_A(fake_A_.detach()), fake)
-        # Total loss
-        loss_D_A = (loss_real + loss_fake) / 2
+        with amp.autocast():
+            # Real loss
+            loss_real = criterion_GAN(D_A(real_A), valid)
+            # Fake loss (on batch of previously generated samples)
+            fake_A_ = fake_A_buffer.push_and_pop(fake_A)
+            loss_fake = criterion_GAN(D_A(fake_A_.detach()), fake)
+            # Total loss
+            loss_D_A = (loss_real + loss_fake) / 2
 
-        loss_D_A.backward()
-        optimizer_D_A.step()
+        amp.backward(loss_D_A)
+        amp.step(optimizer_D_A)
 
         # -----------------------
         #  Train Discriminator B
@@ -218,50 +361,49 @@ for epoch in range(opt.epoch, opt.n_epochs):
 
         optimizer_D_B.zero_grad()
 
-        # Real loss
-        loss_real = criterion_GAN(D_B(real_B), valid)
-        # Fake loss (on batch of previously generated samples)
-        fake_B_ = fake_B_buffer.push_and_pop(fake_B)
-        loss_fake = criterion_GAN(D_B(fake_B_.detach()), fake)
-        # Total loss
-        loss_D_B = (loss_real + loss_fake) / 2
+        with amp.autocast():
+            # Real loss
+            loss_real = criterion_GAN(D_B(real_B), valid)
+            # Fake loss (on batch of previously generated samples)
+            fake_B_ = fake_B_buffer.push_and_pop(fake_B)
+            loss_fake = criterion_GAN(D_B(fake_B_.detach()), fake)
+            # Total loss
+            loss_D_B = (loss_real + loss_fake) / 2
 
-        loss_D_B.backward()
-        optimizer_D_B.step()
+        amp.backward(loss_D_B)
+        amp.step(optimizer_D_B)
+        amp.update()
 
         loss_D = (loss_D_A + loss_D_B) / 2
+        metrics.add_time("d_step", time.perf_counter() - start)
 
         # --------------
         #  Log Progress
         # --------------
 
-        # Determine approximate time left
-        batches_done = epoch * len(dataloader) + i
-        batches_left = opt.n_epochs * len(dataloader) - batches_done
-        time_left = datetime.timedelta(seconds=batches_left * (time.time() - prev_time))
-        prev_time = time.time()
-
-        # Print log
-        sys.stdout.write(
-            "\r[Epoch %d/%d] [Batch %d/%d] [D loss: %f] [G loss: %f, adv: %f, cycle: %f, identity: %f] ETA: %s"
-            % (
-                epoch,
-                opt.n_epochs,
-                i,
-                len(dataloader),
-                loss_D.item(),
-                loss_G.item(),
-                loss_GAN.item(),
-                loss_cycle.item(),
-                loss_identity.item(),
-                time_left,
-            )
+        # Losses stay on the device, they are copied and printed every log_interval batches
+        metrics.update(
+            loss_D=loss_D, loss_G=loss_G, loss_GAN=loss_GAN, loss_cycle=loss_cycle, loss_identity=loss_identity
         )
+        metrics.step(images=real_A.size(0), epoch=epoch, n_epochs=opt.n_epochs, batch=i, batches=len(dataloader))
 
         # If at sample interval save image
+        batches_done = epoch * len(dataloader) + i
         if batches_done % opt.sample_interval == 0:
             sample_images(batches_done)
 
+        if opt.checkpoint_batches and (i + 1) % opt.checkpoint_batches == 0 and i + 1 < len(dataloader):
+            checkpoints.save("%d_batch_%d" % (epoch, i + 1), **training_state(epoch, i + 1))
+        end = time.perf_counter()
+    start_batch = 0
+
+    if opt.cache_mb > 0:
+        stats = cache_stats(dataset)
+        print(
+            "\n[Cache] hit rate: %.3f, evictions: %d, %d MiB"
+            % (stats["hit_rate"], stats["evictions"], stats["bytes"] >> 20)
+        )
+
     # Update learning rates
     lr_scheduler_G.step()
     lr_scheduler_D_A.step()
@@ -269,7 +411,8 @@ for epoch in range(opt.epoch, opt.n_epochs):
 
     if opt.checkpoint_interval != -1 and epoch % opt.checkpoint_interval == 0:
         # Save model checkpoints
-        torch.save(G_AB.state_dict(), "saved_models/%s/G_AB_%d.pth" % (opt.dataset_name, epoch))
-        torch.save(G_BA.state_dict(), "saved_models/%s/G_BA_%d.pth" % (opt.dataset_name, epoch))
-        torch.save(D_A.state_dict(), "saved_models/%s/D_A_%d.pth" % (opt.dataset_name, epoch))
-        torch.save(D_B.state_dict(), "saved_models/%s/D_B_%d.pth" % (opt.dataset_name, epoch))
+        checkpoints.save(epoch, **training_state(epoch + 1, 0))
+
+metrics.close()
+sampler.close()
+checkpoints.close()
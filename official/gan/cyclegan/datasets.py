@@ -1,11 +1,15 @@
-import glob
 import random
 import os
+import sys
 
 from torch.utils.data import Dataset
 from PIL import Image
 import torchvision.transforms as transforms
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.augment import to_uint8_tensor
+from common.records import list_images, load_image
+
 
 def to_rgb(image):
     rgb_image = Image.new("RGB", image.size)
@@ -14,20 +18,21 @@ def to_rgb(image):
 
 
 class ImageDataset(Dataset):
-    def __init__(self, root, transforms_=None, unaligned=False, mode="train"):
+    def __init__(self, root, transforms_=None, unaligned=False, mode="train", packed=False, raw=False):
         self.transform = transforms.Compose(transforms_)
+        self.raw = raw
         self.unaligned = unaligned
 
-        self.files_A = sorted(glob.glob(os.path.join(root, "%s/A" % mode) + "/*.*"))
-        self.files_B = sorted(glob.glob(os.path.join(root, "%s/B" % mode) + "/*.*"))
+        self.files_A = list_images(os.path.join(root, "%s/A" % mode), packed)
+        self.files_B = list_images(os.path.join(root, "%s/B" % mode), packed)
 
     def __getitem__(self, index):
-        image_A = Image.open(self.files_A[index % len(self.files_A)])
+        image_A = load_image(self.files_A, index % len(self.files_A))
 
         if self.unaligned:
-            image_B = Image.open(self.files_B[random.randint(0, len(self.files_B) - 1)])
+            image_B = load_image(self.files_B, random.randint(0, len(self.files_B) - 1))
         else:
-            image_B = Image.open(self.files_B[index % len(self.files_B)])
+            image_B = load_image(self.files_B, index % len(self.files_B))
 
         # Convert grayscale images to rgb
         if image_A.mode != "RGB":
@@ -35,6 +40,9 @@ class ImageDataset(Dataset):
         if image_B.mode != "RGB":
             image_B = to_rgb(image_B)
 
+        if self.raw:
+            return {"A": to_uint8_tensor(image_A), "B": to_uint8_tensor(image_B)}
+
         item_A = self.transform(image_A)
         item_B = self.transform(image_B)
         return {"A": item_A, "B": item_B}
@@ -1,6 +1,8 @@
 import argparse
 import os
 import random
+import sys
+import time
 
 import torch
 from torch import nn
@@ -9,7 +11,12 @@ from torch.backends import cudnn as cudnn
 
 from torchvision import datasets as dset
 from torchvision import transforms as transforms
-from torchvision import utils as vutils
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.checkpoint import CheckpointManager, load_checkpoint
+from common.ema import EMA
+from common.metrics import Metrics
+from common.sampler import AsyncSampler
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--dataset', required=True, help='cifar10 | cifar100')
@@ -25,10 +32,16 @@ parser.add_argument('--lr', type=float, default=0.0002, help='learning rate, def
 parser.add_argument('--beta1', type=float, default=0.5, help='beta1 for adam. default=0.5')
 parser.add_argument('--cuda', action='store_true', help='enables cuda')
 parser.add_argument('--ngpu', type=int, default=1, help='number of GPUs to use')
-parser.add_argument('--netG', default='', help="path to netG (to continue training)")
-parser.add_argument('--netD', default='', help="path to netD (to continue training)")
+parser.add_argument('--netG', default='', help="checkpoint to load netG from (to continue training)")
+parser.add_argument('--netD', default='', help="checkpoint to load netD from (to continue training)")
 parser.add_argument('--outf', default='.', help='folder to output images and model checkpoints')
 parser.add_argument('--manualSeed', type=int, help='manual seed')
+parser.add_argument('--ema_decay', type=float, default=0, help='decay of the generator weight average, 0 disables')
+parser.add_argument('--ema_every', type=int, default=1, help='update the generator average every k generator steps')
+parser.add_argument('--keep_checkpoints', type=int, default=0, help='keep only the last n checkpoints, 0 keeps all')
+parser.add_argument('--sharded_checkpoints', action='store_true', help='one file per net, unchanged ones are hard-linked')
+parser.add_argument('--log_interval', type=int, default=50, help='iterations between loss prints')
+parser.add_argument('--metrics_file', default='', help='also write the losses and step times to this .csv or .jsonl file')
 
 opt = parser.parse_args()
 print(opt)
@@ -121,10 +134,7 @@ netG = Generator(ngpu).to(device)
 netG.apply(weights_init)
 
 if opt.netG != '':
-  if torch.cuda.is_available():
-    netG = torch.load(opt.netG)
-  else:
-    netG = torch.load(opt.netG, map_location='cpu')
+  netG.load_state_dict(load_checkpoint(opt.netG, 'netG', map_location=device))
 
 
 class Discriminator(nn.Module):
@@ -161,10 +171,7 @@ netD = Discriminator(ngpu).to(device)
 netD.apply(weights_init)
 
 if opt.netD != '':
-  if torch.cuda.is_available():
-    netD = torch.load(opt.netD)
-  else:
-    netD = torch.load(opt.netD, map_location='cpu')
+  netD.load_state_dict(load_checkpoint(opt.netD, 'netD', map_location=device))
 
 criterion = nn.BCELoss()
 
@@ -174,8 +181,20 @@ optimizerG = optim.Adam(netG.parameters(), lr=opt.lr, betas=(opt.beta1, 0.999))
 
 
 def main():
+  # moving average of the generator weights, netG itself with --ema_decay 0
+  ema = EMA(netG, decay=opt.ema_decay, every=opt.ema_every)
+  # renders the sample grids in a background process from snapshots of the averaged netG
+  sampler = AsyncSampler(nets={'netG': ema.module})
+  checkpoints = CheckpointManager(opt.outf, keep_last=opt.keep_checkpoints, sharded=opt.sharded_checkpoints)
+  metrics = Metrics(interval=opt.log_interval, path=opt.metrics_file or None,
+                    fmt='[{epoch}/{niter}][{i}/{batches}] Loss_D: {errD:.4f} Loss_G: {errG:.4f} '
+                        'D(x): {D_x:.4f} D(G(z)): {D_G_z1:.4f} / {D_G_z2:.4f} '
+                        'data: {data_ms:.1f}ms D: {d_step_ms:.1f}ms G: {g_step_ms:.1f}ms')
+  end = time.perf_counter()
   for epoch in range(opt.niter):
     for i, (data, _) in enumerate(dataloader):
+      start = time.perf_counter()
+      metrics.add_time('data', start - end)
       ############################
       # (1) Update D network: maximize log(D(x)) + log(1 - D(G(z)))
       ###########################
@@ -187,7 +206,7 @@ def main():
       output = netD(img)
       errD_real = criterion(output, label)
       errD_real.backward()
-      D_x = output.mean().item()
+      D_x = output.mean()
 
       # train with fake
       noise = torch.randn(batch_size, nz, 1, 1, device=device)
@@ -196,39 +215,40 @@ def main():
       output = netD(fake.detach())
       errD_fake = criterion(output, label)
       errD_fake.backward()
-      D_G_z1 = output.mean().item()
+      D_G_z1 = output.mean()
       errD = errD_real + errD_fake
       optimizerD.step()
+      metrics.update(errD=errD, D_x=D_x, D_G_z1=D_G_z1)
+      metrics.add_time('d_step', time.perf_counter() - start)
 
       ############################
       # (2) Update G network: maximize log(D(G(z)))
       ###########################
+      start = time.perf_counter()
       netG.zero_grad()
       label.fill_(1)  # fake labels are real for generator cost
       output = netD(fake)
       errG = criterion(output, label)
       errG.backward()
-      D_G_z2 = output.mean().item()
+      D_G_z2 = output.mean()
       optimizerG.step()
+      ema.update()
+      metrics.update(errG=errG, D_G_z2=D_G_z2)
+      metrics.add_time('g_step', time.perf_counter() - start)
 
-      print(f'[{epoch + 1}/{opt.niter}][{i}/{len(dataloader)}] '
-            f'Loss_D: {errD:.4f} '
-            f'Loss_G: {errG:.4f} '
-            f'D(x): {D_x:.4f} '
-            f'D(G(z)): {D_G_z1:.4f} / {D_G_z2:.4f}')
+      metrics.step(images=batch_size, epoch=epoch + 1, niter=opt.niter, i=i, batches=len(dataloader))
 
       if i % 100 == 0:
-        vutils.save_image(data,
-                          f'{opt.outf}/real_samples.png',
-                          normalize=True)
-        fake = netG(noise)
-        vutils.save_image(fake.detach(),
-                          f'{opt.outf}/fake_samples_epoch_{epoch + 1}.png',
-                          normalize=True)
-
-    # do checkpointing
-    torch.save(netG, f'{opt.outf}/netG_epoch_{epoch + 1}.pth')
-    torch.save(netD, f'{opt.outf}/netD_epoch_{epoch + 1}.pth')
+        sampler.save(f'{opt.outf}/real_samples.png', data, normalize=True)
+        sampler.submit(f'{opt.outf}/fake_samples_epoch_{epoch + 1}.png', noise, normalize=True)
+      end = time.perf_counter()
+
+    # do checkpointing, written in the background from a CPU copy
+    checkpoints.save(f'epoch_{epoch + 1}', netG=netG, netD=netD, ema=ema,
+                     optimizerG=optimizerG, optimizerD=optimizerD)
+  metrics.close()
+  sampler.close()
+  checkpoints.close()
 
 
 if __name__ == '__main__':
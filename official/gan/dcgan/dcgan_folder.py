@@ -1,6 +1,8 @@
 import argparse
 import os
 import random
+import sys
+import time
 
 import torch
 from torch import nn
@@ -11,6 +13,13 @@ from torchvision import datasets as dset
 from torchvision import transforms as transforms
 from torchvision import utils as vutils
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.checkpoint import CheckpointManager, load_checkpoint
+from common.ema import EMA
+from common.metrics import Metrics
+from common.resume import ResumableSampler, rng_state, set_rng_state
+from common.sampler import AsyncSampler
+
 parser = argparse.ArgumentParser()
 parser.add_argument('--dataset', required=True, help='lsun | imagenet | folder | lfw | fake')
 parser.add_argument('--dataroot', required=True, help='path to dataset')
@@ -25,10 +34,18 @@ parser.add_argument('--lr', type=float, default=0.0002, help='learning rate, def
 parser.add_argument('--beta1', type=float, default=0.5, help='beta1 for adam. default=0.5')
 parser.add_argument('--cuda', action='store_true', help='enables cuda')
 parser.add_argument('--ngpu', type=int, default=1, help='number of GPUs to use')
-parser.add_argument('--netG', default='', help="path to netG (to continue training)")
-parser.add_argument('--netD', default='', help="path to netD (to continue training)")
+parser.add_argument('--netG', default='', help="checkpoint to load netG from (to continue training)")
+parser.add_argument('--netD', default='', help="checkpoint to load netD from (to continue training)")
 parser.add_argument('--outf', default='.', help='folder to output images and model checkpoints')
 parser.add_argument('--manualSeed', type=int, help='manual seed')
+parser.add_argument('--ema_decay', type=float, default=0, help='decay of the generator weight average, 0 disables')
+parser.add_argument('--ema_every', type=int, default=1, help='update the generator average every k generator steps')
+parser.add_argument('--keep_checkpoints', type=int, default=0, help='keep only the last n checkpoints, 0 keeps all')
+parser.add_argument('--sharded_checkpoints', action='store_true', help='one file per net, unchanged ones are hard-linked')
+parser.add_argument('--log_interval', type=int, default=50, help='iterations between loss prints')
+parser.add_argument('--metrics_file', default='', help='also write the losses and step times to this .csv or .jsonl file')
+parser.add_argument('--checkpoint_batches', type=int, default=0, help='batches between checkpoints within an epoch, 0 disables')
+parser.add_argument('--resume', default='', help="checkpoint to continue training from, 'latest' for the newest in outf")
 parser.add_argument('--model', type=str, default='train', help='GAN train models.default: \'train\'. other: gen')
 
 opt = parser.parse_args()
@@ -72,8 +89,11 @@ elif opt.dataset == 'fake':
                           transform=transforms.ToTensor())
 
 assert dataset
+# shuffles like shuffle=True, but a resumed epoch can start at any batch without loading the ones before
+data_sampler = ResumableSampler(dataset)
 dataloader = torch.utils.data.DataLoader(dataset, batch_size=opt.batchSize,
-                                         shuffle=True, num_workers=int(opt.workers))
+                                         sampler=data_sampler, num_workers=int(opt.workers),
+                                         generator=torch.Generator().manual_seed(opt.manualSeed))
 
 device = torch.device("cuda:0" if opt.cuda else "cpu")
 ngpu = int(opt.ngpu)
@@ -132,10 +152,7 @@ netG = Generator(ngpu).to(device)
 netG.apply(weights_init_normal)
 
 if opt.netG != '':
-  if torch.cuda.is_available():
-    netG = torch.load(opt.netG)
-  else:
-    netG = torch.load(opt.netG, map_location='cpu')
+  netG.load_state_dict(load_checkpoint(opt.netG, 'netG', map_location=device))
 
 
 class Discriminator(nn.Module):
@@ -176,10 +193,7 @@ netD = Discriminator(ngpu).to(device)
 netD.apply(weights_init_normal)
 
 if opt.netD != '':
-  if torch.cuda.is_available():
-    netD = torch.load(opt.netD)
-  else:
-    netD = torch.load(opt.netD, map_location='cpu')
+  netD.load_state_dict(load_checkpoint(opt.netD, 'netD', map_location=device))
 
 criterion = nn.BCELoss()
 
@@ -198,8 +212,41 @@ def gen_sample():
 
 
 def train():
-  for epoch in range(opt.niter):
-    for i, (data, _) in enumerate(dataloader):
+  # moving average of the generator weights, netG itself with --ema_decay 0
+  ema = EMA(netG, decay=opt.ema_decay, every=opt.ema_every)
+  # renders the sample grids in a background process from snapshots of the averaged netG
+  sampler = AsyncSampler(nets={'netG': ema.module})
+  checkpoints = CheckpointManager(opt.outf, keep_last=opt.keep_checkpoints, sharded=opt.sharded_checkpoints)
+  metrics = Metrics(interval=opt.log_interval, path=opt.metrics_file or None,
+                    fmt='[{epoch}/{niter}][{i}/{batches}] Loss_D: {errD:.4f} Loss_G: {errG:.4f} '
+                        'D(x): {D_x:.4f} D(G(z)): {D_G_z1:.4f} / {D_G_z2:.4f} '
+                        'data: {data_ms:.1f}ms D: {d_step_ms:.1f}ms G: {g_step_ms:.1f}ms')
+
+  def training_state(epoch, batch):
+    return dict(netG=netG, netD=netD, ema=ema, optimizerG=optimizerG, optimizerD=optimizerD,
+                sampler=data_sampler, rng=rng_state(), progress={'epoch': epoch, 'batch': batch})
+
+  start_epoch, start_batch = 0, 0
+  resume = checkpoints.latest() if opt.resume == 'latest' else opt.resume
+  if resume:
+    # weights, Adam moments, RNG streams and the position in the epoch
+    state = load_checkpoint(resume, map_location=device)
+    netG.load_state_dict(state['netG'])
+    netD.load_state_dict(state['netD'])
+    optimizerG.load_state_dict(state['optimizerG'])
+    optimizerD.load_state_dict(state['optimizerD'])
+    ema.load_state_dict(state['ema'])
+    data_sampler.load_state_dict(state['sampler'])
+    set_rng_state(state['rng'])
+    start_epoch, start_batch = state['progress']['epoch'], state['progress']['batch']
+    print(f'Resuming from {resume} at epoch {start_epoch + 1}, batch {start_batch}')
+
+  end = time.perf_counter()
+  for epoch in range(start_epoch, opt.niter):
+    data_sampler.set_epoch(epoch, start_batch * opt.batchSize)
+    for i, (data, _) in enumerate(dataloader, start_batch):
+      start = time.perf_counter()
+      metrics.add_time('data', start - end)
       ############################
       # (1) Update D network: maximize log(D(x)) + log(1 - D(G(z)))
       ###########################
@@ -207,11 +254,11 @@ def train():
       netD.zero_grad()
       img = data.to(device)
       batch_size = img.size(0)
-      label = torch.full((batch_size,), 1, device=device)
+      label = torch.full((batch_size,), 1., device=device)
       output = netD(img)
       errD_real = criterion(output, label)
       errD_real.backward()
-      D_x = output.mean().item()
+      D_x = output.mean()
 
       # train with fake
       noise = torch.randn(batch_size, nz, 1, 1, device=device)
@@ -220,39 +267,43 @@ def train():
       output = netD(fake.detach())
       errD_fake = criterion(output, label)
       errD_fake.backward()
-      D_G_z1 = output.mean().item()
+      D_G_z1 = output.mean()
       errD = errD_real + errD_fake
       optimizerD.step()
+      metrics.update(errD=errD, D_x=D_x, D_G_z1=D_G_z1)
+      metrics.add_time('d_step', time.perf_counter() - start)
 
       ############################
       # (2) Update G network: maximize log(D(G(z)))
       ###########################
+      start = time.perf_counter()
       netG.zero_grad()
       label.fill_(1)  # fake labels are real for generator cost
       output = netD(fake)
       errG = criterion(output, label)
       errG.backward()
-      D_G_z2 = output.mean().item()
+      D_G_z2 = output.mean()
       optimizerG.step()
+      ema.update()
+      metrics.update(errG=errG, D_G_z2=D_G_z2)
+      metrics.add_time('g_step', time.perf_counter() - start)
 
-      print(f'[{epoch + 1}/{opt.niter}][{i}/{len(dataloader)}] '
-            f'Loss_D: {errD:.4f} '
-            f'Loss_G: {errG:.4f} '
-            f'D(x): {D_x:.4f} '
-            f'D(G(z)): {D_G_z1:.4f} / {D_G_z2:.4f}')
+      metrics.step(images=batch_size, epoch=epoch + 1, niter=opt.niter, i=i, batches=len(dataloader))
 
       if i % 100 == 0:
-        vutils.save_image(data,
-                          f'{opt.outf}/real_samples.png',
-                          normalize=True)
-        fake = netG(noise)
-        vutils.save_image(fake.detach(),
-                          f'{opt.outf}/fake_samples_epoch_{epoch + 1}.png',
-                          normalize=True)
-
-    # do checkpointing
-    torch.save(netG, f'{opt.outf}/netG_epoch_{epoch + 1}.pth')
-    torch.save(netD, f'{opt.outf}/netD_epoch_{epoch + 1}.pth')
+        sampler.save(f'{opt.outf}/real_samples.png', data, normalize=True)
+        sampler.submit(f'{opt.outf}/fake_samples_epoch_{epoch + 1}.png', noise, normalize=True)
+
+      if opt.checkpoint_batches and (i + 1) % opt.checkpoint_batches == 0 and i + 1 < len(dataloader):
+        checkpoints.save(f'epoch_{epoch}_batch_{i + 1}', **training_state(epoch, i + 1))
+      end = time.perf_counter()
+
+    start_batch = 0
+    # do checkpointing, written in the background from a CPU copy
+    checkpoints.save(f'epoch_{epoch + 1}', **training_state(epoch + 1, 0))
+  metrics.close()
+  sampler.close()
+  checkpoints.close()
 
 
 if __name__ == '__main__':
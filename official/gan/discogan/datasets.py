@@ -1,5 +1,5 @@
-import glob
 import os
+import sys
 import torch
 
 import numpy as np
@@ -8,15 +8,18 @@ from torch.utils.data import Dataset
 from PIL import Image
 import torchvision.transforms as transforms
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.records import list_images, load_image
+
 class ImageDataset(Dataset):
-    def __init__(self, root, transforms_=None, mode='train'):
+    def __init__(self, root, transforms_=None, mode='train', packed=False):
         self.transform = transforms.Compose(transforms_)
 
-        self.files = sorted(glob.glob(os.path.join(root, mode) + '/*.*'))
+        self.files = list_images(os.path.join(root, mode), packed)
 
     def __getitem__(self, index):
 
-        img = Image.open(self.files[index % len(self.files)])
+        img = load_image(self.files, index % len(self.files))
         w, h = img.size
         img_A = img.crop((0, 0, w/2, h))
         img_B = img.crop((w/2, 0, w, h))
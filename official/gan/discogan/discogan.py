@@ -30,6 +30,7 @@ parser.add_argument("--lr", type=float, default=0.0002, help="adam: learning rat
 parser.add_argument("--b1", type=float, default=0.5, help="adam: decay of first order momentum of gradient")
 parser.add_argument("--b2", type=float, default=0.999, help="adam: decay of first order momentum of gradient")
 parser.add_argument("--n_cpu", type=int, default=8, help="number of cpu threads to use during batch generation")
+parser.add_argument("--packed", action="store_true", help="read <dataset>.records shards from common/records.py")
 parser.add_argument("--img_height", type=int, default=64, help="size of image height")
 parser.add_argument("--img_width", type=int, default=64, help="size of image width")
 parser.add_argument("--channels", type=int, default=3, help="number of image channels")
@@ -96,13 +97,13 @@ transforms_ = [
     transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5)),
 ]
 dataloader = DataLoader(
-    ImageDataset("../../data/%s" % opt.dataset_name, transforms_=transforms_, mode="train"),
+    ImageDataset("../../data/%s" % opt.dataset_name, transforms_=transforms_, mode="train", packed=opt.packed),
     batch_size=opt.batch_size,
     shuffle=True,
     num_workers=opt.n_cpu,
 )
 val_dataloader = DataLoader(
-    ImageDataset("../../data/%s" % opt.dataset_name, transforms_=transforms_, mode="val"),
+    ImageDataset("../../data/%s" % opt.dataset_name, transforms_=transforms_, mode="val", packed=opt.packed),
     batch_size=16,
     shuffle=True,
     num_workers=opt.n_cpu,
@@ -1,5 +1,6 @@
 import argparse
 import os
+import sys
 import numpy as np
 import math
 
@@ -9,12 +10,14 @@ from torchvision.utils import save_image
 from torch.utils.data import DataLoader
 from torchvision import datasets
 from torch.autograd import Variable
-import torch.autograd as autograd
 
 import torch.nn as nn
 import torch.nn.functional as F
 import torch
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.penalty import GradientPenalty
+
 os.makedirs("images", exist_ok=True)
 
 parser = argparse.ArgumentParser()
@@ -141,30 +144,8 @@ optimizer_D = torch.optim.Adam(discriminator.parameters(), lr=opt.lr, betas=(opt
 Tensor = torch.cuda.FloatTensor if cuda else torch.FloatTensor
 
 
-def compute_gradient_penalty(D, X):
-    """Calculates the gradient penalty loss for DRAGAN"""
-    # Random weight term for interpolation
-    alpha = Tensor(np.random.random(size=X.shape))
-
-    interpolates = alpha * X + ((1 - alpha) * (X + 0.5 * X.std() * torch.rand(X.size())))
-    interpolates = Variable(interpolates, requires_grad=True)
-
-    d_interpolates = D(interpolates)
-
-    fake = Variable(Tensor(X.shape[0], 1).fill_(1.0), requires_grad=False)
-
-    # Get gradient w.r.t. interpolates
-    gradients = autograd.grad(
-        outputs=d_interpolates,
-        inputs=interpolates,
-        grad_outputs=fake,
-        create_graph=True,
-        retain_graph=True,
-        only_inputs=True,
-    )[0]
-
-    gradient_penalty = lambda_gp * ((gradients.norm(2, dim=1) - 1) ** 2).mean()
-    return gradient_penalty
+# Calculates the gradient penalty loss for DRAGAN
+compute_gradient_penalty = GradientPenalty("dragan", weight=lambda_gp)
 
 
 # ----------
@@ -1,6 +1,5 @@
 import argparse
 import os
-import numpy as np
 import math
 import itertools
 import scipy
@@ -14,10 +13,10 @@ from torchvision.utils import save_image
 from torch.utils.data import DataLoader
 from torchvision import datasets
 from torch.autograd import Variable
-import torch.autograd as autograd
 
 from datasets import *
 from models import *
+from common.penalty import GradientPenalty
 
 import torch.nn as nn
 import torch.nn.functional as F
@@ -34,6 +33,7 @@ parser.add_argument("--lr", type=float, default=0.0002, help="adam: learning rat
 parser.add_argument("--b1", type=float, default=0.5, help="adam: decay of first order momentum of gradient")
 parser.add_argument("--b2", type=float, default=0.999, help="adam: decay of first order momentum of gradient")
 parser.add_argument("--n_cpu", type=int, default=8, help="number of cpu threads to use during batch generation")
+parser.add_argument("--packed", action="store_true", help="read <dataset>.records shards from common/records.py")
 parser.add_argument("--img_size", type=int, default=128, help="size of each image dimension")
 parser.add_argument("--channels", type=int, default=3, help="number of image channels")
 parser.add_argument("--n_critic", type=int, default=5, help="number of training steps for discriminator per iter")
@@ -90,13 +90,13 @@ transforms_ = [
     transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5)),
 ]
 dataloader = DataLoader(
-    ImageDataset("../../data/%s" % opt.dataset_name, transforms_=transforms_),
+    ImageDataset("../../data/%s" % opt.dataset_name, transforms_=transforms_, packed=opt.packed),
     batch_size=opt.batch_size,
     shuffle=True,
     num_workers=opt.n_cpu,
 )
 val_dataloader = DataLoader(
-    ImageDataset("../../data/%s" % opt.dataset_name, mode="val", transforms_=transforms_),
+    ImageDataset("../../data/%s" % opt.dataset_name, mode="val", transforms_=transforms_, packed=opt.packed),
     batch_size=16,
     shuffle=True,
     num_workers=1,
@@ -113,26 +113,8 @@ FloatTensor = torch.cuda.FloatTensor if cuda else torch.FloatTensor
 LongTensor = torch.cuda.LongTensor if cuda else torch.LongTensor
 
 
-def compute_gradient_penalty(D, real_samples, fake_samples):
-    """Calculates the gradient penalty loss for WGAN GP"""
-    # Random weight term for interpolation between real and fake samples
-    alpha = FloatTensor(np.random.random((real_samples.size(0), 1, 1, 1)))
-    # Get random interpolation between real and fake samples
-    interpolates = (alpha * real_samples + ((1 - alpha) * fake_samples)).requires_grad_(True)
-    validity = D(interpolates)
-    fake = Variable(FloatTensor(np.ones(validity.shape)), requires_grad=False)
-    # Get gradient w.r.t. interpolates
-    gradients = autograd.grad(
-        outputs=validity,
-        inputs=interpolates,
-        grad_outputs=fake,
-        create_graph=True,
-        retain_graph=True,
-        only_inputs=True,
-    )[0]
-    gradients = gradients.view(gradients.size(0), -1)
-    gradient_penalty = ((gradients.norm(2, dim=1) - 1) ** 2).mean()
-    return gradient_penalty
+# Calculates the gradient penalty loss for WGAN GP
+compute_gradient_penalty = GradientPenalty("wgan-gp", weight=lambda_gp)
 
 
 def sample_images(batches_done):
@@ -179,7 +161,7 @@ for epoch in range(opt.n_epochs):
         # Compute gradient penalty for improved wasserstein training
         gp_A = compute_gradient_penalty(D_A, imgs_A.data, fake_A.data)
         # Adversarial loss
-        D_A_loss = -torch.mean(D_A(imgs_A)) + torch.mean(D_A(fake_A)) + lambda_gp * gp_A
+        D_A_loss = -torch.mean(D_A(imgs_A)) + torch.mean(D_A(fake_A)) + gp_A
 
         # ----------
         # Domain B
@@ -188,7 +170,7 @@ for epoch in range(opt.n_epochs):
         # Compute gradient penalty for improved wasserstein training
         gp_B = compute_gradient_penalty(D_B, imgs_B.data, fake_B.data)
         # Adversarial loss
-        D_B_loss = -torch.mean(D_B(imgs_B)) + torch.mean(D_B(fake_B)) + lambda_gp * gp_B
+        D_B_loss = -torch.mean(D_B(imgs_B)) + torch.mean(D_B(fake_B)) + gp_B
 
         # Total loss
         D_loss = D_A_loss + D_B_loss
@@ -1,24 +1,28 @@
-import glob
 import random
 import os
+import sys
 import numpy as np
 
 from torch.utils.data import Dataset
 from PIL import Image
 import torchvision.transforms as transforms
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.records import list_images, load_image
+
 
 class ImageDataset(Dataset):
-    def __init__(self, root, transforms_=None, mode="train"):
+    def __init__(self, root, transforms_=None, mode="train", packed=False):
         self.transform = transforms.Compose(transforms_)
 
-        self.files = sorted(glob.glob(os.path.join(root, mode) + "/*.*"))
+        roots = [os.path.join(root, mode)]
         if mode == "train":
-            self.files.extend(sorted(glob.glob(os.path.join(root, "test") + "/*.*")))
+            roots.append(os.path.join(root, "test"))
+        self.files = list_images(roots, packed)
 
     def __getitem__(self, index):
 
-        img = Image.open(self.files[index % len(self.files)])
+        img = load_image(self.files, index % len(self.files))
         w, h = img.size
         img_A = img.crop((0, 0, w / 2, h))
         img_B = img.crop((w / 2, 0, w, h))
@@ -224,7 +224,7 @@ class MultiDiscriminator(nn.Module):
 
     def compute_loss(self, x, gt):
         """Computes the MSE between model output and scalar gt"""
-        loss = sum([torch.mean((out - gt) ** 2) for out in self.forward(x)])
+        loss = sum([torch.mean((out.float() - gt) ** 2) for out in self.forward(x)])
         return loss
 
     def forward(self, x):
@@ -291,9 +291,9 @@ class AdaptiveInstanceNorm2d(nn.Module):
         # Apply instance norm
         x_reshaped = x.contiguous().view(1, b * c, h, w)
 
-        out = F.batch_norm(
-            x_reshaped, running_mean, running_var, self.weight, self.bias, True, self.momentum, self.eps
-        )
+        # the MLP assigning weight and bias may run in a lower precision than x
+        weight, bias = self.weight.to(x.dtype), self.bias.to(x.dtype)
+        out = F.batch_norm(x_reshaped, running_mean, running_var, weight, bias, True, self.momentum, self.eps)
 
         return out.view(b, c, h, w)
 
@@ -8,7 +8,6 @@ import time
 import sys
 
 import torchvision.transforms as transforms
-from torchvision.utils import save_image
 
 from torch.utils.data import DataLoader
 from torchvision import datasets
@@ -16,6 +15,9 @@ from torch.autograd import Variable
 
 from models import *
 from datasets import *
+from common.ema import EMA
+from common.sampler import AsyncSampler
+from common.amp import MixedPrecision
 
 import torch.nn as nn
 import torch.nn.functional as F
@@ -31,11 +33,17 @@ parser.add_argument("--b1", type=float, default=0.5, help="adam: decay of first
 parser.add_argument("--b2", type=float, default=0.999, help="adam: decay of first order momentum of gradient")
 parser.add_argument("--decay_epoch", type=int, default=100, help="epoch from which to start lr decay")
 parser.add_argument("--n_cpu", type=int, default=8, help="number of cpu threads to use during batch generation")
+parser.add_argument("--packed", action="store_true", help="read <dataset>.records shards from common/records.py")
 parser.add_argument("--img_height", type=int, default=128, help="size of image height")
 parser.add_argument("--img_width", type=int, default=128, help="size of image width")
 parser.add_argument("--channels", type=int, default=3, help="number of image channels")
 parser.add_argument("--sample_interval", type=int, default=400, help="interval saving generator samples")
 parser.add_argument("--checkpoint_interval", type=int, default=-1, help="interval between saving model checkpoints")
+parser.add_argument("--ema_decay", type=float, default=0, help="decay of the generator weight average, 0 disables")
+parser.add_argument("--ema_every", type=int, default=1, help="update the generator average every k generator steps")
+parser.add_argument(
+    "--precision", type=str, default="fp32", choices=["fp32", "bf16", "fp16"], help="bf16 on CPU or CUDA, fp16 on CUDA"
+)
 parser.add_argument("--n_downsample", type=int, default=2, help="number downsampling layers in encoder")
 parser.add_argument("--n_residual", type=int, default=3, help="number of residual blocks in encoder / decoder")
 parser.add_argument("--dim", type=int, default=64, help="number of filters in first encoder layer")
@@ -68,6 +76,10 @@ if cuda:
     D2 = D2.cuda()
     criterion_recon.cuda()
 
+# Mixed precision, normalization layers stay in float32
+amp = MixedPrecision(opt.precision, "cuda" if cuda else "cpu")
+amp.keep_fp32(Enc1, Dec1, Enc2, Dec2, D1, D2)
+
 if opt.epoch != 0:
     # Load pretrained models
     Enc1.load_state_dict(torch.load("saved_models/%s/Enc1_%d.pth" % (opt.dataset_name, opt.epoch)))
@@ -122,40 +134,52 @@ transforms_ = [
 ]
 
 dataloader = DataLoader(
-    ImageDataset("../../data/%s" % opt.dataset_name, transforms_=transforms_),
+    ImageDataset("../../data/%s" % opt.dataset_name, transforms_=transforms_, packed=opt.packed),
     batch_size=opt.batch_size,
     shuffle=True,
     num_workers=opt.n_cpu,
 )
 
 val_dataloader = DataLoader(
-    ImageDataset("../../data/%s" % opt.dataset_name, transforms_=transforms_, mode="val"),
+    ImageDataset("../../data/%s" % opt.dataset_name, transforms_=transforms_, mode="val", packed=opt.packed),
     batch_size=5,
     shuffle=True,
     num_workers=1,
 )
 
 
-def sample_images(batches_done):
-    """Saves a generated sample from the validation set"""
-    imgs = next(iter(val_dataloader))
+def render_samples(nets, imgs_A, imgs_B):
+    """Renders the style samples, in the sampler process on a snapshot of the encoder and decoder"""
+    Enc1, Dec2 = nets["Enc1"], nets["Dec2"]
     img_samples = None
-    for img1, img2 in zip(imgs["A"], imgs["B"]):
+    for img1, img2 in zip(imgs_A, imgs_B):
         # Create copies of image
         X1 = img1.unsqueeze(0).repeat(opt.style_dim, 1, 1, 1)
-        X1 = Variable(X1.type(Tensor))
         # Get random style codes
         s_code = np.random.uniform(-1, 1, (opt.style_dim, opt.style_dim))
-        s_code = Variable(Tensor(s_code))
+        s_code = torch.as_tensor(s_code, dtype=X1.dtype, device=X1.device)
         # Generate samples
         c_code_1, _ = Enc1(X1)
         X12 = Dec2(c_code_1, s_code)
         # Concatenate samples horisontally
-        X12 = torch.cat([x for x in X12.data.cpu()], -1)
+        X12 = torch.cat([x for x in X12], -1)
         img_sample = torch.cat((img1, X12), -1).unsqueeze(0)
         # Concatenate with previous samples vertically
         img_samples = img_sample if img_samples is None else torch.cat((img_samples, img_sample), -2)
-    save_image(img_samples, "images/%s/%s.png" % (opt.dataset_name, batches_done), nrow=5, normalize=True)
+    return img_samples
+
+
+# Moving average of the encoder and decoder weights, the nets themselves with --ema_decay 0
+ema = EMA(
+    nn.ModuleDict({"Enc1": Enc1, "Dec1": Dec1, "Enc2": Enc2, "Dec2": Dec2}), decay=opt.ema_decay, every=opt.ema_every
+)
+sampler = AsyncSampler(render_samples, {"Enc1": ema.module["Enc1"], "Dec2": ema.module["Dec2"]})
+
+
+def sample_images(batches_done):
+    """Saves a generated sample from the validation set"""
+    imgs = next(iter(val_dataloader))
+    sampler.submit("images/%s/%s.png" % (opt.dataset_name, batches_done), imgs["A"], imgs["B"], nrow=5, normalize=True)
 
 
 # ----------
@@ -184,52 +208,54 @@ for epoch in range(opt.epoch, opt.n_epochs):
 
         optimizer_G.zero_grad()
 
-        # Get shared latent representation
-        c_code_1, s_code_1 = Enc1(X1)
-        c_code_2, s_code_2 = Enc2(X2)
-
-        # Reconstruct images
-        X11 = Dec1(c_code_1, s_code_1)
-        X22 = Dec2(c_code_2, s_code_2)
-
-        # Translate images
-        X21 = Dec1(c_code_2, style_1)
-        X12 = Dec2(c_code_1, style_2)
-
-        # Cycle translation
-        c_code_21, s_code_21 = Enc1(X21)
-        c_code_12, s_code_12 = Enc2(X12)
-        X121 = Dec1(c_code_12, s_code_1) if lambda_cyc > 0 else 0
-        X212 = Dec2(c_code_21, s_code_2) if lambda_cyc > 0 else 0
-
-        # Losses
-        loss_GAN_1 = lambda_gan * D1.compute_loss(X21, valid)
-        loss_GAN_2 = lambda_gan * D2.compute_loss(X12, valid)
-        loss_ID_1 = lambda_id * criterion_recon(X11, X1)
-        loss_ID_2 = lambda_id * criterion_recon(X22, X2)
-        loss_s_1 = lambda_style * criterion_recon(s_code_21, style_1)
-        loss_s_2 = lambda_style * criterion_recon(s_code_12, style_2)
-        loss_c_1 = lambda_cont * criterion_recon(c_code_12, c_code_1.detach())
-        loss_c_2 = lambda_cont * criterion_recon(c_code_21, c_code_2.detach())
-        loss_cyc_1 = lambda_cyc * criterion_recon(X121, X1) if lambda_cyc > 0 else 0
-        loss_cyc_2 = lambda_cyc * criterion_recon(X212, X2) if lambda_cyc > 0 else 0
-
-        # Total loss
-        loss_G = (
-            loss_GAN_1
-            + loss_GAN_2
-            + loss_ID_1
-            + loss_ID_2
-            + loss_s_1
-            + loss_s_2
-            + loss_c_1
-            + loss_c_2
-            + loss_cyc_1
-            + loss_cyc_2
-        )
-
-        loss_G.backward()
-        optimizer_G.step()
+        with amp.autocast():
+            # Get shared latent representation
+            c_code_1, s_code_1 = Enc1(X1)
+            c_code_2, s_code_2 = Enc2(X2)
+
+            # Reconstruct images
+            X11 = Dec1(c_code_1, s_code_1)
+            X22 = Dec2(c_code_2, s_code_2)
+
+            # Translate images
+            X21 = Dec1(c_code_2, style_1)
+            X12 = Dec2(c_code_1, style_2)
+
+            # Cycle translation
+            c_code_21, s_code_21 = Enc1(X21)
+            c_code_12, s_code_12 = Enc2(X12)
+            X121 = Dec1(c_code_12, s_code_1) if lambda_cyc > 0 else 0
+            X212 = Dec2(c_code_21, s_code_2) if lambda_cyc > 0 else 0
+
+            # Losses
+            loss_GAN_1 = lambda_gan * D1.compute_loss(X21, valid)
+            loss_GAN_2 = lambda_gan * D2.compute_loss(X12, valid)
+            loss_ID_1 = lambda_id * criterion_recon(X11, X1)
+            loss_ID_2 = lambda_id * criterion_recon(X22, X2)
+            loss_s_1 = lambda_style * criterion_recon(s_code_21, style_1)
+            loss_s_2 = lambda_style * criterion_recon(s_code_12, style_2)
+            loss_c_1 = lambda_cont * criterion_recon(c_code_12, c_code_1.detach())
+            loss_c_2 = lambda_cont * criterion_recon(c_code_21, c_code_2.detach())
+            loss_cyc_1 = lambda_cyc * criterion_recon(X121, X1) if lambda_cyc > 0 else 0
+            loss_cyc_2 = lambda_cyc * criterion_recon(X212, X2) if lambda_cyc > 0 else 0
+
+            # Total loss
+            loss_G = (
+                loss_GAN_1
+                + loss_GAN_2
+                + loss_ID_1
+                + loss_ID_2
+                + loss_s_1
+                + loss_s_2
+                + loss_c_1
+                + loss_c_2
+                + loss_cyc_1
+                + loss_cyc_2
+            )
+
+        amp.backward(loss_G)
+        amp.step(optimizer_G)
+        ema.update()
 
         # -----------------------
         #  Train Discriminator 1
@@ -237,10 +263,11 @@ for epoch in range(opt.epoch, opt.n_epochs):
 
         optimizer_D1.zero_grad()
 
-        loss_D1 = D1.compute_loss(X1, valid) + D1.compute_loss(X21.detach(), fake)
+        with amp.autocast():
+            loss_D1 = D1.compute_loss(X1, valid) + D1.compute_loss(X21.detach(), fake)
 
-        loss_D1.backward()
-        optimizer_D1.step()
+        amp.backward(loss_D1)
+        amp.step(optimizer_D1)
 
         # -----------------------
         #  Train Discriminator 2
@@ -248,10 +275,12 @@ for epoch in range(opt.epoch, opt.n_epochs):
 
         optimizer_D2.zero_grad()
 
-        loss_D2 = D2.compute_loss(X2, valid) + D2.compute_loss(X12.detach(), fake)
+        with amp.autocast():
+            loss_D2 = D2.compute_loss(X2, valid) + D2.compute_loss(X12.detach(), fake)
 
-        loss_D2.backward()
-        optimizer_D2.step()
+        amp.backward(loss_D2)
+        amp.step(optimizer_D2)
+        amp.update()
 
         # --------------
         #  Log Progress
@@ -284,5 +313,9 @@ for epoch in range(opt.epoch, opt.n_epochs):
         torch.save(Dec1.state_dict(), "saved_models/%s/Dec1_%d.pth" % (opt.dataset_name, epoch))
         torch.save(Enc2.state_dict(), "saved_models/%s/Enc2_%d.pth" % (opt.dataset_name, epoch))
         torch.save(Dec2.state_dict(), "saved_models/%s/Dec2_%d.pth" % (opt.dataset_name, epoch))
+        if ema.enabled:
+            torch.save(ema.module.state_dict(), "saved_models/%s/G_ema_%d.pth" % (opt.dataset_name, epoch))
         torch.save(D1.state_dict(), "saved_models/%s/D1_%d.pth" % (opt.dataset_name, epoch))
         torch.save(D2.state_dict(), "saved_models/%s/D2_%d.pth" % (opt.dataset_name, epoch))
+
+sampler.close()
@@ -1,27 +1,37 @@
-import glob
 import os
+import sys
 import numpy as np
 
 from torch.utils.data import Dataset
 from PIL import Image
 import torchvision.transforms as transforms
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.augment import to_uint8_tensor
+from common.records import list_images, load_image
+
 
 class ImageDataset(Dataset):
-    def __init__(self, root, transforms_=None, mode="train"):
+    def __init__(self, root, transforms_=None, mode="train", packed=False, raw=False):
         self.transform = transforms.Compose(transforms_)
+        self.raw = raw
 
-        self.files = sorted(glob.glob(os.path.join(root, mode) + "/*.*"))
+        roots = [os.path.join(root, mode)]
         if mode == "train":
-            self.files.extend(sorted(glob.glob(os.path.join(root, "test") + "/*.*")))
+            roots.append(os.path.join(root, "test"))
+        self.files = list_images(roots, packed)
 
     def __getitem__(self, index):
 
-        img = Image.open(self.files[index % len(self.files)])
+        img = load_image(self.files, index % len(self.files))
         w, h = img.size
         img_A = img.crop((0, 0, w / 2, h))
         img_B = img.crop((w / 2, 0, w, h))
 
+        if self.raw:
+            # Flip and normalization happen batch-wise in common.augment.BatchAugment
+            return {"A": to_uint8_tensor(img_A), "B": to_uint8_tensor(img_B)}
+
         if np.random.random() < 0.5:
             img_A = Image.fromarray(np.array(img_A)[:, ::-1, :], "RGB")
             img_B = Image.fromarray(np.array(img_B)[:, ::-1, :], "RGB")
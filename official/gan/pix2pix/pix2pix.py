@@ -4,11 +4,8 @@ import numpy as np
 import math
 import itertools
 import time
-import datetime
-import sys
 
 import torchvision.transforms as transforms
-from torchvision.utils import save_image
 
 from torch.utils.data import DataLoader
 from torchvision import datasets
@@ -16,6 +13,13 @@ from torch.autograd import Variable
 
 from models import *
 from datasets import *
+from common.augment import BatchAugment
+from common.checkpoint import CheckpointManager, load_checkpoint
+from common.metrics import Metrics
+from common.ema import EMA
+from common.sampler import AsyncSampler
+from common.amp import MixedPrecision
+from common.resume import ResumableSampler, rng_state, set_rng_state
 
 import torch.nn as nn
 import torch.nn.functional as F
@@ -31,6 +35,8 @@ parser.add_argument("--b1", type=float, default=0.5, help="adam: decay of first
 parser.add_argument("--b2", type=float, default=0.999, help="adam: decay of first order momentum of gradient")
 parser.add_argument("--decay_epoch", type=int, default=100, help="epoch from which to start lr decay")
 parser.add_argument("--n_cpu", type=int, default=8, help="number of cpu threads to use during batch generation")
+parser.add_argument("--packed", action="store_true", help="read <dataset>.records shards from common/records.py")
+parser.add_argument("--batch_augment", action="store_true", help="augment uint8 batches in the collate stage")
 parser.add_argument("--img_height", type=int, default=256, help="size of image height")
 parser.add_argument("--img_width", type=int, default=256, help="size of image width")
 parser.add_argument("--channels", type=int, default=3, help="number of image channels")
@@ -38,11 +44,32 @@ parser.add_argument(
     "--sample_interval", type=int, default=500, help="interval between sampling of images from generators"
 )
 parser.add_argument("--checkpoint_interval", type=int, default=-1, help="interval between model checkpoints")
+parser.add_argument("--keep_checkpoints", type=int, default=0, help="keep only the last n checkpoints, 0 keeps all")
+parser.add_argument(
+    "--sharded_checkpoints", action="store_true", help="one file per net, unchanged ones are hard-linked"
+)
+parser.add_argument(
+    "--checkpoint_batches", type=int, default=0, help="batches between checkpoints within an epoch, 0 disables"
+)
+parser.add_argument(
+    "--resume", type=str, default="", help="checkpoint to continue training from exactly, 'latest' for the newest"
+)
+parser.add_argument("--ema_decay", type=float, default=0, help="decay of the generator weight average, 0 disables")
+parser.add_argument("--ema_every", type=int, default=1, help="update the generator average every k generator steps")
+parser.add_argument("--log_interval", type=int, default=10, help="batches between progress lines")
+parser.add_argument("--metrics_file", type=str, default="", help="also write the losses to this .csv or .jsonl file")
+parser.add_argument(
+    "--precision", type=str, default="fp32", choices=["fp32", "bf16", "fp16"], help="bf16 on CPU or CUDA, fp16 on CUDA"
+)
 opt = parser.parse_args()
 print(opt)
 
 os.makedirs("images/%s" % opt.dataset_name, exist_ok=True)
 os.makedirs("saved_models/%s" % opt.dataset_name, exist_ok=True)
+# Nets and optimizers of an epoch go to one checkpoint, written in the background
+checkpoints = CheckpointManager(
+    "saved_models/%s" % opt.dataset_name, keep_last=opt.keep_checkpoints, sharded=opt.sharded_checkpoints
+)
 
 cuda = True if torch.cuda.is_available() else False
 
@@ -66,10 +93,20 @@ if cuda:
     criterion_GAN.cuda()
     criterion_pixelwise.cuda()
 
-if opt.epoch != 0:
+# Mixed precision, normalization layers stay in float32
+amp = MixedPrecision(opt.precision, "cuda" if cuda else "cpu")
+amp.keep_fp32(generator, discriminator)
+
+resume = checkpoints.latest() if opt.resume == "latest" else opt.resume
+if resume:
+    checkpoint = load_checkpoint(resume, map_location="cuda" if cuda else "cpu")
+elif opt.epoch != 0:
+    checkpoint = checkpoints.load(opt.epoch, map_location="cuda" if cuda else "cpu")
+
+if resume or opt.epoch != 0:
     # Load pretrained models
-    generator.load_state_dict(torch.load("saved_models/%s/generator_%d.pth" % (opt.dataset_name, opt.epoch)))
-    discriminator.load_state_dict(torch.load("saved_models/%s/discriminator_%d.pth" % (opt.dataset_name, opt.epoch)))
+    generator.load_state_dict(checkpoint["generator"])
+    discriminator.load_state_dict(checkpoint["discriminator"])
 else:
     # Initialize weights
     generator.apply(weights_init_normal)
@@ -86,42 +123,106 @@ transforms_ = [
     transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5)),
 ]
 
+# Same transforms applied to whole uint8 batches, the flip of the dataset included
+collate_fn = BatchAugment(size=(opt.img_height, opt.img_width), flip=True) if opt.batch_augment else None
+
+dataset = ImageDataset(
+    "../../data/%s" % opt.dataset_name, transforms_=transforms_, packed=opt.packed, raw=opt.batch_augment
+)
+# Shuffles every epoch, a resumed epoch starts at its batch without loading the ones before
+train_sampler = ResumableSampler(dataset)
 dataloader = DataLoader(
-    ImageDataset("../../data/%s" % opt.dataset_name, transforms_=transforms_),
+    dataset,
     batch_size=opt.batch_size,
-    shuffle=True,
+    sampler=train_sampler,
     num_workers=opt.n_cpu,
+    collate_fn=collate_fn,
 )
 
 val_dataloader = DataLoader(
-    ImageDataset("../../data/%s" % opt.dataset_name, transforms_=transforms_, mode="val"),
+    ImageDataset(
+        "../../data/%s" % opt.dataset_name,
+        transforms_=transforms_,
+        mode="val",
+        packed=opt.packed,
+        raw=opt.batch_augment,
+    ),
     batch_size=10,
     shuffle=True,
     num_workers=1,
+    collate_fn=collate_fn,
 )
 
 # Tensor type
 Tensor = torch.cuda.FloatTensor if cuda else torch.FloatTensor
 
 
+def render_samples(nets, real_A, real_B):
+    """Renders the sample grid, in the sampler process on a snapshot of the generator"""
+    fake_B = nets["generator"](real_A)
+    return torch.cat((real_A, fake_B, real_B), -2)
+
+
+# Moving average of the generator weights, the generator itself with --ema_decay 0
+ema = EMA(generator, decay=opt.ema_decay, every=opt.ema_every)
+sampler = AsyncSampler(render_samples, {"generator": ema.module})
+
+start_batch = 0
+if resume or opt.epoch != 0:
+    # Continue with the optimizer and average state of the checkpoint
+    optimizer_G.load_state_dict(checkpoint["optimizer_G"])
+    optimizer_D.load_state_dict(checkpoint["optimizer_D"])
+    ema.load_state_dict(checkpoint["ema"])
+if resume:
+    # Loss scale, RNG streams and the position in the epoch
+    amp.load_state_dict(checkpoint["amp"])
+    train_sampler.load_state_dict(checkpoint["sampler"])
+    set_rng_state(checkpoint["rng"])
+    opt.epoch, start_batch = checkpoint["progress"]["epoch"], checkpoint["progress"]["batch"]
+    print("Resuming from %s at epoch %d, batch %d" % (resume, opt.epoch, start_batch))
+
+
+def training_state(epoch, batch):
+    """Everything needed to continue training at ``batch`` of ``epoch``"""
+    return dict(
+        generator=generator,
+        discriminator=discriminator,
+        ema=ema,
+        optimizer_G=optimizer_G,
+        optimizer_D=optimizer_D,
+        amp=amp,
+        sampler=train_sampler,
+        rng=rng_state(),
+        progress={"epoch": epoch, "batch": batch},
+    )
+
+
 def sample_images(batches_done):
     """Saves a generated sample from the validation set"""
     imgs = next(iter(val_dataloader))
-    real_A = Variable(imgs["B"].type(Tensor))
-    real_B = Variable(imgs["A"].type(Tensor))
-    fake_B = generator(real_A)
-    img_sample = torch.cat((real_A.data, fake_B.data, real_B.data), -2)
-    save_image(img_sample, "images/%s/%s.png" % (opt.dataset_name, batches_done), nrow=5, normalize=True)
+    sampler.submit("images/%s/%s.png" % (opt.dataset_name, batches_done), imgs["B"], imgs["A"], nrow=5, normalize=True)
 
 
 # ----------
 #  Training
 # ----------
 
-prev_time = time.time()
+metrics = Metrics(
+    interval=opt.log_interval,
+    path=opt.metrics_file or None,
+    total_steps=opt.n_epochs * len(dataloader),
+    step=opt.epoch * len(dataloader) + start_batch,
+    fmt="\r[Epoch {epoch}/{n_epochs}] [Batch {batch}/{batches}] [D loss: {loss_D:f}] "
+    "[G loss: {loss_G:f}, pixel: {loss_pixel:f}, adv: {loss_GAN:f}] ETA: {eta}",
+    end="",
+)
 
+end = time.perf_counter()
 for epoch in range(opt.epoch, opt.n_epochs):
-    for i, batch in enumerate(dataloader):
+    train_sampler.set_epoch(epoch, start_batch * opt.batch_size)
+    for i, batch in enumerate(dataloader, start_batch):
+        start = time.perf_counter()
+        metrics.add_time("data", start - end)
 
         # Model inputs
         real_A = Variable(batch["B"].type(Tensor))
@@ -137,19 +238,23 @@ for epoch in range(opt.epoch, opt.n_epochs):
 
         optimizer_G.zero_grad()
 
-        # GAN loss
-        fake_B = generator(real_A)
-        pred_fake = discriminator(fake_B, real_A)
-        loss_GAN = criterion_GAN(pred_fake, valid)
-        # Pixel-wise loss
-        loss_pixel = criterion_pixelwise(fake_B, real_B)
+        with amp.autocast():
+            # GAN loss
+            fake_B = generator(real_A)
+            pred_fake = discriminator(fake_B, real_A)
+            loss_GAN = criterion_GAN(pred_fake, valid)
+            # Pixel-wise loss
+            loss_pixel = criterion_pixelwise(fake_B, real_B)
 
-        # Total loss
-        loss_G = loss_GAN + lambda_pixel * loss_pixel
+            # Total loss
+            loss_G = loss_GAN + lambda_pixel * loss_pixel
 
-        loss_G.backward()
+        amp.backward(loss_G)
 
-        optimizer_G.step()
+        amp.step(optimizer_G)
+        ema.update()
+        metrics.add_time("g_step", time.perf_counter() - start)
+        start = time.perf_counter()
 
         # ---------------------
         #  Train Discriminator
@@ -157,51 +262,45 @@ for epoch in range(opt.epoch, opt.n_epochs):
 
         optimizer_D.zero_grad()
 
-        # Real loss
-        pred_real = discriminator(real_B, real_A)
-        loss_real = criterion_GAN(pred_real, valid)
+        with amp.autocast():
+            # Real loss
+            pred_real = discriminator(real_B, real_A)
+            loss_real = criterion_GAN(pred_real, valid)
 
-        # Fake loss
-        pred_fake = discriminator(fake_B.detach(), real_A)
-        loss_fake = criterion_GAN(pred_fake, fake)
+            # Fake loss
+            pred_fake = discriminator(fake_B.detach(), real_A)
+            loss_fake = criterion_GAN(pred_fake, fake)
 
-        # Total loss
-        loss_D = 0.5 * (loss_real + loss_fake)
+            # Total loss
+            loss_D = 0.5 * (loss_real + loss_fake)
 
-        loss_D.backward()
-        optimizer_D.step()
+        amp.backward(loss_D)
+        amp.step(optimizer_D)
+        amp.update()
+        metrics.add_time("d_step", time.perf_counter() - start)
 
         # --------------
         #  Log Progress
         # --------------
 
-        # Determine approximate time left
-        batches_done = epoch * len(dataloader) + i
-        batches_left = opt.n_epochs * len(dataloader) - batches_done
-        time_left = datetime.timedelta(seconds=batches_left * (time.time() - prev_time))
-        prev_time = time.time()
-
-        # Print log
-        sys.stdout.write(
-            "\r[Epoch %d/%d] [Batch %d/%d] [D loss: %f] [G loss: %f, pixel: %f, adv: %f] ETA: %s"
-            % (
-                epoch,
-                opt.n_epochs,
-                i,
-                len(dataloader),
-                loss_D.item(),
-                loss_G.item(),
-                loss_pixel.item(),
-                loss_GAN.item(),
-                time_left,
-            )
-        )
+        # Losses stay on the device, they are copied and printed every log_interval batches
+        metrics.update(loss_D=loss_D, loss_G=loss_G, loss_pixel=loss_pixel, loss_GAN=loss_GAN)
+        metrics.step(images=real_A.size(0), epoch=epoch, n_epochs=opt.n_epochs, batch=i, batches=len(dataloader))
 
         # If at sample interval save image
+        batches_done = epoch * len(dataloader) + i
         if batches_done % opt.sample_interval == 0:
             sample_images(batches_done)
 
+        if opt.checkpoint_batches and (i + 1) % opt.checkpoint_batches == 0 and i + 1 < len(dataloader):
+            checkpoints.save("%d_batch_%d" % (epoch, i + 1), **training_state(epoch, i + 1))
+        end = time.perf_counter()
+    start_batch = 0
+
     if opt.checkpoint_interval != -1 and epoch % opt.checkpoint_interval == 0:
         # Save model checkpoints
-        torch.save(generator.state_dict(), "saved_models/%s/generator_%d.pth" % (opt.dataset_name, epoch))
-        torch.save(discriminator.state_dict(), "saved_models/%s/discriminator_%d.pth" % (opt.dataset_name, epoch))
+        checkpoints.save(epoch, **training_state(epoch + 1, 0))
+
+metrics.close()
+sampler.close()
+checkpoints.close()
@@ -1,6 +1,6 @@
-import glob
 import random
 import os
+import sys
 import numpy as np
 
 import torch
@@ -8,13 +8,16 @@ from torch.utils.data import Dataset
 from PIL import Image
 import torchvision.transforms as transforms
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.records import list_images, load_image
+
 # Normalization parameters for pre-trained PyTorch models
 mean = np.array([0.485, 0.456, 0.406])
 std = np.array([0.229, 0.224, 0.225])
 
 
 class ImageDataset(Dataset):
-    def __init__(self, root, hr_shape):
+    def __init__(self, root, hr_shape, packed=False):
         hr_height, hr_width = hr_shape
         # Transforms for low resolution images and high resolution images
         self.lr_transform = transforms.Compose(
@@ -32,10 +35,10 @@ class ImageDataset(Dataset):
             ]
         )
 
-        self.files = sorted(glob.glob(root + "/*.*"))
+        self.files = list_images(root, packed)
 
     def __getitem__(self, index):
-        img = Image.open(self.files[index % len(self.files)])
+        img = load_image(self.files, index % len(self.files))
         img_lr = self.lr_transform(img)
         img_hr = self.hr_transform(img)
 
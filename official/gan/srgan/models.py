@@ -10,6 +10,8 @@ class FeatureExtractor(nn.Module):
         super(FeatureExtractor, self).__init__()
         vgg19_model = vgg19(pretrained=True)
         self.feature_extractor = nn.Sequential(*list(vgg19_model.features.children())[:18])
+        # fixed loss network: the generator loss must not compute gradients of the VGG weights
+        self.feature_extractor.requires_grad_(False)
 
     def forward(self, img):
         return self.feature_extractor(img)
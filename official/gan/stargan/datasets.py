@@ -1,6 +1,8 @@
 import glob
+import json
 import random
 import os
+import sys
 import numpy as np
 import torch
 
@@ -8,37 +10,73 @@ from torch.utils.data import Dataset
 from PIL import Image
 import torchvision.transforms as transforms
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.augment import to_uint8_tensor
+from common.records import list_images, load_image
+
+
+def compile_attributes(label_path):
+    """Compiles list_attr_celeba.txt into a uint8 matrix cached next to it.
+
+    The cache is rebuilt whenever the modification time or size of the text
+    file changes and is memory-mapped on every later load.
+
+    Returns:
+        label_names (list), filenames (list), attributes (N x len(label_names) uint8 array)
+    """
+    stat = os.stat(label_path)
+    matrix_path = label_path + ".attrs.npy"
+    meta_path = label_path + ".attrs.json"
+    try:
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        if meta["mtime"] == stat.st_mtime and meta["size"] == stat.st_size:
+            return meta["label_names"], meta["filenames"], np.load(matrix_path, mmap_mode="r")
+    except (OSError, ValueError, KeyError):
+        pass
+
+    with open(label_path, "r") as f:
+        lines = f.read().splitlines()
+    label_names = lines[1].split()
+    rows = [line.split() for line in lines[2:] if line.strip()]
+    filenames = [row[0] for row in rows]
+    attributes = (np.array([row[1:] for row in rows]) == "1").astype(np.uint8)
+    try:
+        np.save(matrix_path, attributes)
+        with open(meta_path, "w") as f:
+            json.dump(
+                {"mtime": stat.st_mtime, "size": stat.st_size, "label_names": label_names, "filenames": filenames}, f
+            )
+    except OSError:
+        # Read-only dataset folder, keep the compiled matrix in memory only
+        pass
+    return label_names, filenames, attributes
+
 
 class CelebADataset(Dataset):
-    def __init__(self, root, transforms_=None, mode="train", attributes=None):
+    def __init__(self, root, transforms_=None, mode="train", attributes=None, packed=False, raw=False):
         self.transform = transforms.Compose(transforms_)
+        self.raw = raw
 
         self.selected_attrs = attributes
-        self.files = sorted(glob.glob("%s/*.jpg" % root))
+        self.files = list_images(root, packed, "*.jpg")
         self.files = self.files[:-2000] if mode == "train" else self.files[-2000:]
         self.label_path = glob.glob("%s/*.txt" % root)[0]
-        self.annotations = self.get_annotations()
+        self.labels = self.get_annotations()
 
     def get_annotations(self):
-        """Extracts annotations for CelebA"""
-        annotations = {}
-        lines = [line.rstrip() for line in open(self.label_path, "r")]
-        self.label_names = lines[1].split()
-        for _, line in enumerate(lines[2:]):
-            filename, *values = line.split()
-            labels = []
-            for attr in self.selected_attrs:
-                idx = self.label_names.index(attr)
-                labels.append(1 * (values[idx] == "1"))
-            annotations[filename] = labels
-        return annotations
+        """Extracts the selected CelebA attributes of every file, one float32 row per index"""
+        self.label_names, filenames, attributes = compile_attributes(self.label_path)
+        row_of = {filename: row for row, filename in enumerate(filenames)}
+        rows = np.array([row_of[self.files[i].split("/")[-1]] for i in range(len(self.files))], dtype=np.int64)
+        columns = np.array([self.label_names.index(attr) for attr in self.selected_attrs], dtype=np.int64)
+        return np.ascontiguousarray(attributes[rows[:, None], columns[None, :]], dtype=np.float32)
 
     def __getitem__(self, index):
-        filepath = self.files[index % len(self.files)]
-        filename = filepath.split("/")[-1]
-        img = self.transform(Image.open(filepath))
-        label = self.annotations[filename]
-        label = torch.FloatTensor(np.array(label))
+        index = index % len(self.files)
+        img = load_image(self.files, index)
+        img = to_uint8_tensor(img.convert("RGB")) if self.raw else self.transform(img)
+        label = torch.from_numpy(self.labels[index])
 
         return img, label
 
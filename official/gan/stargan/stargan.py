@@ -20,7 +20,6 @@ import datetime
 import sys
 
 import torchvision.transforms as transforms
-from torchvision.utils import save_image
 
 from torch.utils.data import DataLoader
 from torchvision import datasets
@@ -29,6 +28,9 @@ import torch.autograd as autograd
 
 from .models import *
 from .datasets import *
+from common.augment import BatchAugment
+from common.ema import EMA
+from common.sampler import AsyncSampler
 
 import torch.nn as nn
 import torch.nn.functional as F
@@ -47,11 +49,15 @@ parser.add_argument("--b1", type=float, default=0.5, help="adam: decay of first
 parser.add_argument("--b2", type=float, default=0.999, help="adam: decay of first order momentum of gradient")
 parser.add_argument("--decay_epoch", type=int, default=100, help="epoch from which to start lr decay")
 parser.add_argument("--n_cpu", type=int, default=8, help="number of cpu threads to use during batch generation")
+parser.add_argument("--packed", action="store_true", help="read <dataset>.records shards from common/records.py")
+parser.add_argument("--batch_augment", action="store_true", help="augment uint8 batches in the collate stage")
 parser.add_argument("--img_height", type=int, default=128, help="size of image height")
 parser.add_argument("--img_width", type=int, default=128, help="size of image width")
 parser.add_argument("--channels", type=int, default=3, help="number of image channels")
 parser.add_argument("--sample_interval", type=int, default=400, help="interval between saving generator samples")
 parser.add_argument("--checkpoint_interval", type=int, default=-1, help="interval between model checkpoints")
+parser.add_argument("--ema_decay", type=float, default=0, help="decay of the generator weight average, 0 disables")
+parser.add_argument("--ema_every", type=int, default=1, help="update the generator average every k generator steps")
 parser.add_argument("--residual_blocks", type=int, default=6, help="number of residual blocks in generator")
 parser.add_argument(
     "--selected_attrs",
@@ -113,11 +119,19 @@ train_transforms = [
 
 dataloader = DataLoader(
     CelebADataset(
-        "../../data/%s" % opt.dataset_name, transforms_=train_transforms, mode="train", attributes=opt.selected_attrs
+        "../../data/%s" % opt.dataset_name,
+        transforms_=train_transforms,
+        mode="train",
+        attributes=opt.selected_attrs,
+        packed=opt.packed,
+        raw=opt.batch_augment,
     ),
     batch_size=opt.batch_size,
     shuffle=True,
     num_workers=opt.n_cpu,
+    collate_fn=BatchAugment(size=int(1.12 * opt.img_height), crop=opt.img_height, flip=True)
+    if opt.batch_augment
+    else None,
 )
 
 val_transforms = [
@@ -128,11 +142,17 @@ val_transforms = [
 
 val_dataloader = DataLoader(
     CelebADataset(
-        "../../data/%s" % opt.dataset_name, transforms_=val_transforms, mode="val", attributes=opt.selected_attrs
+        "../../data/%s" % opt.dataset_name,
+        transforms_=val_transforms,
+        mode="val",
+        attributes=opt.selected_attrs,
+        packed=opt.packed,
+        raw=opt.batch_augment,
     ),
     batch_size=10,
     shuffle=True,
     num_workers=1,
+    collate_fn=BatchAugment(size=(opt.img_height, opt.img_width)) if opt.batch_augment else None,
 )
 
 # Tensor type
@@ -170,11 +190,9 @@ label_changes = [
 ]
 
 
-def sample_images(batches_done):
-    """Saves a generated sample of domain translations"""
-    val_imgs, val_labels = next(iter(val_dataloader))
-    val_imgs = Variable(val_imgs.type(Tensor))
-    val_labels = Variable(val_labels.type(Tensor))
+def render_samples(nets, val_imgs, val_labels):
+    """Renders the domain translations, in the sampler process on a snapshot of the generator"""
+    generator = nets["generator"]
     img_samples = None
     for i in range(10):
         img, label = val_imgs[i], val_labels[i]
@@ -189,12 +207,23 @@ def sample_images(batches_done):
         # Generate translations
         gen_imgs = generator(imgs, labels)
         # Concatenate images by width
-        gen_imgs = torch.cat([x for x in gen_imgs.data], -1)
-        img_sample = torch.cat((img.data, gen_imgs), -1)
+        gen_imgs = torch.cat([x for x in gen_imgs], -1)
+        img_sample = torch.cat((img, gen_imgs), -1)
         # Add as row to generated samples
         img_samples = img_sample if img_samples is None else torch.cat((img_samples, img_sample), -2)
 
-    save_image(img_samples.view(1, *img_samples.shape), "images/%s.png" % batches_done, normalize=True)
+    return img_samples.view(1, *img_samples.shape)
+
+
+# Moving average of the generator weights, the generator itself with --ema_decay 0
+ema = EMA(generator, decay=opt.ema_decay, every=opt.ema_every)
+sampler = AsyncSampler(render_samples, {"generator": ema.module})
+
+
+def sample_images(batches_done):
+    """Saves a generated sample of domain translations"""
+    val_imgs, val_labels = next(iter(val_dataloader))
+    sampler.submit("images/%s.png" % batches_done, val_imgs, val_labels.float(), normalize=True)
 
 
 # ----------
@@ -262,6 +291,7 @@ for epoch in range(opt.epoch, opt.n_epochs):
 
             loss_G.backward()
             optimizer_G.step()
+            ema.update()
 
             # --------------
             #  Log Progress
@@ -297,4 +327,8 @@ for epoch in range(opt.epoch, opt.n_epochs):
     if opt.checkpoint_interval != -1 and epoch % opt.checkpoint_interval == 0:
         # Save model checkpoints
         torch.save(generator.state_dict(), "saved_models/generator_%d.pth" % epoch)
+        if ema.enabled:
+            torch.save(ema.module.state_dict(), "saved_models/generator_ema_%d.pth" % epoch)
         torch.save(discriminator.state_dict(), "saved_models/discriminator_%d.pth" % epoch)
+
+sampler.close()
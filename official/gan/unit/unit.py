@@ -8,7 +8,6 @@ import time
 import sys
 
 import torchvision.transforms as transforms
-from torchvision.utils import save_image
 
 from torch.utils.data import DataLoader
 from torchvision import datasets
@@ -16,6 +15,9 @@ from torch.autograd import Variable
 
 from models import *
 from datasets import *
+from common.ema import EMA
+from common.sampler import AsyncSampler
+from common.amp import MixedPrecision
 
 import torch.nn as nn
 import torch.nn.functional as F
@@ -31,11 +33,17 @@ parser.add_argument("--b1", type=float, default=0.5, help="adam: decay of first
 parser.add_argument("--b2", type=float, default=0.999, help="adam: decay of first order momentum of gradient")
 parser.add_argument("--decay_epoch", type=int, default=100, help="epoch from which to start lr decay")
 parser.add_argument("--n_cpu", type=int, default=8, help="number of cpu threads to use during batch generation")
+parser.add_argument("--packed", action="store_true", help="read <dataset>.records shards from common/records.py")
 parser.add_argument("--img_height", type=int, default=256, help="size of image height")
 parser.add_argument("--img_width", type=int, default=256, help="size of image width")
 parser.add_argument("--channels", type=int, default=3, help="number of image channels")
 parser.add_argument("--sample_interval", type=int, default=100, help="interval between saving generator samples")
 parser.add_argument("--checkpoint_interval", type=int, default=-1, help="interval between saving model checkpoints")
+parser.add_argument("--ema_decay", type=float, default=0, help="decay of the generator weight average, 0 disables")
+parser.add_argument("--ema_every", type=int, default=1, help="update the generator average every k generator steps")
+parser.add_argument(
+    "--precision", type=str, default="fp32", choices=["fp32", "bf16", "fp16"], help="bf16 on CPU or CUDA, fp16 on CUDA"
+)
 parser.add_argument("--n_downsample", type=int, default=2, help="number downsampling layers in encoder")
 parser.add_argument("--dim", type=int, default=64, help="number of filters in first encoder layer")
 opt = parser.parse_args()
@@ -76,6 +84,10 @@ if cuda:
     criterion_GAN.cuda()
     criterion_pixel.cuda()
 
+# Mixed precision, normalization layers stay in float32
+amp = MixedPrecision(opt.precision, "cuda" if cuda else "cpu")
+amp.keep_fp32(E1, E2, G1, G2, D1, D2)
+
 if opt.epoch != 0:
     # Load pretrained models
     E1.load_state_dict(torch.load("saved_models/%s/E1_%d.pth" % (opt.dataset_name, opt.epoch)))
@@ -133,35 +145,48 @@ transforms_ = [
 
 # Training data loader
 dataloader = DataLoader(
-    ImageDataset("../../data/%s" % opt.dataset_name, transforms_=transforms_, unaligned=True),
+    ImageDataset("../../data/%s" % opt.dataset_name, transforms_=transforms_, unaligned=True, packed=opt.packed),
     batch_size=opt.batch_size,
     shuffle=True,
     num_workers=opt.n_cpu,
 )
 # Test data loader
 val_dataloader = DataLoader(
-    ImageDataset("../../data/%s" % opt.dataset_name, transforms_=transforms_, unaligned=True, mode="test"),
+    ImageDataset(
+        "../../data/%s" % opt.dataset_name,
+        transforms_=transforms_,
+        unaligned=True,
+        mode="test",
+        packed=opt.packed,
+    ),
     batch_size=5,
     shuffle=True,
     num_workers=1,
 )
 
 
+def render_samples(nets, X1, X2):
+    """Renders the translations, in the sampler process on a snapshot of the encoders and generators"""
+    _, Z1 = nets["E1"](X1)
+    _, Z2 = nets["E2"](X2)
+    fake_X1 = nets["G1"](Z2)
+    fake_X2 = nets["G2"](Z1)
+    return torch.cat((X1, fake_X2, X2, fake_X1), 0)
+
+
+# Moving average of the encoder and generator weights, the nets themselves with --ema_decay 0
+ema = EMA(nn.ModuleDict({"E1": E1, "E2": E2, "G1": G1, "G2": G2}), decay=opt.ema_decay, every=opt.ema_every)
+sampler = AsyncSampler(render_samples, dict(ema.module.items()))
+
+
 def sample_images(batches_done):
     """Saves a generated sample from the test set"""
     imgs = next(iter(val_dataloader))
-    X1 = Variable(imgs["A"].type(Tensor))
-    X2 = Variable(imgs["B"].type(Tensor))
-    _, Z1 = E1(X1)
-    _, Z2 = E2(X2)
-    fake_X1 = G1(Z2)
-    fake_X2 = G2(Z1)
-    img_sample = torch.cat((X1.data, fake_X2.data, X2.data, fake_X1.data), 0)
-    save_image(img_sample, "images/%s/%s.png" % (opt.dataset_name, batches_done), nrow=5, normalize=True)
+    sampler.submit("images/%s/%s.png" % (opt.dataset_name, batches_done), imgs["A"], imgs["B"], nrow=5, normalize=True)
 
 
 def compute_kl(mu):
-    mu_2 = torch.pow(mu, 2)
+    mu_2 = torch.pow(mu.float(), 2)
     loss = torch.mean(mu_2)
     return loss
 
@@ -188,52 +213,54 @@ for epoch in range(opt.epoch, opt.n_epochs):
 
         optimizer_G.zero_grad()
 
-        # Get shared latent representation
-        mu1, Z1 = E1(X1)
-        mu2, Z2 = E2(X2)
-
-        # Reconstruct images
-        recon_X1 = G1(Z1)
-        recon_X2 = G2(Z2)
-
-        # Translate images
-        fake_X1 = G1(Z2)
-        fake_X2 = G2(Z1)
-
-        # Cycle translation
-        mu1_, Z1_ = E1(fake_X1)
-        mu2_, Z2_ = E2(fake_X2)
-        cycle_X1 = G1(Z2_)
-        cycle_X2 = G2(Z1_)
-
-        # Losses
-        loss_GAN_1 = lambda_0 * criterion_GAN(D1(fake_X1), valid)
-        loss_GAN_2 = lambda_0 * criterion_GAN(D2(fake_X2), valid)
-        loss_KL_1 = lambda_1 * compute_kl(mu1)
-        loss_KL_2 = lambda_1 * compute_kl(mu2)
-        loss_ID_1 = lambda_2 * criterion_pixel(recon_X1, X1)
-        loss_ID_2 = lambda_2 * criterion_pixel(recon_X2, X2)
-        loss_KL_1_ = lambda_3 * compute_kl(mu1_)
-        loss_KL_2_ = lambda_3 * compute_kl(mu2_)
-        loss_cyc_1 = lambda_4 * criterion_pixel(cycle_X1, X1)
-        loss_cyc_2 = lambda_4 * criterion_pixel(cycle_X2, X2)
-
-        # Total loss
-        loss_G = (
-            loss_KL_1
-            + loss_KL_2
-            + loss_ID_1
-            + loss_ID_2
-            + loss_GAN_1
-            + loss_GAN_2
-            + loss_KL_1_
-            + loss_KL_2_
-            + loss_cyc_1
-            + loss_cyc_2
-        )
-
-        loss_G.backward()
-        optimizer_G.step()
+        with amp.autocast():
+            # Get shared latent representation
+            mu1, Z1 = E1(X1)
+            mu2, Z2 = E2(X2)
+
+            # Reconstruct images
+            recon_X1 = G1(Z1)
+            recon_X2 = G2(Z2)
+
+            # Translate images
+            fake_X1 = G1(Z2)
+            fake_X2 = G2(Z1)
+
+            # Cycle translation
+            mu1_, Z1_ = E1(fake_X1)
+            mu2_, Z2_ = E2(fake_X2)
+            cycle_X1 = G1(Z2_)
+            cycle_X2 = G2(Z1_)
+
+            # Losses
+            loss_GAN_1 = lambda_0 * criterion_GAN(D1(fake_X1), valid)
+            loss_GAN_2 = lambda_0 * criterion_GAN(D2(fake_X2), valid)
+            loss_KL_1 = lambda_1 * compute_kl(mu1)
+            loss_KL_2 = lambda_1 * compute_kl(mu2)
+            loss_ID_1 = lambda_2 * criterion_pixel(recon_X1, X1)
+            loss_ID_2 = lambda_2 * criterion_pixel(recon_X2, X2)
+            loss_KL_1_ = lambda_3 * compute_kl(mu1_)
+            loss_KL_2_ = lambda_3 * compute_kl(mu2_)
+            loss_cyc_1 = lambda_4 * criterion_pixel(cycle_X1, X1)
+            loss_cyc_2 = lambda_4 * criterion_pixel(cycle_X2, X2)
+
+            # Total loss
+            loss_G = (
+                loss_KL_1
+                + loss_KL_2
+                + loss_ID_1
+                + loss_ID_2
+                + loss_GAN_1
+                + loss_GAN_2
+                + loss_KL_1_
+                + loss_KL_2_
+                + loss_cyc_1
+                + loss_cyc_2
+            )
+
+        amp.backward(loss_G)
+        amp.step(optimizer_G)
+        ema.update()
 
         # -----------------------
         #  Train Discriminator 1
@@ -241,10 +268,11 @@ for epoch in range(opt.epoch, opt.n_epochs):
 
         optimizer_D1.zero_grad()
 
-        loss_D1 = criterion_GAN(D1(X1), valid) + criterion_GAN(D1(fake_X1.detach()), fake)
+        with amp.autocast():
+            loss_D1 = criterion_GAN(D1(X1), valid) + criterion_GAN(D1(fake_X1.detach()), fake)
 
-        loss_D1.backward()
-        optimizer_D1.step()
+        amp.backward(loss_D1)
+        amp.step(optimizer_D1)
 
         # -----------------------
         #  Train Discriminator 2
@@ -252,10 +280,12 @@ for epoch in range(opt.epoch, opt.n_epochs):
 
         optimizer_D2.zero_grad()
 
-        loss_D2 = criterion_GAN(D2(X2), valid) + criterion_GAN(D2(fake_X2.detach()), fake)
+        with amp.autocast():
+            loss_D2 = criterion_GAN(D2(X2), valid) + criterion_GAN(D2(fake_X2.detach()), fake)
 
-        loss_D2.backward()
-        optimizer_D2.step()
+        amp.backward(loss_D2)
+        amp.step(optimizer_D2)
+        amp.update()
 
         # --------------
         #  Log Progress
@@ -288,5 +318,9 @@ for epoch in range(opt.epoch, opt.n_epochs):
         torch.save(E2.state_dict(), "saved_models/%s/E2_%d.pth" % (opt.dataset_name, epoch))
         torch.save(G1.state_dict(), "saved_models/%s/G1_%d.pth" % (opt.dataset_name, epoch))
         torch.save(G2.state_dict(), "saved_models/%s/G2_%d.pth" % (opt.dataset_name, epoch))
+        if ema.enabled:
+            torch.save(ema.module.state_dict(), "saved_models/%s/G_ema_%d.pth" % (opt.dataset_name, epoch))
         torch.save(D1.state_dict(), "saved_models/%s/D1_%d.pth" % (opt.dataset_name, epoch))
         torch.save(D2.state_dict(), "saved_models/%s/D2_%d.pth" % (opt.dataset_name, epoch))
+
+sampler.close()
@@ -1,6 +1,8 @@
 import argparse
 import os
 import random
+import sys
+import time
 
 from torch import autograd
 import torch.nn as nn
@@ -12,6 +14,13 @@ import torchvision.datasets as dset
 import torchvision.transforms as transforms
 import torchvision.utils as vutils
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.checkpoint import CheckpointManager, load_checkpoint
+from common.ema import EMA
+from common.metrics import Metrics
+from common.penalty import GradientPenalty
+from common.sampler import AsyncSampler
+
 parser = argparse.ArgumentParser()
 parser.add_argument('--dataset', required=True, help='| lsun | imagenet | folder | lfw | fake')
 parser.add_argument('--dataroot', required=True, help='path to dataset')
@@ -23,13 +32,20 @@ parser.add_argument('--ngf', type=int, default=64)
 parser.add_argument('--ndf', type=int, default=64)
 parser.add_argument('--niter', type=int, default=25, help='number of epochs to train for')
 parser.add_argument("--n_critic", type=int, default=5, help="number of training steps for discriminator per iter")
+parser.add_argument('--gp_every', type=int, default=1, help='apply the gradient penalty every k critic steps (lazy regularization)')
 parser.add_argument('--lr', type=float, default=0.0002, help='learning rate, default=0.0002')
 parser.add_argument('--cuda', action='store_true', help='enables cuda')
 parser.add_argument('--ngpu', type=int, default=1, help='number of GPUs to use')
-parser.add_argument('--netG', default='', help="path to netG (to continue training)")
-parser.add_argument('--netD', default='', help="path to netD (to continue training)")
+parser.add_argument('--netG', default='', help="checkpoint to load netG from (to continue training)")
+parser.add_argument('--netD', default='', help="checkpoint to load netD from (to continue training)")
 parser.add_argument('--outf', default='.', help='folder to output images and model checkpoints')
 parser.add_argument('--manualSeed', type=int, help='manual seed')
+parser.add_argument('--ema_decay', type=float, default=0, help='decay of the generator weight average, 0 disables')
+parser.add_argument('--ema_every', type=int, default=1, help='update the generator average every k generator steps')
+parser.add_argument('--keep_checkpoints', type=int, default=0, help='keep only the last n checkpoints, 0 keeps all')
+parser.add_argument('--sharded_checkpoints', action='store_true', help='one file per net, unchanged ones are hard-linked')
+parser.add_argument('--log_interval', type=int, default=50, help='iterations between loss prints')
+parser.add_argument('--metrics_file', default='', help='also write the losses and step times to this .csv or .jsonl file')
 parser.add_argument('--model', type=str, default='train', help='GAN train models.default: \'train\'. other: gen')
 
 opt = parser.parse_args()
@@ -86,6 +102,9 @@ nc = 3
 k = 2
 p = 6
 
+# Calculates the W-div gradient penalty, one double backward for real and fake samples
+compute_div_penalty = GradientPenalty("wgan-div", weight=k, power=p, every=opt.gp_every)
+
 
 # custom weights initialization called on netG and netD
 def weights_init(m):
@@ -136,10 +155,7 @@ netG = Generator(ngpu)
 netG.apply(weights_init)
 
 if opt.netG != '':
-  if torch.cuda.is_available():
-    netG = torch.load(opt.netG)
-  else:
-    netG = torch.load(opt.netG, map_location='cpu')
+  netG.load_state_dict(load_checkpoint(opt.netG, 'netG', map_location=device))
 
 
 class Discriminator(nn.Module):
@@ -179,10 +195,7 @@ netD = Discriminator(ngpu)
 netD.apply(weights_init)
 
 if opt.netD != '':
-  if torch.cuda.is_available():
-    netD = torch.load(opt.netD)
-  else:
-    netD = torch.load(opt.netD, map_location='cpu')
+  netD.load_state_dict(load_checkpoint(opt.netD, 'netD', map_location=device))
 
 if opt.cuda:
   netD.to(device)
@@ -203,8 +216,19 @@ def gen_sample():
 
 
 def train():
+  # moving average of the generator weights, netG itself with --ema_decay 0
+  ema = EMA(netG, decay=opt.ema_decay, every=opt.ema_every)
+  # renders the sample grids in a background process from snapshots of the averaged netG
+  sampler = AsyncSampler(nets={'netG': ema.module})
+  checkpoints = CheckpointManager(opt.outf, keep_last=opt.keep_checkpoints, sharded=opt.sharded_checkpoints)
+  metrics = Metrics(interval=opt.log_interval, path=opt.metrics_file or None,
+                    fmt='[{epoch}/{niter}][{i}/{batches}] Loss_D: {errD:.4f} Loss_G: {errG:.4f} '
+                        'data: {data_ms:.1f}ms D: {d_step_ms:.1f}ms G: {g_step_ms:.1f}ms')
+  end = time.perf_counter()
   for epoch in range(opt.niter):
     for i, (real_imgs, _) in enumerate(dataloader):
+      start = time.perf_counter()
+      metrics.add_time('data', start - end)
 
       # Configure input
       real_imgs = autograd.Variable(real_imgs.to(device), requires_grad=True)
@@ -230,24 +254,15 @@ def train():
       fake_validity = netD(fake_imgs)
 
       # Compute W-div gradient penalty
-      real_label = torch.full((batch_size, ), 1, device=device)
-      fake_label = torch.full((batch_size, ), 1, device=device)
-
-      real_grad = autograd.grad(
-        real_validity, real_imgs, real_label, create_graph=True, retain_graph=True, only_inputs=True)[0]
-      real_grad_norm = real_grad.view(real_grad.size(0), -1).pow(2).sum(1) ** (p / 2)
-
-      fake_grad = autograd.grad(
-        fake_validity, fake_imgs, fake_label, create_graph=True, retain_graph=True, only_inputs=True)[0]
-      fake_grad_norm = fake_grad.view(fake_grad.size(0), -1).pow(2).sum(1) ** (p / 2)
-
-      div_gp = torch.mean(real_grad_norm + fake_grad_norm) * k / 2
+      div_gp = compute_div_penalty(netD, real_imgs, fake_imgs, real_validity, fake_validity)
 
       # Adversarial loss
       errD = -torch.mean(real_validity) + torch.mean(fake_validity) + div_gp
 
       errD.backward()
       optimizerD.step()
+      metrics.update(errD=errD)
+      metrics.add_time('d_step', time.perf_counter() - start)
 
       optimizerG.zero_grad()
 
@@ -258,6 +273,7 @@ def train():
         #  Train Generator
         # -----------------
 
+        start = time.perf_counter()
         # Generate a batch of images
         fake_imgs = netG(noise)
         # Loss measures generator's ability to fool the discriminator
@@ -267,22 +283,23 @@ def train():
 
         errG.backward()
         optimizerG.step()
+        ema.update()
+        metrics.update(errG=errG)
+        metrics.add_time('g_step', time.perf_counter() - start)
 
-      print(f'[{epoch + 1}/{opt.niter}][{i}/{len(dataloader)}] '
-            f'Loss_D: {errD.item():.4f} '
-            f'Loss_G: {errG.item():.4f}.')
+      metrics.step(images=batch_size, epoch=epoch + 1, niter=opt.niter, i=i, batches=len(dataloader))
 
       if i % 100 == 0:
-        vutils.save_image(real_imgs,
-                          f'{opt.outf}/real_samples.png',
-                          normalize=True)
-        vutils.save_image(netG(noise).detach(),
-                          f'{opt.outf}/fake_samples_epoch_{epoch + 1}.png',
-                          normalize=True)
-
-      # do checkpointing
-    torch.save(netG, f'{opt.outf}/netG_epoch_{epoch + 1}.pth')
-    torch.save(netD, f'{opt.outf}/netD_epoch_{epoch + 1}.pth')
+        sampler.save(f'{opt.outf}/real_samples.png', real_imgs, normalize=True)
+        sampler.submit(f'{opt.outf}/fake_samples_epoch_{epoch + 1}.png', noise, normalize=True)
+      end = time.perf_counter()
+
+    # do checkpointing, written in the background from a CPU copy
+    checkpoints.save(f'epoch_{epoch + 1}', netG=netG, netD=netD, ema=ema,
+                     optimizerG=optimizerG, optimizerD=optimizerD)
+  metrics.close()
+  sampler.close()
+  checkpoints.close()
 
 
 if __name__ == '__main__':
@@ -1,14 +1,69 @@
-from .alexnet import *
-from .resnet import *
-from .vgg import *
-from .squeezenet import *
-from .inception import *
-from .densenet import *
-from .googlenet import *
-from .mobilenet import *
-from .mnasnet import *
-from .shufflenetv2 import *
-from . import segmentation
-from . import detection
-from . import video
-from . import quantization
+# The architectures are imported on first access (PEP 562), so a job that only
+# needs resnet18 does not import every other model. `from official.net import *`
+# still imports everything.
+import importlib
+import sys
+import types
+
+_MODULES = {
+    'alexnet': ['AlexNet', 'alexnet'],
+    'resnet': ['ResNet', 'resnet18', 'resnet34', 'resnet50', 'resnet101',
+               'resnet152', 'resnext50_32x4d', 'resnext101_32x8d',
+               'wide_resnet50_2', 'wide_resnet101_2'],
+    'vgg': ['VGG', 'vgg11', 'vgg11_bn', 'vgg13', 'vgg13_bn', 'vgg16', 'vgg16_bn',
+            'vgg19_bn', 'vgg19'],
+    'squeezenet': ['SqueezeNet', 'squeezenet1_0', 'squeezenet1_1'],
+    'inception': ['Inception3', 'inception_v3', 'InceptionOutputs', '_InceptionOutputs'],
+    'densenet': ['DenseNet', 'densenet121', 'densenet169', 'densenet201', 'densenet161'],
+    'googlenet': ['GoogLeNet', 'googlenet', 'GoogLeNetOutputs', '_GoogLeNetOutputs'],
+    'mobilenet': ['MobileNetV2', 'mobilenet_v2'],
+    'mnasnet': ['MNASNet', 'mnasnet0_5', 'mnasnet0_75', 'mnasnet1_0', 'mnasnet1_3'],
+    'shufflenetv2': ['ShuffleNetV2', 'shufflenet_v2_x0_5', 'shufflenet_v2_x1_0',
+                     'shufflenet_v2_x1_5', 'shufflenet_v2_x2_0'],
+}
+
+# subpackages, segmentation, detection and video are optional
+_SUBPACKAGES = ['quantization', 'segmentation', 'detection', 'video']
+
+_ATTRIBUTES = {name: module for module, names in _MODULES.items() for name in names}
+
+__all__ = [name for names in _MODULES.values() for name in names if not name.startswith('_')]
+
+
+def __getattr__(name):
+    if name in _ATTRIBUTES:
+        module = importlib.import_module('.' + _ATTRIBUTES[name], __name__)
+        # bind every name of the module like the star import did
+        for attribute in _MODULES[_ATTRIBUTES[name]]:
+            globals()[attribute] = getattr(module, attribute)
+        return globals()[name]
+    if name in _MODULES:
+        return importlib.import_module('.' + name, __name__)
+    if name in _SUBPACKAGES:
+        try:
+            return importlib.import_module('.' + name, __name__)
+        except ModuleNotFoundError as e:
+            if e.name != __name__ + '.' + name:
+                raise
+            raise AttributeError('{}.{} is not available: {}'.format(__name__, name, e)) from e
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_ATTRIBUTES) | set(_MODULES) | set(_SUBPACKAGES))
+
+
+class _Package(types.ModuleType):
+    def __setattr__(self, name, value):
+        # importing a submodule binds it on the package; alexnet and googlenet
+        # share their name with their builder, which has to stay the attribute
+        # whichever module (inference, quantization, ...) imports them first
+        if name in _ATTRIBUTES and isinstance(value, types.ModuleType) and \
+                value.__name__ == __name__ + '.' + _ATTRIBUTES[name]:
+            for attribute in _MODULES[_ATTRIBUTES[name]]:
+                super(_Package, self).__setattr__(attribute, getattr(value, attribute))
+            return
+        super(_Package, self).__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
@@ -1,8 +1,9 @@
 from collections import OrderedDict
+from functools import partial
 
 import torch
-from torch import nn
-from torch.jit.annotations import Dict
+from torch import nn, Tensor
+from torch.jit.annotations import Dict, List
 
 
 class IntermediateLayerGetter(nn.ModuleDict):
@@ -14,9 +15,15 @@ class IntermediateLayerGetter(nn.ModuleDict):
     This means that one should **not** reuse the same nn.Module
     twice in the forward if you want this to work.
 
-    Additionally, it is only able to query submodules that are directly
-    assigned to the model. So if `model` is passed, `model.feature1` can
-    be returned, but not `model.feature1.layer2`.
+    Nested submodules are given by their dotted path, e.g.
+    `layer3.1.conv2` or `features.17`, and returned through forward hooks.
+    Everything that runs after the deepest requested module is dropped:
+    the direct children after it, and inside `nn.Sequential` containers
+    the children after the requested one, so `features.17` of a VGG keeps
+    `features[:18]` only. The model itself is not modified.
+
+    The activations are returned in the order of `return_layers`, not in
+    the order the modules run.
 
     Arguments:
         model (nn.Module): model on which we will extract the features
@@ -35,33 +42,81 @@ class IntermediateLayerGetter(nn.ModuleDict):
         >>> print([(k, v.shape) for k, v in out.items()])
         >>>     [('feat1', torch.Size([1, 64, 56, 56])),
         >>>      ('feat2', torch.Size([1, 256, 14, 14]))]
+        >>> new_m = IntermediateLayerGetter(m, {'layer3.1.conv2': 'conv'})
+        >>> [name for name, _ in new_m.named_children()]
+        >>>     ['conv1', 'bn1', 'relu', 'maxpool', 'layer1', 'layer2', 'layer3']
     """
     _version = 2
     __annotations__ = {
         "return_layers": Dict[str, str],
+        "_nested": List[str],
     }
 
     def __init__(self, model, return_layers):
-        if not set(return_layers).issubset([name for name, _ in model.named_children()]):
+        if not set(return_layers).issubset([name for name, _ in model.named_modules()]):
             raise ValueError("return_layers are not present in model")
         orig_return_layers = return_layers
         return_layers = {str(k): str(v) for k, v in return_layers.items()}
-        layers = OrderedDict()
-        for name, module in model.named_children():
-            layers[name] = module
-            if name in return_layers:
-                del return_layers[name]
-            if not return_layers:
-                break
+        layers = _prune_children(model, list(return_layers))
 
         super(IntermediateLayerGetter, self).__init__(layers)
         self.return_layers = orig_return_layers
+        self._nested = [name for name in return_layers if "." in name]
 
     def forward(self, x):
         out = OrderedDict()
+        if self._nested:
+            return self._ordered(self._forward_nested(x, out))
         for name, module in self.items():
             x = module(x)
             if name in self.return_layers:
                 out_name = self.return_layers[name]
                 out[out_name] = x
+        return self._ordered(out)
+
+    def _ordered(self, out):
+        # type: (Dict[str, Tensor]) -> Dict[str, Tensor]
+        ordered = OrderedDict()
+        for out_name in self.return_layers.values():
+            ordered[out_name] = out[out_name]
+        return ordered
+
+    @torch.jit.unused
+    def _forward_nested(self, x, out):
+        # type: (Tensor, Dict[str, Tensor]) -> Dict[str, Tensor]
+        # hooks are registered per call: the modules are shared with the
+        # original model, which must not record into this getter
+        handles = [self.get_submodule(name).register_forward_hook(partial(_store_output, out, self.return_layers[name]))
+                   for name in self._nested]
+        try:
+            for name, module in self.items():
+                x = module(x)
+                if name in self.return_layers:
+                    out[self.return_layers[name]] = x
+        finally:
+            for handle in handles:
+                handle.remove()
         return out
+
+
+def _store_output(out, out_name, module, input, output):
+    out[out_name] = output
+
+
+def _prune_children(module, paths):
+    """The children of ``module`` up to the last one ``paths`` (relative dotted names) reach into.
+
+    The last child is pruned in turn if it is an ``nn.Sequential`` whose own
+    output is not requested.
+    """
+    last = max(list(module._modules).index(path.split(".")[0]) for path in paths)
+    layers = OrderedDict()
+    for index, (name, child) in enumerate(module.named_children()):
+        if index == last:
+            inner = [path.split(".", 1)[1] for path in paths if path.startswith(name + ".")]
+            if inner and name not in paths and type(child) is nn.Sequential:
+                child = nn.Sequential(_prune_children(child, inner))
+            layers[name] = child
+            break
+        layers[name] = child
+    return layers
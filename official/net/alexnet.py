@@ -1,6 +1,6 @@
 import torch
 import torch.nn as nn
-from .utils import load_state_dict_from_url
+from .utils import load_state_dict_from_url, _skip_init, _assign_state_dict
 
 
 __all__ = ['AlexNet', 'alexnet']
@@ -57,9 +57,10 @@ def alexnet(pretrained=False, progress=True, **kwargs):
         pretrained (bool): If True, returns a model pre-trained on ImageNet
         progress (bool): If True, displays a progress bar of the download to stderr
     """
-    model = AlexNet(**kwargs)
+    with _skip_init(pretrained):
+        model = AlexNet(**kwargs)
     if pretrained:
         state_dict = load_state_dict_from_url(model_urls['alexnet'],
                                               progress=progress)
-        model.load_state_dict(state_dict)
+        _assign_state_dict(model, state_dict)
     return model
@@ -4,7 +4,7 @@ import torch.nn as nn
 import torch.nn.functional as F
 import torch.utils.checkpoint as cp
 from collections import OrderedDict
-from .utils import load_state_dict_from_url
+from .utils import load_state_dict_from_url, _skip_init, _assign_state_dict
 from torch import Tensor
 from torch.jit.annotations import List
 
@@ -214,12 +214,13 @@ def _load_state_dict(model, model_url, progress):
             new_key = res.group(1) + res.group(2)
             state_dict[new_key] = state_dict[key]
             del state_dict[key]
-    model.load_state_dict(state_dict)
+    _assign_state_dict(model, state_dict)
 
 
 def _densenet(arch, growth_rate, block_config, num_init_features, pretrained, progress,
               **kwargs):
-    model = DenseNet(growth_rate, block_config, num_init_features, **kwargs)
+    with _skip_init(pretrained):
+        model = DenseNet(growth_rate, block_config, num_init_features, **kwargs)
     if pretrained:
         _load_state_dict(model, model_urls[arch], progress)
     return model
@@ -0,0 +1,192 @@
+"""
+Intermediate features of the classification models, for perceptual losses
+and embedding jobs.
+
+:class:`FeatureExtractor` taps modules of a model by their dotted name,
+e.g. ``layer3.1.conv2`` or ``features.17``, drops every module that runs
+after the deepest tap (see :class:`~._utils.IntermediateLayerGetter`) and
+keeps a frozen copy of the rest in eval mode. The features come back in the
+order of ``layers``:
+
+    >>> extractor = FeatureExtractor(vgg16(pretrained=True), ['features.3', 'features.8', 'features.15'])
+    >>> loss = sum(F.mse_loss(a, b) for a, b in zip(extractor(fake).values(),
+    ...                                             extractor.target(real).values()))
+    >>> loss.backward()
+
+``forward`` is differentiable with respect to its input, for the generated
+images of a perceptual loss. :meth:`FeatureExtractor.target` computes the
+features of the loss targets under ``torch.no_grad``, so they keep no graph
+but can still be saved by the loss for its backward pass.
+:meth:`FeatureExtractor.extract` runs under ``torch.inference_mode`` for
+embedding jobs; its inference tensors cannot be used in a loss that is
+differentiated.
+
+:func:`extract_folder` streams an image folder through an extractor in
+batches and writes every tap into one memory-mapped ``<name>.npy`` of
+``(images, *feature shape)``, next to ``labels.npy`` and ``images.txt``:
+
+    $ python -m official.net.features --arch resnet50 --pretrained --layers layer3 layer4 --pool avg \\
+          --data imagenet/val --output features/resnet50
+"""
+import argparse
+import copy
+import importlib
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.utils.data import DataLoader
+from torchvision import datasets, transforms
+
+from ._utils import IntermediateLayerGetter
+
+
+__all__ = ['FeatureExtractor', 'extract_folder', 'default_transform']
+
+
+class FeatureExtractor(nn.Module):
+    r"""Frozen taps of ``model``, returned as an ordered dict of tensors.
+
+    Args:
+        model (nn.Module): model to tap; the modules up to the deepest tap are copied,
+            so the model keeps training independently of the extractor
+        layers (list or dict): dotted names of the tapped modules, or a dict of
+            those names to the names of the returned features
+        pool (str): ``'avg'`` or ``'max'`` reduces every 4-d feature map to
+            one vector per image, default: the full feature maps
+    """
+
+    def __init__(self, model, layers, pool=None):
+        super(FeatureExtractor, self).__init__()
+        if pool not in (None, 'avg', 'max'):
+            raise ValueError('pool has to be None, "avg" or "max", got {!r}'.format(pool))
+        if not isinstance(layers, dict):
+            layers = OrderedDict((name, name) for name in layers)
+        # a copy, freezing the shared modules would also freeze the caller's model
+        self.body = copy.deepcopy(IntermediateLayerGetter(model, layers))
+        self.body.requires_grad_(False)
+        self.pool = pool
+        self.train(False)
+
+    def train(self, mode=True):
+        # BatchNorm statistics and dropout stay frozen, also inside a model that is trained
+        return super(FeatureExtractor, self).train(False)
+
+    def forward(self, x):
+        features = self.body(x)
+        if self.pool is not None:
+            pool = F.adaptive_avg_pool2d if self.pool == 'avg' else F.adaptive_max_pool2d
+            for name, feature in features.items():
+                if feature.dim() == 4:
+                    features[name] = torch.flatten(pool(feature, 1), 1)
+        return features
+
+    @torch.no_grad()
+    def target(self, x):
+        r"""The features of ``x`` without a graph, as the targets of a perceptual loss."""
+        return self(x)
+
+    @torch.inference_mode()
+    def extract(self, x):
+        r"""The features of ``x`` as inference tensors, for embeddings; not usable in a differentiated loss."""
+        return self(x)
+
+
+def default_transform(image_size=224):
+    r"""Resize, center crop and ImageNet normalization of the pretrained models."""
+    return transforms.Compose([
+        transforms.Resize(image_size * 256 // 224),
+        transforms.CenterCrop(image_size),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+    ])
+
+
+def extract_folder(extractor, root, output, batch_size=64, transform=None, workers=4, dtype=np.float16):
+    r"""Writes the features of every image of the ``ImageFolder`` at ``root`` into ``output``.
+
+    Every tap becomes ``<output>/<name>.npy`` of shape ``(images, *feature shape)``
+    in the dataset order; ``labels.npy`` holds the class indices and
+    ``images.txt`` the image paths relative to ``root``. The arrays are
+    written through memory maps and renamed into place when complete.
+
+    Args:
+        extractor (FeatureExtractor): the taps to write
+        root (str): image folder with one directory per class
+        output (str): directory of the arrays
+        batch_size (int): images per forward pass
+        transform (callable): default: :func:`default_transform`
+        workers (int): data loading processes
+        dtype (numpy.dtype): type of the stored features
+
+    Returns an ordered dict of the feature names to read-only memory maps.
+    """
+    dataset = datasets.ImageFolder(root, transform or default_transform())
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=False, num_workers=workers)
+    os.makedirs(output, exist_ok=True)
+
+    device = next(extractor.parameters()).device
+    arrays = OrderedDict()
+    start = 0
+    for images, _ in loader:
+        features = extractor.extract(images.to(device))
+        if not arrays:
+            for name, feature in features.items():
+                arrays[name] = np.lib.format.open_memmap(
+                    os.path.join(output, name + '.npy.tmp'), mode='w+', dtype=dtype,
+                    shape=(len(dataset),) + tuple(feature.shape[1:]))
+        for name, feature in features.items():
+            arrays[name][start:start + len(feature)] = feature.cpu().numpy()
+        start += len(images)
+
+    np.save(os.path.join(output, 'labels.npy'), np.asarray(dataset.targets, dtype=np.int64))
+    with open(os.path.join(output, 'images.txt'), 'w') as f:
+        for path, _ in dataset.samples:
+            f.write(os.path.relpath(path, root) + '\n')
+    for name, array in list(arrays.items()):
+        array.flush()
+        path = os.path.join(output, name + '.npy')
+        os.replace(path + '.tmp', path)
+        arrays[name] = np.load(path, mmap_mode='r')
+    return arrays
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write intermediate features of an image folder.')
+    parser.add_argument('--arch', default='resnet50')
+    parser.add_argument('--pretrained', action='store_true', help='load the weights from the weight store')
+    parser.add_argument('--layers', nargs='+', required=True, help='dotted module names, e.g. layer3.1.conv2')
+    parser.add_argument('--pool', choices=['avg', 'max'], help='one vector per image instead of feature maps')
+    parser.add_argument('--data', required=True, help='image folder with one directory per class')
+    parser.add_argument('--output', required=True)
+    parser.add_argument('--image_size', type=int, default=224)
+    parser.add_argument('--batch_size', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--dtype', choices=['float16', 'float32'], default='float16')
+    parser.add_argument('--threads', type=int, help='torch threads, default: torch default')
+    args = parser.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    model = getattr(importlib.import_module(__package__), args.arch)(pretrained=args.pretrained)
+    extractor = FeatureExtractor(model, args.layers, args.pool)
+    kept = sum(p.numel() for p in extractor.parameters())
+    print('%s: %d of %d parameters run up to %s' % (args.arch, kept, sum(p.numel() for p in model.parameters()),
+                                                  args.layers))
+
+    start = time.perf_counter()
+    arrays = extract_folder(extractor, args.data, args.output, args.batch_size,
+                            default_transform(args.image_size), args.workers, np.dtype(args.dtype))
+    elapsed = time.perf_counter() - start
+    for name, array in arrays.items():
+        print('%-30s %-20s %s' % (name, tuple(array.shape), array.dtype))
+    images = len(next(iter(arrays.values())))
+    print('%d images in %.1f s, %.1f img/s' % (images, elapsed, images / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -7,7 +7,7 @@ import torch.nn as nn
 import torch.nn.functional as F
 from torch.jit.annotations import Optional, Tuple
 from torch import Tensor
-from .utils import load_state_dict_from_url
+from .utils import load_state_dict_from_url, _truncated_normal_, _skip_init, _assign_state_dict
 
 __all__ = ['GoogLeNet', 'googlenet', "GoogLeNetOutputs", "_GoogLeNetOutputs"]
 
@@ -36,6 +36,8 @@ def googlenet(pretrained=False, progress=True, **kwargs):
             Default: *False* when pretrained is True otherwise *True*
         transform_input (bool): If True, preprocesses the input according to the method with which it
             was trained on ImageNet. Default: *False*
+        init_weights (bool): If False, skips the weight initialization, e.g. when a state_dict is
+            loaded right after. Default: *False* when pretrained is True otherwise *True*
     """
     if pretrained:
         if 'transform_input' not in kwargs:
@@ -48,10 +50,11 @@ def googlenet(pretrained=False, progress=True, **kwargs):
         original_aux_logits = kwargs['aux_logits']
         kwargs['aux_logits'] = True
         kwargs['init_weights'] = False
-        model = GoogLeNet(**kwargs)
+        with _skip_init(pretrained):
+            model = GoogLeNet(**kwargs)
         state_dict = load_state_dict_from_url(model_urls['googlenet'],
                                               progress=progress)
-        model.load_state_dict(state_dict)
+        _assign_state_dict(model, state_dict)
         if not original_aux_logits:
             model.aux_logits = False
             del model.aux1, model.aux2
@@ -110,12 +113,7 @@ class GoogLeNet(nn.Module):
     def _initialize_weights(self):
         for m in self.modules():
             if isinstance(m, nn.Conv2d) or isinstance(m, nn.Linear):
-                import scipy.stats as stats
-                X = stats.truncnorm(-2, 2, scale=0.01)
-                values = torch.as_tensor(X.rvs(m.weight.numel()), dtype=m.weight.dtype)
-                values = values.view(m.weight.size())
-                with torch.no_grad():
-                    m.weight.copy_(values)
+                _truncated_normal_(m.weight, 0.01)
             elif isinstance(m, nn.BatchNorm2d):
                 nn.init.constant_(m.weight, 1)
                 nn.init.constant_(m.bias, 0)
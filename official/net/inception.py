@@ -7,7 +7,7 @@ import torch.nn as nn
 import torch.nn.functional as F
 from torch.jit.annotations import Optional
 from torch import Tensor
-from .utils import load_state_dict_from_url
+from .utils import load_state_dict_from_url, _truncated_normal_, _skip_init, _assign_state_dict
 
 
 __all__ = ['Inception3', 'inception_v3', 'InceptionOutputs', '_InceptionOutputs']
@@ -41,6 +41,8 @@ def inception_v3(pretrained=False, progress=True, **kwargs):
             Default: *True*
         transform_input (bool): If True, preprocesses the input according to the method with which it
             was trained on ImageNet. Default: *False*
+        init_weights (bool): If False, skips the weight initialization, e.g. when a state_dict is
+            loaded right after. Default: *False* when pretrained is True otherwise *True*
     """
     if pretrained:
         if 'transform_input' not in kwargs:
@@ -50,10 +52,12 @@ def inception_v3(pretrained=False, progress=True, **kwargs):
             kwargs['aux_logits'] = True
         else:
             original_aux_logits = True
-        model = Inception3(**kwargs)
+        kwargs['init_weights'] = False
+        with _skip_init(pretrained):
+            model = Inception3(**kwargs)
         state_dict = load_state_dict_from_url(model_urls['inception_v3_google'],
                                               progress=progress)
-        model.load_state_dict(state_dict)
+        _assign_state_dict(model, state_dict)
         if not original_aux_logits:
             model.aux_logits = False
             del model.AuxLogits
@@ -105,13 +109,8 @@ class Inception3(nn.Module):
         if init_weights:
             for m in self.modules():
                 if isinstance(m, nn.Conv2d) or isinstance(m, nn.Linear):
-                    import scipy.stats as stats
                     stddev = m.stddev if hasattr(m, 'stddev') else 0.1
-                    X = stats.truncnorm(-2, 2, scale=stddev)
-                    values = torch.as_tensor(X.rvs(m.weight.numel()), dtype=m.weight.dtype)
-                    values = values.view(m.weight.size())
-                    with torch.no_grad():
-                        m.weight.copy_(values)
+                    _truncated_normal_(m.weight, stddev)
                 elif isinstance(m, nn.BatchNorm2d):
                     nn.init.constant_(m.weight, 1)
                     nn.init.constant_(m.bias, 0)
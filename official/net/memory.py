@@ -0,0 +1,97 @@
+"""
+Peak memory and step time of training with ``memory_efficient``.
+
+``resnet*``, ``vgg*`` and ``mobilenet_v2`` take ``memory_efficient=True`` like
+the DenseNets: the layers of every stage run in ``segments`` checkpointed
+segments, which keep only their input for the backward pass and recompute
+their activations when the gradient reaches them. A stage is a run of layers
+at one resolution (``layer1`` ... ``layer4`` of a ResNet).
+
+Every configuration trains in a fresh interpreter, so the peak RSS of one
+does not hide the next:
+
+    $ python -m official.net.memory --arch resnet50 vgg16 mobilenet_v2 --batch_size 16 32 64 --segments 0 1 2
+
+``--segments 0`` is the model without checkpointing. ``peak MB`` is the
+growth of the peak RSS over the training steps, the model and its
+optimizer state excluded.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+CHILD = '''
+import json
+import resource
+import time
+import torch
+import torch.nn.functional as F
+import official.net as net
+torch.set_num_threads({threads})
+torch.manual_seed(0)
+kwargs = dict(memory_efficient=True, segments={segments}) if {segments} else {{}}
+model = getattr(net, {arch!r})(**kwargs)
+optimizer = torch.optim.SGD(model.parameters(), lr=0.01, momentum=0.9)
+x = torch.randn({batch_size}, 3, {image_size}, {image_size})
+target = torch.randint(1000, ({batch_size},))
+
+def step():
+    optimizer.zero_grad()
+    F.cross_entropy(model(x), target).backward()
+    optimizer.step()
+
+# the momentum buffers are allocated by the first step, outside of the measured peak
+for p in model.parameters():
+    p.grad = torch.zeros_like(p)
+optimizer.step()
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+step()
+times = []
+for _ in range({iters}):
+    start = time.perf_counter()
+    step()
+    times.append(time.perf_counter() - start)
+times.sort()
+print(json.dumps([times[len(times) // 2], resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - peak]))
+'''
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _train(**kwargs):
+    output = subprocess.check_output([sys.executable, '-c', CHILD.format(**kwargs)], cwd=ROOT)
+    step_time, peak = json.loads(output.decode().splitlines()[-1])
+    return step_time, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Peak memory and step time of memory_efficient training.')
+    parser.add_argument('--arch', nargs='+', default=['resnet50', 'vgg16', 'mobilenet_v2'])
+    parser.add_argument('--batch_size', type=int, nargs='+', default=[16, 32, 64])
+    parser.add_argument('--segments', type=int, nargs='+', default=[0, 1, 2],
+                        help='checkpointed segments per stage, 0: no checkpointing')
+    parser.add_argument('--image_size', type=int, default=224)
+    parser.add_argument('--iters', type=int, default=3, help='timed steps, the median is reported')
+    parser.add_argument('--threads', type=int, default=1, help='torch threads')
+    args = parser.parse_args()
+
+    print('%-16s %5s %8s %10s %10s %8s %10s' % ('arch', 'batch', 'segments', 'step ms', 'img/s', 'slowdown',
+                                               'peak MB'))
+    for arch in args.arch:
+        for batch_size in args.batch_size:
+            baseline = None
+            for segments in args.segments:
+                step_time, peak = _train(arch=arch, batch_size=batch_size, segments=segments,
+                                         image_size=args.image_size, iters=args.iters, threads=args.threads)
+                if baseline is None:
+                    baseline = step_time
+                print('%-16s %5d %8s %10.1f %10.1f %7.2fx %10.1f' % (
+                    arch, batch_size, segments or '-', step_time * 1000, batch_size / step_time,
+                    step_time / baseline, peak / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,7 @@ import warnings
 
 import torch
 import torch.nn as nn
-from .utils import load_state_dict_from_url
+from .utils import load_state_dict_from_url, _skip_init, _assign_state_dict
 
 __all__ = ['MNASNet', 'mnasnet0_5', 'mnasnet0_75', 'mnasnet1_0', 'mnasnet1_3']
 
@@ -198,8 +198,8 @@ def _load_pretrained(model_name, model, progress):
         raise ValueError(
             "No checkpoint is available for model type {}".format(model_name))
     checkpoint_url = _MODEL_URLS[model_name]
-    model.load_state_dict(
-        load_state_dict_from_url(checkpoint_url, progress=progress))
+    _assign_state_dict(
+        model, load_state_dict_from_url(checkpoint_url, progress=progress))
 
 
 def mnasnet0_5(pretrained=False, progress=True, **kwargs):
@@ -210,7 +210,8 @@ def mnasnet0_5(pretrained=False, progress=True, **kwargs):
         pretrained (bool): If True, returns a model pre-trained on ImageNet
         progress (bool): If True, displays a progress bar of the download to stderr
     """
-    model = MNASNet(0.5, **kwargs)
+    with _skip_init(pretrained):
+        model = MNASNet(0.5, **kwargs)
     if pretrained:
         _load_pretrained("mnasnet0_5", model, progress)
     return model
@@ -224,7 +225,8 @@ def mnasnet0_75(pretrained=False, progress=True, **kwargs):
         pretrained (bool): If True, returns a model pre-trained on ImageNet
         progress (bool): If True, displays a progress bar of the download to stderr
     """
-    model = MNASNet(0.75, **kwargs)
+    with _skip_init(pretrained):
+        model = MNASNet(0.75, **kwargs)
     if pretrained:
         _load_pretrained("mnasnet0_75", model, progress)
     return model
@@ -238,7 +240,8 @@ def mnasnet1_0(pretrained=False, progress=True, **kwargs):
         pretrained (bool): If True, returns a model pre-trained on ImageNet
         progress (bool): If True, displays a progress bar of the download to stderr
     """
-    model = MNASNet(1.0, **kwargs)
+    with _skip_init(pretrained):
+        model = MNASNet(1.0, **kwargs)
     if pretrained:
         _load_pretrained("mnasnet1_0", model, progress)
     return model
@@ -252,7 +255,8 @@ def mnasnet1_3(pretrained=False, progress=True, **kwargs):
         pretrained (bool): If True, returns a model pre-trained on ImageNet
         progress (bool): If True, displays a progress bar of the download to stderr
     """
-    model = MNASNet(1.3, **kwargs)
+    with _skip_init(pretrained):
+        model = MNASNet(1.3, **kwargs)
     if pretrained:
         _load_pretrained("mnasnet1_3", model, progress)
     return model
@@ -1,5 +1,6 @@
+import torch
 from torch import nn
-from .utils import load_state_dict_from_url
+from .utils import load_state_dict_from_url, _skip_init, _assign_state_dict, _checkpoint_sequential
 
 
 __all__ = ['MobileNetV2', 'mobilenet_v2']
@@ -75,7 +76,9 @@ class MobileNetV2(nn.Module):
                  width_mult=1.0,
                  inverted_residual_setting=None,
                  round_nearest=8,
-                 block=None):
+                 block=None,
+                 memory_efficient=False,
+                 segments=1):
         """
         MobileNet V2 main class
 
@@ -86,12 +89,17 @@ class MobileNetV2(nn.Module):
             round_nearest (int): Round the number of channels in each layer to be a multiple of this number
             Set to 1 to turn off rounding
             block: Module specifying inverted residual building block for mobilenet
+            memory_efficient (bool): If True, checkpoints every stage of the features during training:
+            its activations are recomputed in the backward pass instead of kept
+            segments (int): Number of checkpointed segments per stage with memory_efficient
 
         """
         super(MobileNetV2, self).__init__()
 
         if block is None:
             block = InvertedResidual
+        self.memory_efficient = memory_efficient
+        self.segments = segments
         input_channel = 32
         last_channel = 1280
 
@@ -150,7 +158,10 @@ class MobileNetV2(nn.Module):
     def _forward_impl(self, x):
         # This exists since TorchScript doesn't support inheritance, so the superclass method
         # (this one) needs to have a name other than `forward` that can be accessed in a subclass
-        x = self.features(x)
+        if self.memory_efficient and torch.is_grad_enabled() and not torch.jit.is_scripting():
+            x = self._checkpointed_features(x)
+        else:
+            x = self.features(x)
         # Cannot use "squeeze" as batch-size can be 1 => must use reshape with x.shape[0]
         x = nn.functional.adaptive_avg_pool2d(x, 1).reshape(x.shape[0], -1)
         x = self.classifier(x)
@@ -159,6 +170,19 @@ class MobileNetV2(nn.Module):
     def forward(self, x):
         return self._forward_impl(x)
 
+    @torch.jit.unused
+    def _checkpointed_features(self, x):
+        # a stage runs at one resolution, it starts at a strided layer
+        stages = []
+        for module in self.features:
+            stride = module[0].stride[0] if isinstance(module, ConvBNReLU) else getattr(module, 'stride', 1)
+            if not stages or stride > 1:
+                stages.append([])
+            stages[-1].append(module)
+        for stage in stages:
+            x = _checkpoint_sequential(stage, self.segments, x)
+        return x
+
 
 def mobilenet_v2(pretrained=False, progress=True, **kwargs):
     """
@@ -168,10 +192,15 @@ def mobilenet_v2(pretrained=False, progress=True, **kwargs):
     Args:
         pretrained (bool): If True, returns a model pre-trained on ImageNet
         progress (bool): If True, displays a progress bar of the download to stderr
+        memory_efficient (bool): If True, checkpoints every stage during training: its activations
+          are recomputed in the backward pass instead of kept. Default: *False*
+        segments (int): checkpointed segments per stage with memory_efficient, more segments keep
+          more activations and recompute less at a time. Default: 1
     """
-    model = MobileNetV2(**kwargs)
+    with _skip_init(pretrained):
+        model = MobileNetV2(**kwargs)
     if pretrained:
         state_dict = load_state_dict_from_url(model_urls['mobilenet_v2'],
                                               progress=progress)
-        model.load_state_dict(state_dict)
+        _assign_state_dict(model, state_dict)
     return model
@@ -0,0 +1,5 @@
+from .mobilenet import *
+from .resnet import *
+from .googlenet import *
+from .inception import *
+from .shufflenetv2 import *
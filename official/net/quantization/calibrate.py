@@ -0,0 +1,161 @@
+"""
+Post-training static int8 quantization of the classification models.
+
+The float model is fused (conv + bn + relu), observed on a few batches of an
+``ImageFolder`` dataset to fix the activation ranges, and converted to int8:
+
+    $ python -m official.net.quantization.calibrate --arch resnet50 --pretrained \\
+          --calib imagenet/train --val imagenet/val --output resnet50_int8.pt
+
+The int8 model is saved as TorchScript and loads with ``torch.jit.load``
+without this package. ``--val`` reports the top-1 accuracy of both models,
+their delta and how often they agree; the class folders of ``--val`` have to
+be in the order the model was trained on (the ImageNet synsets for
+``--pretrained``). Latency is measured on random batches of ``--batch_sizes``
+for the eager float model, the fused ``channels_last`` float model of
+:func:`~official.net.inference.optimize_for_inference` and the int8 model;
+the speedup is against the faster of the two float models.
+
+From Python, calibrating is ``quantize_model(model, backend, batches)`` on a
+model of this package built with ``quantize=False``.
+"""
+import argparse
+import copy
+import importlib
+import itertools
+import time
+
+import torch
+from torch.utils.data import DataLoader
+from torchvision import datasets, transforms
+
+from ..inference import optimize_for_inference
+from .utils import _default_backend, quantize_model
+
+
+ARCHITECTURES = ['resnet', 'mobilenet', 'shufflenetv2', 'googlenet', 'inception']
+
+
+def _builder(arch):
+    for name in ARCHITECTURES:
+        module = importlib.import_module('.' + name, __package__)
+        if arch in module.__all__ and arch[0].islower():
+            return getattr(module, arch)
+    raise ValueError('unknown architecture %r' % arch)
+
+
+def _loader(root, image_size, batch_size, workers):
+    normalize = transforms.Normalize(mean=[0.485, 0.456, 0.406],
+                                     std=[0.229, 0.224, 0.225])
+    dataset = datasets.ImageFolder(root, transforms.Compose([
+        transforms.Resize(int(image_size / 0.875)),
+        transforms.CenterCrop(image_size),
+        transforms.ToTensor(),
+        normalize,
+    ]))
+    return DataLoader(dataset, batch_size=batch_size, shuffle=False, num_workers=workers)
+
+
+def _time(model, x, iters):
+    with torch.inference_mode():
+        for _ in range(2):
+            model(x)
+        times = []
+        for _ in range(iters):
+            start = time.perf_counter()
+            model(x)
+            times.append(time.perf_counter() - start)
+    times.sort()
+    return times[len(times) // 2]
+
+
+def evaluate(float_model, int8_model, loader):
+    r"""Top-1 accuracy of both models on ``loader`` and the fraction of images they agree on."""
+    correct_float = correct_int8 = agree = total = 0
+    with torch.inference_mode():
+        for images, target in loader:
+            pred_float = float_model(images).argmax(1)
+            pred_int8 = int8_model(images).argmax(1)
+            correct_float += (pred_float == target).sum().item()
+            correct_int8 += (pred_int8 == target).sum().item()
+            agree += (pred_float == pred_int8).sum().item()
+            total += target.numel()
+    return correct_float / total, correct_int8 / total, agree / total
+
+
+def main():
+    engines = torch.backends.quantized.supported_engines
+    parser = argparse.ArgumentParser(description='Calibrate, benchmark and export an int8 classification model.')
+    parser.add_argument('--arch', default='resnet18', help='quantizable architecture, e.g. resnet50, mobilenet_v2')
+    parser.add_argument('--pretrained', action='store_true', help='start from the ImageNet float weights')
+    parser.add_argument('--weights', help='float state_dict to start from instead')
+    parser.add_argument('--calib', help='ImageFolder the activation ranges are calibrated on')
+    parser.add_argument('--calib_batches', type=int, default=10, help='number of calibration batches')
+    parser.add_argument('--val', help='ImageFolder for the accuracy of the float and the int8 model')
+    parser.add_argument('--batch_size', type=int, default=32, help='batch size of calibration and validation')
+    parser.add_argument('--workers', type=int, default=4, help='number of data loading workers')
+    parser.add_argument('--backend', choices=[e for e in engines if e != 'none'],
+                        help='quantized engine, default: onednn for the depthwise networks, otherwise x86')
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[1, 16], help='batch sizes of the latency run')
+    parser.add_argument('--iters', type=int, default=10, help='timed batches, the median is reported')
+    parser.add_argument('--threads', type=int, help='torch threads, default: torch default')
+    parser.add_argument('--output', help='where to save the int8 TorchScript model')
+    args = parser.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    backend = args.backend or _default_backend(args.arch)
+
+    image_size = 299 if args.arch == 'inception_v3' else 224
+    kwargs = {}
+    if args.arch in ('googlenet', 'inception_v3'):
+        # the auxiliary heads only run in training
+        kwargs['aux_logits'] = False
+        if args.weights:
+            kwargs['init_weights'] = False
+    model = _builder(args.arch)(pretrained=args.pretrained, quantize=False, **kwargs)
+    if args.weights:
+        state_dict = torch.load(args.weights, map_location='cpu', weights_only=True)
+        keys = model.state_dict()
+        state_dict = {k: v for k, v in state_dict.items()
+                      if k in keys or not k.startswith(('aux1.', 'aux2.', 'AuxLogits.'))}
+        model.load_state_dict(state_dict)
+    model.eval()
+
+    if args.calib:
+        loader = _loader(args.calib, image_size, args.batch_size, args.workers)
+        batches = (images for images, _ in itertools.islice(loader, args.calib_batches))
+    else:
+        print('no --calib folder, calibrating on random images: only the latency is meaningful')
+        batches = [torch.randn(args.batch_size, 3, image_size, image_size) for _ in range(args.calib_batches)]
+    start = time.perf_counter()
+    quantized = quantize_model(copy.deepcopy(model), backend, batches)
+    print('calibrated %s for %s in %.1fs' % (args.arch, backend, time.perf_counter() - start))
+
+    if args.val:
+        loader = _loader(args.val, image_size, args.batch_size, args.workers)
+        acc_float, acc_int8, agree = evaluate(model, quantized, loader)
+        print('top-1 fp32 %.2f%%  int8 %.2f%%  delta %+.2f%%  agreement %.2f%%' % (
+            acc_float * 100, acc_int8 * 100, (acc_int8 - acc_float) * 100, agree * 100))
+
+    fused = optimize_for_inference(model)
+    print('%-20s %5s %10s %10s %10s %10s %8s' % ('arch', 'batch', 'fp32 ms', 'fused ms', 'int8 ms', 'img/s',
+                                               'speedup'))
+    for batch_size in args.batch_sizes:
+        x = torch.randn(batch_size, 3, image_size, image_size)
+        fp32 = _time(model, x, args.iters)
+        fp32_fused = _time(fused, x, args.iters)
+        int8 = _time(quantized, x, args.iters)
+        print('%-20s %5d %10.2f %10.2f %10.2f %10.1f %7.2fx' % (
+            args.arch, batch_size, fp32 * 1000, fp32_fused * 1000, int8 * 1000, batch_size / int8,
+            min(fp32, fp32_fused) / int8))
+
+    if args.output:
+        # traced: scripting needs the auxiliary heads that were removed from googlenet and inception_v3
+        with torch.inference_mode():
+            traced = torch.jit.trace(quantized, torch.randn(1, 3, image_size, image_size))
+        torch.jit.save(traced, args.output)
+        print('saved %s' % args.output)
+
+
+if __name__ == '__main__':
+    main()
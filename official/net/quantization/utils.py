@@ -0,0 +1,74 @@
+import torch
+from torch import nn
+from torch.ao import quantization
+
+
+# fbgemm falls back to a slow depthwise kernel when the channels are not a multiple of 8
+# (116 in shufflenet_v2_x1_0), oneDNN does not
+DEPTHWISE = ('mobilenet', 'shufflenet')
+
+
+def _default_backend(arch):
+    engines = torch.backends.quantized.supported_engines
+    if arch.startswith(DEPTHWISE) and 'onednn' in engines:
+        return 'onednn'
+    return 'x86' if 'x86' in engines else 'fbgemm'
+
+
+def _pretrained_backend(arch, urls, backend=None):
+    r"""Backend and URL of the published int8 weights of ``arch``, the keys of ``urls`` are ``<arch>_<backend>``.
+
+    The weights were calibrated for fbgemm; they also serve x86, which runs
+    fbgemm models. Without ``backend`` the first of x86 and fbgemm the
+    build supports is used.
+    """
+    engines = torch.backends.quantized.supported_engines
+    for name in [backend] if backend else [e for e in ('x86', 'fbgemm') if e in engines]:
+        for weights in (name, 'fbgemm') if name == 'x86' else (name,):
+            if urls.get(arch + '_' + weights) is not None:
+                return name, urls[arch + '_' + weights]
+    raise NotImplementedError('pretrained quantized {} is not supported as of now{}, '
+                              'calibrate the pretrained float model instead'.format(
+                                  arch, ' for ' + backend if backend else ''))
+
+
+def _replace_relu(module):
+    reassign = {}
+    for name, mod in module.named_children():
+        _replace_relu(mod)
+        # Checking for explicit type instead of instance
+        # as we only want to replace modules of the exact type
+        # not inherited classes
+        if type(mod) == nn.ReLU:
+            reassign[name] = nn.ReLU(inplace=False)
+
+    for key, value in reassign.items():
+        module._modules[key] = value
+
+
+def quantize_model(model, backend, calibration_data=None):
+    r"""Fuses, calibrates and converts ``model`` to int8 in place.
+
+    Args:
+        model (nn.Module): a quantizable model of this package
+        backend (str): quantized engine, one of ``torch.backends.quantized.supported_engines``
+        calibration_data (iterable): batches of images the activation ranges are observed on;
+            one random image by default, which is enough to build the structure for loading
+            quantized weights
+    """
+    if backend not in torch.backends.quantized.supported_engines:
+        raise RuntimeError('Quantized backend not supported: {}'.format(backend))
+    torch.backends.quantized.engine = backend
+    if calibration_data is None:
+        calibration_data = [torch.rand(1, 3, 299, 299)]
+    model.eval()
+    model.qconfig = quantization.get_default_qconfig(backend)
+
+    model.fuse_model()
+    quantization.prepare(model, inplace=True)
+    with torch.no_grad():
+        for images in calibration_data:
+            model(images)
+    quantization.convert(model, inplace=True)
+
+    return model
@@ -1,6 +1,6 @@
 import torch
 import torch.nn as nn
-from .utils import load_state_dict_from_url
+from .utils import load_state_dict_from_url, _skip_init, _assign_state_dict, _checkpoint_sequential
 
 
 __all__ = ['ResNet', 'resnet18', 'resnet34', 'resnet50', 'resnet101',
@@ -121,7 +121,7 @@ class ResNet(nn.Module):
 
     def __init__(self, block, layers, num_classes=1000, zero_init_residual=False,
                  groups=1, width_per_group=64, replace_stride_with_dilation=None,
-                 norm_layer=None):
+                 norm_layer=None, memory_efficient=False, segments=1):
         super(ResNet, self).__init__()
         if norm_layer is None:
             norm_layer = nn.BatchNorm2d
@@ -138,6 +138,8 @@ class ResNet(nn.Module):
                              "or a 3-element tuple, got {}".format(replace_stride_with_dilation))
         self.groups = groups
         self.base_width = width_per_group
+        self.memory_efficient = memory_efficient
+        self.segments = segments
         self.conv1 = nn.Conv2d(3, self.inplanes, kernel_size=7, stride=2, padding=3,
                                bias=False)
         self.bn1 = norm_layer(self.inplanes)
@@ -201,10 +203,13 @@ class ResNet(nn.Module):
         x = self.relu(x)
         x = self.maxpool(x)
 
-        x = self.layer1(x)
-        x = self.layer2(x)
-        x = self.layer3(x)
-        x = self.layer4(x)
+        if self.memory_efficient and torch.is_grad_enabled() and not torch.jit.is_scripting():
+            x = self._checkpointed_layers(x)
+        else:
+            x = self.layer1(x)
+            x = self.layer2(x)
+            x = self.layer3(x)
+            x = self.layer4(x)
 
         x = self.avgpool(x)
         x = torch.flatten(x, 1)
@@ -215,13 +220,20 @@ class ResNet(nn.Module):
     def forward(self, x):
         return self._forward_impl(x)
 
+    @torch.jit.unused
+    def _checkpointed_layers(self, x):
+        for layer in [self.layer1, self.layer2, self.layer3, self.layer4]:
+            x = _checkpoint_sequential(layer, self.segments, x)
+        return x
+
 
 def _resnet(arch, block, layers, pretrained, progress, **kwargs):
-    model = ResNet(block, layers, **kwargs)
+    with _skip_init(pretrained):
+        model = ResNet(block, layers, **kwargs)
     if pretrained:
         state_dict = load_state_dict_from_url(model_urls[arch],
                                               progress=progress)
-        model.load_state_dict(state_dict)
+        _assign_state_dict(model, state_dict)
     return model
 
 
@@ -232,6 +244,10 @@ def resnet18(pretrained=False, progress=True, **kwargs):
     Args:
         pretrained (bool): If True, returns a model pre-trained on ImageNet
         progress (bool): If True, displays a progress bar of the download to stderr
+        memory_efficient (bool): If True, checkpoints every stage during training: its activations
+          are recomputed in the backward pass instead of kept. Default: *False*
+        segments (int): checkpointed segments per stage with memory_efficient, more segments keep
+          more activations and recompute less at a time. Default: 1
     """
     return _resnet('resnet18', BasicBlock, [2, 2, 2, 2], pretrained, progress,
                    **kwargs)
@@ -244,6 +260,10 @@ def resnet34(pretrained=False, progress=True, **kwargs):
     Args:
         pretrained (bool): If True, returns a model pre-trained on ImageNet
         progress (bool): If True, displays a progress bar of the download to stderr
+        memory_efficient (bool): If True, checkpoints every stage during training: its activations
+          are recomputed in the backward pass instead of kept. Default: *False*
+        segments (int): checkpointed segments per stage with memory_efficient, more segments keep
+          more activations and recompute less at a time. Default: 1
     """
     return _resnet('resnet34', BasicBlock, [3, 4, 6, 3], pretrained, progress,
                    **kwargs)
@@ -256,6 +276,10 @@ def resnet50(pretrained=False, progress=True, **kwargs):
     Args:
         pretrained (bool): If True, returns a model pre-trained on ImageNet
         progress (bool): If True, displays a progress bar of the download to stderr
+        memory_efficient (bool): If True, checkpoints every stage during training: its activations
+          are recomputed in the backward pass instead of kept. Default: *False*
+        segments (int): checkpointed segments per stage with memory_efficient, more segments keep
+          more activations and recompute less at a time. Default: 1
     """
     return _resnet('resnet50', Bottleneck, [3, 4, 6, 3], pretrained, progress,
                    **kwargs)
@@ -268,6 +292,10 @@ def resnet101(pretrained=False, progress=True, **kwargs):
     Args:
         pretrained (bool): If True, returns a model pre-trained on ImageNet
         progress (bool): If True, displays a progress bar of the download to stderr
+        memory_efficient (bool): If True, checkpoints every stage during training: its activations
+          are recomputed in the backward pass instead of kept. Default: *False*
+        segments (int): checkpointed segments per stage with memory_efficient, more segments keep
+          more activations and recompute less at a time. Default: 1
     """
     return _resnet('resnet101', Bottleneck, [3, 4, 23, 3], pretrained, progress,
                    **kwargs)
@@ -280,6 +308,10 @@ def resnet152(pretrained=False, progress=True, **kwargs):
     Args:
         pretrained (bool): If True, returns a model pre-trained on ImageNet
         progress (bool): If True, displays a progress bar of the download to stderr
+        memory_efficient (bool): If True, checkpoints every stage during training: its activations
+          are recomputed in the backward pass instead of kept. Default: *False*
+        segments (int): checkpointed segments per stage with memory_efficient, more segments keep
+          more activations and recompute less at a time. Default: 1
     """
     return _resnet('resnet152', Bottleneck, [3, 8, 36, 3], pretrained, progress,
                    **kwargs)
@@ -292,6 +324,10 @@ def resnext50_32x4d(pretrained=False, progress=True, **kwargs):
     Args:
         pretrained (bool): If True, returns a model pre-trained on ImageNet
         progress (bool): If True, displays a progress bar of the download to stderr
+        memory_efficient (bool): If True, checkpoints every stage during training: its activations
+          are recomputed in the backward pass instead of kept. Default: *False*
+        segments (int): checkpointed segments per stage with memory_efficient, more segments keep
+          more activations and recompute less at a time. Default: 1
     """
     kwargs['groups'] = 32
     kwargs['width_per_group'] = 4
@@ -306,6 +342,10 @@ def resnext101_32x8d(pretrained=False, progress=True, **kwargs):
     Args:
         pretrained (bool): If True, returns a model pre-trained on ImageNet
         progress (bool): If True, displays a progress bar of the download to stderr
+        memory_efficient (bool): If True, checkpoints every stage during training: its activations
+          are recomputed in the backward pass instead of kept. Default: *False*
+        segments (int): checkpointed segments per stage with memory_efficient, more segments keep
+          more activations and recompute less at a time. Default: 1
     """
     kwargs['groups'] = 32
     kwargs['width_per_group'] = 8
@@ -325,6 +365,10 @@ def wide_resnet50_2(pretrained=False, progress=True, **kwargs):
     Args:
         pretrained (bool): If True, returns a model pre-trained on ImageNet
         progress (bool): If True, displays a progress bar of the download to stderr
+        memory_efficient (bool): If True, checkpoints every stage during training: its activations
+          are recomputed in the backward pass instead of kept. Default: *False*
+        segments (int): checkpointed segments per stage with memory_efficient, more segments keep
+          more activations and recompute less at a time. Default: 1
     """
     kwargs['width_per_group'] = 64 * 2
     return _resnet('wide_resnet50_2', Bottleneck, [3, 4, 6, 3],
@@ -343,6 +387,10 @@ def wide_resnet101_2(pretrained=False, progress=True, **kwargs):
     Args:
         pretrained (bool): If True, returns a model pre-trained on ImageNet
         progress (bool): If True, displays a progress bar of the download to stderr
+        memory_efficient (bool): If True, checkpoints every stage during training: its activations
+          are recomputed in the backward pass instead of kept. Default: *False*
+        segments (int): checkpointed segments per stage with memory_efficient, more segments keep
+          more activations and recompute less at a time. Default: 1
     """
     kwargs['width_per_group'] = 64 * 2
     return _resnet('wide_resnet101_2', Bottleneck, [3, 4, 23, 3],
@@ -1,6 +1,6 @@
 import torch
 import torch.nn as nn
-from .utils import load_state_dict_from_url
+from .utils import load_state_dict_from_url, _skip_init, _assign_state_dict
 
 
 __all__ = [
@@ -18,7 +18,7 @@ model_urls = {
 
 def channel_shuffle(x, groups):
     # type: (torch.Tensor, int) -> torch.Tensor
-    batchsize, num_channels, height, width = x.data.size()
+    batchsize, num_channels, height, width = x.size()
     channels_per_group = num_channels // groups
 
     # reshape
@@ -139,7 +139,8 @@ class ShuffleNetV2(nn.Module):
 
 
 def _shufflenetv2(arch, pretrained, progress, *args, **kwargs):
-    model = ShuffleNetV2(*args, **kwargs)
+    with _skip_init(pretrained):
+        model = ShuffleNetV2(*args, **kwargs)
 
     if pretrained:
         model_url = model_urls[arch]
@@ -147,7 +148,7 @@ def _shufflenetv2(arch, pretrained, progress, *args, **kwargs):
             raise NotImplementedError('pretrained {} is not supported as of now'.format(arch))
         else:
             state_dict = load_state_dict_from_url(model_url, progress=progress)
-            model.load_state_dict(state_dict)
+            _assign_state_dict(model, state_dict)
 
     return model
 
@@ -1,7 +1,7 @@
 import torch
 import torch.nn as nn
 import torch.nn.init as init
-from .utils import load_state_dict_from_url
+from .utils import load_state_dict_from_url, _skip_init, _assign_state_dict
 
 __all__ = ['SqueezeNet', 'squeezenet1_0', 'squeezenet1_1']
 
@@ -103,12 +103,13 @@ class SqueezeNet(nn.Module):
 
 
 def _squeezenet(version, pretrained, progress, **kwargs):
-    model = SqueezeNet(version, **kwargs)
+    with _skip_init(pretrained):
+        model = SqueezeNet(version, **kwargs)
     if pretrained:
         arch = 'squeezenet' + version
         state_dict = load_state_dict_from_url(model_urls[arch],
                                               progress=progress)
-        model.load_state_dict(state_dict)
+        _assign_state_dict(model, state_dict)
     return model
 
 
@@ -0,0 +1,162 @@
+"""
+Import and construction time of ``official.net``.
+
+The package imports an architecture on first access, so a job that builds
+one model pays for that module only. Every statement runs in a fresh
+interpreter, after ``import torch`` (reported separately, it is the same for
+all of them):
+
+    $ python -m official.net.startup --runs 10
+
+``from official.net import *`` is what the eager star imports of the
+package used to cost.
+
+The second table times building the models of ``--arch``, with their weight
+initialization and with ``init_weights=False`` where a model has the option,
+which is what a model gets that loads a ``state_dict`` right after.
+
+``--pretrained`` adds a table of ``pretrained=True`` loads from the weight
+store (see weights.py), each in a fresh interpreter: the builders construct
+the model on the meta device and bind its parameters to the memory-mapped
+file (``assign``), against the previous path of random initialization, a full
+read of the file and a copy into the model (``copy``). ``peak MB`` is the
+growth of the peak RSS during the load, ``private MB`` the memory of the
+process that is not shared page cache of the file afterwards:
+
+    $ OFFICIAL_NET_MIRROR=/tmp/mirror OFFICIAL_NET_OFFLINE=1 \\
+          python -m official.net.startup --runs 3 --pretrained vgg16 densenet121 resnet50
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import torch
+
+
+STATEMENTS = [
+    'import official.net',
+    'from official.net import resnet18',
+    'from official.net import resnet18; resnet18()',
+    'from official.net import *',
+    'import official.net.quantization',
+]
+
+CHILD = '''
+import time
+start = time.perf_counter()
+import torch
+middle = time.perf_counter()
+{}
+print(middle - start, time.perf_counter() - middle)
+'''
+
+# the builder of the previous path: random init, read without mmap, copy
+COPY = '''
+import contextlib
+import importlib
+module = importlib.import_module(builder.__module__)
+module._skip_init = lambda pretrained: contextlib.nullcontext()
+module._assign_state_dict = lambda model, state_dict: model.load_state_dict(state_dict)
+store = get_store()
+store.load = lambda url, map_location=None, check_hash=True, file_name=None: torch.load(
+    store.path(url, file_name, check_hash), map_location=map_location, weights_only=True)
+'''
+
+LOAD = '''
+import json
+import resource
+import time
+import torch
+import official.net as net
+from official.net.weights import get_store
+builder = getattr(net, {arch!r})
+{setup}
+
+def private():
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith('RssAnon:'))
+
+peak, anonymous = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, private()
+start = time.perf_counter()
+model = builder(pretrained=True)
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - peak, private() - anonymous]))
+'''
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _run(statement):
+    output = subprocess.check_output([sys.executable, '-c', CHILD.format(statement)], cwd=ROOT)
+    torch_time, statement_time = map(float, output.split()[-2:])
+    return torch_time, statement_time
+
+
+def _load(arch, setup=''):
+    output = subprocess.check_output([sys.executable, '-c', LOAD.format(arch=arch, setup=setup)], cwd=ROOT)
+    return json.loads(output.decode().splitlines()[-1])
+
+
+def _construct(builder, runs, **kwargs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        builder(**kwargs)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times[len(times) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import and construction time of official.net.')
+    parser.add_argument('--runs', type=int, default=5, help='interpreters per statement, the median is reported')
+    parser.add_argument('--arch', nargs='+', default=['resnet18', 'resnet50', 'googlenet', 'inception_v3'],
+                        help='models whose construction is timed')
+    parser.add_argument('--threads', type=int, help='torch threads, default: torch default')
+    parser.add_argument('--pretrained', nargs='*', default=[], metavar='ARCH',
+                        help='models whose pretrained load is measured, from the configured weight store')
+    args = parser.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    torch_times = []
+    print('%-50s %10s' % ('statement', 'ms'))
+    for statement in STATEMENTS:
+        times = []
+        for _ in range(args.runs):
+            torch_time, statement_time = _run(statement)
+            torch_times.append(torch_time)
+            times.append(statement_time)
+        times.sort()
+        print('%-50s %10.1f' % (statement, times[len(times) // 2] * 1000))
+    torch_times.sort()
+    print('%-50s %10.1f' % ('(import torch)', torch_times[len(torch_times) // 2] * 1000))
+
+    import official.net as net
+    print()
+    print('%-20s %12s %12s' % ('arch', 'init ms', 'no init ms'))
+    for arch in args.arch:
+        builder = getattr(net, arch)
+        init = _construct(builder, args.runs)
+        if arch in ('googlenet', 'inception_v3'):
+            print('%-20s %12.1f %12.1f' % (arch, init * 1000, _construct(builder, args.runs, init_weights=False) * 1000))
+        else:
+            print('%-20s %12.1f %12s' % (arch, init * 1000, '-'))
+
+    if args.pretrained:
+        print()
+        print('%-20s %-7s %10s %10s %11s' % ('arch', 'path', 'ms', 'peak MB', 'private MB'))
+    for arch in args.pretrained:
+        # fills the store and the page cache, both paths read the same cached file
+        _load(arch)
+        for path, setup in [('copy', COPY), ('assign', '')]:
+            results = sorted(_load(arch, setup) for _ in range(args.runs))
+            elapsed, peak, private = results[len(results) // 2]
+            print('%-20s %-7s %10.1f %10.1f %11.1f' % (arch, path, elapsed * 1000, peak / 1024, private / 1024))
+
+
+if __name__ == '__main__':
+    main()
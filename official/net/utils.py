@@ -1,4 +1,115 @@
-try:
-    from torch.hub import load_state_dict_from_url
-except ImportError:
-    from torch.utils.model_zoo import load_url as load_state_dict_from_url
+import contextlib
+import functools
+import itertools
+import math
+
+import torch
+import torch.nn as nn
+import torch.utils.checkpoint as cp
+
+# the pretrained weights come from the local weight store, see weights.py
+from .weights import load_state_dict_from_url
+
+
+@torch.no_grad()
+def _truncated_normal_(tensor, std):
+    """Fills ``tensor`` in place from N(0, std^2) truncated to two standard deviations.
+
+    Same distribution as ``scipy.stats.truncnorm(-2, 2, scale=std)``, drawn by
+    inverting the normal CDF in one pass instead of redrawing rejected values.
+    """
+    bound = math.erf(2 / math.sqrt(2))
+    tensor.uniform_(-bound, bound)
+    tensor.erfinv_()
+    tensor.mul_(std * math.sqrt(2))
+    # erfinv can round past the bounds
+    tensor.clamp_(min=-2 * std, max=2 * std)
+    return tensor
+
+
+_INIT_FUNCTIONS = [name for name in dir(torch.nn.init) if name.endswith('_') and not name.startswith('_')]
+
+
+def _no_init(tensor, *args, **kwargs):
+    return tensor
+
+
+@contextlib.contextmanager
+def _skip_init(pretrained):
+    """Context the builders construct a model in: on the meta device when pretrained.
+
+    A pretrained model gets every parameter and buffer from the state_dict, so
+    they are neither allocated nor initialized; :func:`_assign_state_dict`
+    binds them to the loaded tensors afterwards.
+    """
+    if not pretrained:
+        yield
+        return
+    # several init functions have no meta kernel, their first call imports the
+    # Python decompositions, which takes longer than loading most models
+    originals = {name: getattr(torch.nn.init, name) for name in _INIT_FUNCTIONS}
+    try:
+        for name in originals:
+            setattr(torch.nn.init, name, _no_init)
+        with torch.device('meta'):
+            yield
+    finally:
+        for name, function in originals.items():
+            setattr(torch.nn.init, name, function)
+
+
+def _assign_state_dict(model, state_dict):
+    """Loads ``state_dict`` into a model built under :func:`_skip_init`, in place.
+
+    The tensors of ``state_dict`` become the parameters and buffers, so the
+    weights memory-mapped by the weight store are neither copied nor read
+    before they are used.
+    """
+    model.load_state_dict(state_dict, assign=True)
+    unset = [name for name, tensor in itertools.chain(model.named_parameters(), model.named_buffers())
+             if tensor.is_meta]
+    if unset:
+        raise RuntimeError('the state_dict does not set {}'.format(', '.join(unset)))
+    return model
+
+
+@contextlib.contextmanager
+def _frozen_running_stats(modules):
+    """Recomputing a checkpointed segment must not update its BatchNorm statistics a second time."""
+    norms = [m for module in modules for m in module.modules()
+             if isinstance(m, nn.modules.batchnorm._BatchNorm) and m.training and m.track_running_stats]
+    saved = [(m.momentum, m.num_batches_tracked.clone()) for m in norms]
+    try:
+        for m in norms:
+            m.momentum = 0.0
+        yield
+    finally:
+        for m, (momentum, num_batches_tracked) in zip(norms, saved):
+            m.momentum = momentum
+            m.num_batches_tracked.copy_(num_batches_tracked)
+
+
+def _recompute_context(modules):
+    return contextlib.nullcontext(), _frozen_running_stats(modules)
+
+
+def _run_modules(modules, x):
+    for module in modules:
+        x = module(x)
+    return x
+
+
+def _checkpoint_sequential(modules, segments, x):
+    """Runs ``modules`` one after the other in ``segments`` checkpointed segments.
+
+    Only the input of every segment is kept for the backward pass; the
+    activations inside a segment are recomputed when its gradient is needed.
+    """
+    modules = list(modules)
+    segments = max(1, min(segments, len(modules)))
+    bounds = [len(modules) * i // segments for i in range(segments + 1)]
+    for start, end in zip(bounds, bounds[1:]):
+        segment = modules[start:end]
+        x = cp.checkpoint(functools.partial(_run_modules, segment), x, use_reentrant=False,
+                          context_fn=functools.partial(_recompute_context, segment))
+    return x
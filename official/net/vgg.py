@@ -1,6 +1,6 @@
 import torch
 import torch.nn as nn
-from .utils import load_state_dict_from_url
+from .utils import load_state_dict_from_url, _skip_init, _assign_state_dict, _checkpoint_sequential
 
 
 __all__ = [
@@ -23,9 +23,11 @@ model_urls = {
 
 class VGG(nn.Module):
 
-    def __init__(self, features, num_classes=1000, init_weights=True):
+    def __init__(self, features, num_classes=1000, init_weights=True, memory_efficient=False, segments=1):
         super(VGG, self).__init__()
         self.features = features
+        self.memory_efficient = memory_efficient
+        self.segments = segments
         self.avgpool = nn.AdaptiveAvgPool2d((7, 7))
         self.classifier = nn.Sequential(
             nn.Linear(512 * 7 * 7, 4096),
@@ -40,12 +42,32 @@ class VGG(nn.Module):
             self._initialize_weights()
 
     def forward(self, x):
-        x = self.features(x)
+        if self.memory_efficient and torch.is_grad_enabled() and not torch.jit.is_scripting():
+            x = self._checkpointed_features(x)
+        else:
+            x = self.features(x)
         x = self.avgpool(x)
         x = torch.flatten(x, 1)
         x = self.classifier(x)
         return x
 
+    @torch.jit.unused
+    def _checkpointed_features(self, x):
+        # a stage runs at one resolution up to its max pooling; it is split between
+        # convolutions, so no segment starts with an in-place ReLU on its saved input
+        stages = [[]]
+        for module in self.features:
+            if isinstance(module, nn.Conv2d) or not stages[-1]:
+                stages[-1].append(nn.Sequential(module))
+            else:
+                stages[-1][-1].append(module)
+            if isinstance(module, nn.MaxPool2d):
+                stages.append([])
+        for stage in stages:
+            if stage:
+                x = _checkpoint_sequential(stage, self.segments, x)
+        return x
+
     def _initialize_weights(self):
         for m in self.modules():
             if isinstance(m, nn.Conv2d):
@@ -87,11 +109,12 @@ cfgs = {
 def _vgg(arch, cfg, batch_norm, pretrained, progress, **kwargs):
     if pretrained:
         kwargs['init_weights'] = False
-    model = VGG(make_layers(cfgs[cfg], batch_norm=batch_norm), **kwargs)
+    with _skip_init(pretrained):
+        model = VGG(make_layers(cfgs[cfg], batch_norm=batch_norm), **kwargs)
     if pretrained:
         state_dict = load_state_dict_from_url(model_urls[arch],
                                               progress=progress)
-        model.load_state_dict(state_dict)
+        _assign_state_dict(model, state_dict)
     return model
 
 
@@ -102,6 +125,10 @@ def vgg11(pretrained=False, progress=True, **kwargs):
     Args:
         pretrained (bool): If True, returns a model pre-trained on ImageNet
         progress (bool): If True, displays a progress bar of the download to stderr
+        memory_efficient (bool): If True, checkpoints every stage during training: its activations
+          are recomputed in the backward pass instead of kept. Default: *False*
+        segments (int): checkpointed segments per stage with memory_efficient, more segments keep
+          more activations and recompute less at a time. Default: 1
     """
     return _vgg('vgg11', 'A', False, pretrained, progress, **kwargs)
 
@@ -113,6 +140,10 @@ def vgg11_bn(pretrained=False, progress=True, **kwargs):
     Args:
         pretrained (bool): If True, returns a model pre-trained on ImageNet
         progress (bool): If True, displays a progress bar of the download to stderr
+        memory_efficient (bool): If True, checkpoints every stage during training: its activations
+          are recomputed in the backward pass instead of kept. Default: *False*
+        segments (int): checkpointed segments per stage with memory_efficient, more segments keep
+          more activations and recompute less at a time. Default: 1
     """
     return _vgg('vgg11_bn', 'A', True, pretrained, progress, **kwargs)
 
@@ -124,6 +155,10 @@ def vgg13(pretrained=False, progress=True, **kwargs):
     Args:
         pretrained (bool): If True, returns a model pre-trained on ImageNet
         progress (bool): If True, displays a progress bar of the download to stderr
+        memory_efficient (bool): If True, checkpoints every stage during training: its activations
+          are recomputed in the backward pass instead of kept. Default: *False*
+        segments (int): checkpointed segments per stage with memory_efficient, more segments keep
+          more activations and recompute less at a time. Default: 1
     """
     return _vgg('vgg13', 'B', False, pretrained, progress, **kwargs)
 
@@ -135,6 +170,10 @@ def vgg13_bn(pretrained=False, progress=True, **kwargs):
     Args:
         pretrained (bool): If True, returns a model pre-trained on ImageNet
         progress (bool): If True, displays a progress bar of the download to stderr
+        memory_efficient (bool): If True, checkpoints every stage during training: its activations
+          are recomputed in the backward pass instead of kept. Default: *False*
+        segments (int): checkpointed segments per stage with memory_efficient, more segments keep
+          more activations and recompute less at a time. Default: 1
     """
     return _vgg('vgg13_bn', 'B', True, pretrained, progress, **kwargs)
 
@@ -146,6 +185,10 @@ def vgg16(pretrained=False, progress=True, **kwargs):
     Args:
         pretrained (bool): If True, returns a model pre-trained on ImageNet
         progress (bool): If True, displays a progress bar of the download to stderr
+        memory_efficient (bool): If True, checkpoints every stage during training: its activations
+          are recomputed in the backward pass instead of kept. Default: *False*
+        segments (int): checkpointed segments per stage with memory_efficient, more segments keep
+          more activations and recompute less at a time. Default: 1
     """
     return _vgg('vgg16', 'D', False, pretrained, progress, **kwargs)
 
@@ -157,6 +200,10 @@ def vgg16_bn(pretrained=False, progress=True, **kwargs):
     Args:
         pretrained (bool): If True, returns a model pre-trained on ImageNet
         progress (bool): If True, displays a progress bar of the download to stderr
+        memory_efficient (bool): If True, checkpoints every stage during training: its activations
+          are recomputed in the backward pass instead of kept. Default: *False*
+        segments (int): checkpointed segments per stage with memory_efficient, more segments keep
+          more activations and recompute less at a time. Default: 1
     """
     return _vgg('vgg16_bn', 'D', True, pretrained, progress, **kwargs)
 
@@ -168,6 +215,10 @@ def vgg19(pretrained=False, progress=True, **kwargs):
     Args:
         pretrained (bool): If True, returns a model pre-trained on ImageNet
         progress (bool): If True, displays a progress bar of the download to stderr
+        memory_efficient (bool): If True, checkpoints every stage during training: its activations
+          are recomputed in the backward pass instead of kept. Default: *False*
+        segments (int): checkpointed segments per stage with memory_efficient, more segments keep
+          more activations and recompute less at a time. Default: 1
     """
     return _vgg('vgg19', 'E', False, pretrained, progress, **kwargs)
 
@@ -179,5 +230,9 @@ def vgg19_bn(pretrained=False, progress=True, **kwargs):
     Args:
         pretrained (bool): If True, returns a model pre-trained on ImageNet
         progress (bool): If True, displays a progress bar of the download to stderr
+        memory_efficient (bool): If True, checkpoints every stage during training: its activations
+          are recomputed in the backward pass instead of kept. Default: *False*
+        segments (int): checkpointed segments per stage with memory_efficient, more segments keep
+          more activations and recompute less at a time. Default: 1
     """
     return _vgg('vgg19_bn', 'E', True, pretrained, progress, **kwargs)
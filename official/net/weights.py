@@ -0,0 +1,349 @@
+"""
+Offline store of the pretrained weights.
+
+Every ``model_urls`` entry ends in the first hex digits of the SHA-256 of
+the file, e.g. ``resnet18-5c106cde.pth``. :class:`WeightStore` keeps the
+files in a local directory, keyed by that suffix, and only hands out a file
+whose digest matches it. A file missing from the store is copied from a
+mirror (a directory, ``file://`` or ``http(s)://`` base URL holding the files
+under their original names) and, unless the store is offline, downloaded from
+the original URL as a last resort.
+
+The builders find the store through the environment:
+
+    $ export OFFICIAL_NET_WEIGHTS=/models/weights     # the store, default: the torch hub cache
+    $ export OFFICIAL_NET_MIRROR=/nfs/model-mirror    # optional
+    $ export OFFICIAL_NET_OFFLINE=1                   # never download from download.pytorch.org
+
+or through :func:`set_store` from Python. Files are loaded with
+``torch.load(mmap=True)``, so the processes of a node share one page-cached
+copy instead of reading the file each. Files in the legacy (non-zip)
+serialization format cannot be mapped; they are converted once into
+``<store>/mmap/``.
+
+A mirror may also hold an ``aliases.json`` mapping a requested file name to
+another file of the mirror, e.g. weights fine-tuned in-house. The alias is
+verified against its own hash suffix. ``stand-in`` builds such a mirror with
+randomly initialized weights, to test pods without network or real weights:
+
+    $ python -m official.net.weights stand-in /tmp/mirror --arch resnet18 mobilenet_v2
+    $ OFFICIAL_NET_MIRROR=/tmp/mirror OFFICIAL_NET_OFFLINE=1 python -c \\
+          "from official.net import resnet18; resnet18(pretrained=True)"
+"""
+import argparse
+import errno
+import glob
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from urllib.parse import urlparse
+from urllib.request import urlopen
+
+import torch
+from torch.hub import HASH_REGEX, download_url_to_file, get_dir
+
+
+__all__ = ['WeightStore', 'get_store', 'set_store']
+
+ALIASES = 'aliases.json'
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _hash_suffix(file_name):
+    match = HASH_REGEX.search(file_name)
+    return match.group(1) if match else None
+
+
+class WeightStore(object):
+    r"""Directory of verified weight files, filled from a mirror or the original URLs.
+
+    Args:
+        root (str): directory of the store, default: ``<torch hub dir>/checkpoints``
+        mirror (str): directory or base URL the missing files are copied from
+        offline (bool): never download from the original URL
+        progress (bool): display a progress bar of downloads
+    """
+
+    def __init__(self, root=None, mirror=None, offline=False, progress=True):
+        self.root = root or os.path.join(get_dir(), 'checkpoints')
+        self.mirror = mirror
+        self.offline = offline
+        self.progress = progress
+        self._aliases = None
+
+    def path(self, url, file_name=None, check_hash=True):
+        r"""Local path of the verified file of ``url``, fetched into the store if it is missing."""
+        file_name = file_name or os.path.basename(urlparse(url).path)
+        suffix = _hash_suffix(file_name)
+        path = self._find(file_name, suffix)
+        if path is None:
+            os.makedirs(self.root, exist_ok=True)
+            path = self._fetch(url, file_name)
+        if check_hash:
+            self._verify(path)
+        return path
+
+    def load(self, url, map_location=None, check_hash=True, file_name=None):
+        r"""The state_dict of ``url``, memory-mapped from the store."""
+        path = self.path(url, file_name, check_hash)
+        if not zipfile.is_zipfile(path):
+            path = self._convert(path)
+        return torch.load(path, map_location=map_location, mmap=True, weights_only=True)
+
+    def _find(self, file_name, suffix):
+        path = os.path.join(self.root, file_name)
+        if os.path.isfile(path):
+            return path
+        alias = _read_json(os.path.join(self.root, ALIASES)).get(file_name)
+        if alias and os.path.isfile(os.path.join(self.root, alias)):
+            return os.path.join(self.root, alias)
+        if suffix:
+            # keyed by the hash, the same file may be stored under another name
+            for path in sorted(glob.glob(os.path.join(glob.escape(self.root), '*-%s.*' % suffix))):
+                if not path.endswith(('.tmp', '.sha256')):
+                    return path
+        return None
+
+    def _fetch(self, url, file_name):
+        if self.mirror:
+            name = self._mirror_aliases().get(file_name, file_name)
+            path = os.path.join(self.root, name)
+            if os.path.isfile(path) or self._copy_from_mirror(name, path):
+                if name != file_name:
+                    # later loads find the alias without the mirror
+                    aliases = _read_json(os.path.join(self.root, ALIASES))
+                    aliases[file_name] = name
+                    self._write_json(os.path.join(self.root, ALIASES), aliases)
+                return path
+        if self.offline:
+            raise RuntimeError('{} is neither in the weight store {} nor in the mirror {} and downloads are '
+                               'disabled (OFFICIAL_NET_OFFLINE)'.format(file_name, self.root, self.mirror))
+        path = os.path.join(self.root, file_name)
+        tmp = self._tmp(path)
+        try:
+            download_url_to_file(url, tmp, _hash_suffix(file_name), progress=self.progress)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return path
+
+    def _mirror_source(self, name):
+        parsed = urlparse(self.mirror)
+        if parsed.scheme in ('http', 'https'):
+            return self.mirror.rstrip('/') + '/' + name, True
+        base = parsed.path if parsed.scheme == 'file' else self.mirror
+        return os.path.join(base, name), False
+
+    def _mirror_aliases(self):
+        if self._aliases is None:
+            source, remote = self._mirror_source(ALIASES)
+            if remote:
+                try:
+                    with urlopen(source) as f:
+                        self._aliases = json.loads(f.read().decode())
+                except (OSError, ValueError):
+                    self._aliases = {}
+            else:
+                self._aliases = _read_json(source)
+        return self._aliases
+
+    def _copy_from_mirror(self, name, path):
+        source, remote = self._mirror_source(name)
+        tmp = self._tmp(path)
+        try:
+            if remote:
+                try:
+                    download_url_to_file(source, tmp, _hash_suffix(name), progress=self.progress)
+                except OSError:
+                    return False
+            elif not os.path.isfile(source):
+                return False
+            else:
+                try:
+                    # same filesystem: no copy at all
+                    os.link(source, tmp)
+                except OSError:
+                    shutil.copyfile(source, tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return True
+
+    def _write_json(self, path, obj):
+        tmp = self._tmp(path)
+        with open(tmp, 'w') as f:
+            json.dump(obj, f, indent=1, sort_keys=True)
+        os.replace(tmp, path)
+
+    def _tmp(self, path):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.', suffix='.tmp')
+        os.close(fd)
+        os.remove(tmp)
+        return tmp
+
+    def _verify(self, path):
+        suffix = _hash_suffix(os.path.basename(path))
+        if not suffix:
+            return
+        stat = os.stat(path)
+        stamp = path + '.sha256'
+        # a file is hashed once, later loads check size and modification time only
+        try:
+            with open(stamp) as f:
+                size, mtime, digest = f.read().split()
+            if int(size) == stat.st_size and int(mtime) == stat.st_mtime_ns and digest.startswith(suffix):
+                return
+        except (OSError, ValueError):
+            pass
+        digest = _sha256(path)
+        if not digest.startswith(suffix):
+            raise RuntimeError('invalid hash value of {} (expected "{}", got "{}"), remove it to fetch it again'
+                               .format(path, suffix, digest))
+        try:
+            with open(stamp, 'w') as f:
+                f.write('%d %d %s\n' % (stat.st_size, stat.st_mtime_ns, digest))
+        except OSError as e:
+            # a read-only store is verified on every load
+            if e.errno not in (errno.EACCES, errno.EROFS, errno.EPERM):
+                raise
+
+    def _convert(self, path):
+        converted = os.path.join(self.root, 'mmap', os.path.basename(path))
+        if os.path.isfile(converted) and os.path.getmtime(converted) >= os.path.getmtime(path):
+            return converted
+        state_dict = torch.load(path, map_location='cpu', weights_only=True)
+        try:
+            os.makedirs(os.path.dirname(converted), exist_ok=True)
+            tmp = self._tmp(converted)
+            torch.save(state_dict, tmp)
+            os.replace(tmp, converted)
+        except OSError:
+            # read-only store: load the legacy file without mapping it
+            return path
+        return converted
+
+
+_store = None
+
+
+def get_store():
+    r"""The store the builders load from, configured by the ``OFFICIAL_NET_*`` environment variables."""
+    global _store
+    if _store is None:
+        _store = WeightStore(root=os.environ.get('OFFICIAL_NET_WEIGHTS') or None,
+                             mirror=os.environ.get('OFFICIAL_NET_MIRROR') or None,
+                             offline=os.environ.get('OFFICIAL_NET_OFFLINE', '0') not in ('', '0'))
+    return _store
+
+
+def set_store(store=None, **kwargs):
+    r"""Replaces the store of the builders by ``store`` or by ``WeightStore(**kwargs)``."""
+    global _store
+    _store = store if store is not None else WeightStore(**kwargs)
+    return _store
+
+
+def load_state_dict_from_url(url, model_dir=None, map_location=None, progress=True, check_hash=True,
+                             file_name=None):
+    r"""Drop-in for :func:`torch.hub.load_state_dict_from_url` that loads from the weight store.
+
+    ``model_dir`` uses that directory as the store, with the mirror and
+    offline settings of the configured one.
+    """
+    store = get_store()
+    if model_dir is not None:
+        store = WeightStore(model_dir, store.mirror, store.offline, progress)
+    else:
+        store.progress = progress
+    return store.load(url, map_location, check_hash, file_name)
+
+
+class _Requested(Exception):
+    pass
+
+
+class _RecordingStore(WeightStore):
+    """Raises the first URL a builder loads instead of loading it."""
+
+    def load(self, url, map_location=None, check_hash=True, file_name=None):
+        raise _Requested(file_name or os.path.basename(urlparse(url).path))
+
+
+def stand_in(directory, arch):
+    r"""Writes randomly initialized weights of ``arch`` into the mirror ``directory``.
+
+    The file is named after the one the ``pretrained=True`` builder loads, with
+    the hash of its own content, and ``aliases.json`` maps that name to it.
+    """
+    builder = getattr(importlib.import_module(__package__), arch)
+    store = get_store()
+    set_store(_RecordingStore())
+    try:
+        builder(pretrained=True)
+        raise ValueError('{} does not load pretrained weights'.format(arch))
+    except _Requested as requested:
+        original = requested.args[0]
+    finally:
+        set_store(store)
+    model = builder(pretrained=False)
+
+    os.makedirs(directory, exist_ok=True)
+    tmp = os.path.join(directory, original + '.tmp')
+    torch.save(model.state_dict(), tmp)
+    name = '%s-%s.pth' % (original.split('-')[0], _sha256(tmp)[:8])
+    os.replace(tmp, os.path.join(directory, name))
+    aliases_path = os.path.join(directory, ALIASES)
+    aliases = _read_json(aliases_path)
+    aliases[original] = name
+    with open(aliases_path, 'w') as f:
+        json.dump(aliases, f, indent=1, sort_keys=True)
+    return name
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the offline weight store of official.net.')
+    subparsers = parser.add_subparsers(dest='command')
+    parser_stand_in = subparsers.add_parser('stand-in', help='mirror of randomly initialized weights for tests')
+    parser_stand_in.add_argument('directory')
+    parser_stand_in.add_argument('--arch', nargs='+', default=['resnet18'])
+    parser_fetch = subparsers.add_parser('fetch', help='fill the configured store for the given models')
+    parser_fetch.add_argument('--arch', nargs='+', default=['resnet18'])
+    args = parser.parse_args()
+
+    if args.command == 'stand-in':
+        for arch in args.arch:
+            print('%s -> %s' % (arch, stand_in(args.directory, arch)))
+    elif args.command == 'fetch':
+        net = importlib.import_module(__package__)
+        store = get_store()
+        for arch in args.arch:
+            getattr(net, arch)(pretrained=True)
+            print('%s: ok (%s)' % (arch, store.root))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    # run the module the builders use, not this __main__ copy of it, so set_store applies to them
+    importlib.import_module('.weights', __package__).main()
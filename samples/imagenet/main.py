@@ -351,9 +351,17 @@ def validate(val_loader, model, criterion, args):
 
 
 def save_checkpoint(state, is_best, filename='checkpoint.pth.tar'):
-    torch.save(state, filename)
+    # write to a temporary name first, an interrupted save never truncates the last checkpoint
+    torch.save(state, filename + '.tmp')
+    os.replace(filename + '.tmp', filename)
     if is_best:
-        shutil.copyfile(filename, 'model_best.pth.tar')
+        # a hard link shares the data of the checkpoint instead of copying it
+        best = 'model_best.pth.tar'
+        try:
+            os.link(filename, best + '.tmp')
+        except OSError:
+            shutil.copyfile(filename, best + '.tmp')
+        os.replace(best + '.tmp', best)
 
 
 class AverageMeter(object):
@@ -1,36 +1,174 @@
+import argparse
+import hashlib
+import json
 import os
-import random
 import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-if not os.path.isdir('data'):
-  os.makedirs('data')
+SEARCH_URL = ('http://image.baidu.com/search/index?tn=baiduimage&ps=1&ct=201326592&lm=-1&cl=2&nc=1'
+              '&ie=utf-8&word=')
+MANIFEST_NAME = 'manifest.json'
 
 
-def spider_pic(html, keyword):
-  print('Looking for ' + keyword + ' Corresponding picture, download, '
-                                   'please later. ')
-  # find url address
-  for address in re.findall('"objURL":"(.*?)"', html, re.S):
-    # crawl addresses longer than 30 times, using'.' Replace what follows
-    print('Crawling over URL addresses：' + str(address)[0:30] + '...')
+def make_session(workers, retries=3):
+  r""" Build a ``requests.Session`` whose connection pool matches the worker count.
+
+  Connection errors and 5xx/429 answers are retried with exponential backoff.
+  """
+  session = requests.Session()
+  retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+  adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=retry)
+  session.mount('http://', adapter)
+  session.mount('https://', adapter)
+  return session
+
+
+def find_urls(html):
+  # find url address, keep the first occurrence of every address
+  return list(dict.fromkeys(re.findall('"objURL":"(.*?)"', html, re.S)))
+
+
+class Spider(object):
+  r""" Download image urls concurrently into a folder dataset.
 
+  Files are named after the SHA-1 of their content, so the same image served
+  under several urls is only stored once. Every finished url is recorded in
+  ``<out_dir>/manifest.json`` and skipped on the next run. The manifest is
+  written every ``save_every`` downloads and when the run ends, also if it
+  is interrupted.
+
+  Args:
+      out_dir: A directory the pictures are written to.
+      workers: Maximum number of requests in flight.
+      timeout: Per-request timeout in seconds.
+      session: Optional pre-configured ``requests.Session``.
+      save_every: Downloads between two writes of the manifest.
+
+  """
+
+  def __init__(self, out_dir='data', workers=16, timeout=10, session=None, save_every=100):
+    self.out_dir = out_dir
+    self.workers = workers
+    self.timeout = timeout
+    self.save_every = save_every
+    self.session = session or make_session(workers)
+    self.manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    self.manifest = {}
+    self.latencies = []
+    self.bytes = 0
+    self._lock = threading.Lock()
+
+    os.makedirs(out_dir, exist_ok=True)
+    if os.path.exists(self.manifest_path):
+      with open(self.manifest_path) as f:
+        self.manifest = json.load(f)
+
+  def fetch(self, address):
+    start = time.time()
     try:
-      pics = requests.get(address, timeout=10)  # 请求URL时间（最大10秒）
-    except requests.exceptions.ConnectionError:
-      print('Error occurred on your current request URL address')
-      continue
+      response = self.session.get(address, timeout=self.timeout)
+      response.raise_for_status()
+      content = response.content
+      name = hashlib.sha1(content).hexdigest() + '.jpg'
+      path = os.path.join(self.out_dir, name)
+      if not os.path.exists(path):
+        self._write(path, content)
+    except (requests.exceptions.RequestException, OSError) as e:
+      print('Error occurred on your current request URL address：' + str(address)[0:30] + '... ' + str(e))
+      return None
+    with self._lock:
+      self.latencies.append(time.time() - start)
+      self.bytes += len(content)
+      self.manifest[address] = name
+    return name
 
-    fq = open('./data/' + (str(random.randrange(0, 10000, 4)) + '.jpg'), 'wb')  # 下载图片，并保存和命名
-    fq.write(pics.content)
-    fq.close()
+  def _write(self, path, content):
+    # a unique temporary file per write: an interrupted run never leaves a partial image, and
+    # two threads fetching the same image each rename their own complete copy into place
+    fd, tmp = tempfile.mkstemp(dir=self.out_dir, suffix='.part')
+    try:
+      with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+      os.chmod(tmp, 0o644)
+      os.replace(tmp, path)
+    except BaseException:
+      os.remove(tmp)
+      raise
+
+  def save_manifest(self):
+    with self._lock:
+      manifest = dict(self.manifest)
+    with open(self.manifest_path + '.part', 'w') as f:
+      json.dump(manifest, f, indent=2)
+    os.replace(self.manifest_path + '.part', self.manifest_path)
+
+  def run(self, urls):
+    r""" Download every url missing from the manifest.
+
+    Returns:
+        A report dict with counts, throughput and latency percentiles.
+    """
+    pending = [address for address in urls if address not in self.manifest]
+    start = time.time()
+    names = []
+    try:
+      with ThreadPoolExecutor(max_workers=self.workers) as pool:
+        for future in as_completed([pool.submit(self.fetch, address) for address in pending]):
+          names.append(future.result())
+          if self.save_every and len(names) % self.save_every == 0:
+            self.save_manifest()
+    finally:
+      self.save_manifest()
+    return self.report(urls, names, time.time() - start)
+
+  def report(self, urls, names, elapsed):
+    latencies = sorted(self.latencies)
+
+    def percentile(q):
+      return latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else 0.
+
+    fetched = [name for name in names if name is not None]
+    return {
+      'urls': len(urls),
+      'skipped': len(urls) - len(names),
+      'fetched': len(fetched),
+      'failed': len(names) - len(fetched),
+      'unique': len(set(self.manifest.values())),
+      'seconds': elapsed,
+      'images_per_sec': len(fetched) / elapsed if elapsed > 0 else 0.,
+      'mb_per_sec': self.bytes / 2 ** 20 / elapsed if elapsed > 0 else 0.,
+      'latency_p50': percentile(0.5),
+      'latency_p95': percentile(0.95),
+    }
+
+
+def spider_pic(html, keyword, out_dir='data', workers=16):
+  print('Looking for ' + keyword + ' Corresponding picture, download, '
+                                   'please later. ')
+  report = Spider(out_dir, workers).run(find_urls(html))
+  print(f"{report['fetched']} fetched, {report['skipped']} skipped, {report['failed']} failed, "
+        f"{report['unique']} unique images. {report['images_per_sec']:.1f} img/s, "
+        f"latency p50 {report['latency_p50']:.3f}s p95 {report['latency_p95']:.3f}s.")
+  return report
 
 
 if __name__ == '__main__':
-  word = input('Please enter your search keywords:')
-  result = requests.get(
-    'http://image.baidu.com/search/index?tn=baiduimage&ps=1&ct=201326592&lm=-1&cl=2&nc=1&ie=utf-8&word=' + word)
+  parser = argparse.ArgumentParser(description='Download pictures from baidu pictures.')
+  parser.add_argument('--word', default=None, help='search keywords')
+  parser.add_argument('--outf', default='data', help='folder to output images')
+  parser.add_argument('--workers', type=int, default=16, help='maximum number of requests in flight')
+  parser.add_argument('--search-url', default=SEARCH_URL, help='search endpoint, the keyword is appended')
+  opt = parser.parse_args()
+
+  word = opt.word or input('Please enter your search keywords:')
+  result = requests.get(opt.search_url + word)
 
   # call function
-  spider_pic(result.text, word)
+  spider_pic(result.text, word, opt.outf, opt.workers)
@@ -1,16 +1,48 @@
+import argparse
 import glob
+import json
 import os.path
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 import cv2
 
+MANIFEST_NAME = 'resize_manifest.json'
 
-def convert_size(file, out_dir, width, height):
+
+def target_path(file, work_dir, out_dir, size, multi):
+  r""" ``<out_dir>[/<width>x<height>]/<relative path of file>``. """
+  rel = os.path.relpath(file, work_dir)
+  if multi:
+    return os.path.join(out_dir, f'{size[0]}x{size[1]}', rel)
+  return os.path.join(out_dir, rel)
+
+
+def convert_sizes(job):
+  r""" Decode ``file`` once and write one resized copy per target.
+
+  Args:
+      job: ``(file, [(width, height, path), ...])``.
+
+  Returns:
+      ``(file, error)``, ``error`` is ``None`` on success.
+  """
+  file, targets = job
   raw_img = cv2.imread(file)
+  if raw_img is None:
+    return file, 'cannot decode image'
   try:
-    new_img = cv2.resize(raw_img, (width, height))
-    cv2.imwrite(os.path.join(out_dir, os.path.basename(file)), new_img)
+    for width, height, path in targets:
+      if raw_img.shape[1] == width and raw_img.shape[0] == height and os.path.abspath(path) == os.path.abspath(file):
+        # already at the target size, nothing to rewrite in place
+        continue
+      # INTER_AREA is the recommended filter when shrinking
+      interpolation = cv2.INTER_AREA if width < raw_img.shape[1] else cv2.INTER_LINEAR
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+      cv2.imwrite(path, cv2.resize(raw_img, (width, height), interpolation=interpolation))
   except Exception as e:
-    print(e)
+    return file, str(e)
+  return file, None
 
 
 class Resize(object):
@@ -20,10 +52,19 @@ class Resize(object):
       work_dir: A directory for work.
       high: Pictures that need to be modified high.
       width: Pictures that need to be modified width.
+      out_dir: Where resized pictures go. default: ``work_dir`` (resize in place).
+      sizes: Extra ``(width, height)`` targets written from the same decode,
+          each into ``<out_dir>/<width>x<height>``.
+      workers: Number of worker processes. default: ``os.cpu_count()``.
+      save_every: Pictures between two writes of the manifest.
+
+  Finished files are recorded in ``<out_dir>/resize_manifest.json`` together with
+  their modification time and skipped on the next run. The manifest is written
+  every ``save_every`` pictures and when the run ends, also if it is interrupted.
 
   """
 
-  def __init__(self, work_dir, high, width):
+  def __init__(self, work_dir, high, width, out_dir=None, sizes=None, workers=None, save_every=1000):
     self.work_dir = work_dir
     self.high = high
     self.width = width
@@ -35,11 +76,101 @@ class Resize(object):
     elif self.width is None:
       raise Exception('Image width cannot be empty!')
 
-    for root in os.listdir(work_dir):
-      dirs = os.path.join(work_dir, root)
-      print(f"'{dirs}' are being resized!")
-      for img in glob.glob(dirs + '/*'):
-        if img is None:
-          raise Exception('The images in the directory must be in JPG/PNG format.')
-        convert_size(img, dirs, high, width)
-      print(f"'{dirs}' has done!")
+    self.out_dir = out_dir or work_dir
+    self.sizes = [(width, high)] + [tuple(size) for size in (sizes or []) if tuple(size) != (width, high)]
+    self.workers = workers
+    self.save_every = save_every
+    self.manifest_path = os.path.join(self.out_dir, MANIFEST_NAME)
+
+  def load_manifest(self):
+    if os.path.exists(self.manifest_path):
+      with open(self.manifest_path) as f:
+        return json.load(f)
+    return {}
+
+  def save_manifest(self, manifest):
+    os.makedirs(self.out_dir, exist_ok=True)
+    with open(self.manifest_path + '.part', 'w') as f:
+      json.dump(manifest, f)
+    os.replace(self.manifest_path + '.part', self.manifest_path)
+
+  def jobs(self, manifest):
+    r""" Returns the pending ``convert_sizes`` jobs and the number of up-to-date pictures. """
+    multi = len(self.sizes) > 1
+    key = [list(size) for size in self.sizes]
+    jobs, skipped = [], 0
+    for root in sorted(os.listdir(self.work_dir)):
+      dirs = os.path.join(self.work_dir, root)
+      for img in sorted(glob.glob(dirs + '/*')):
+        if os.path.basename(img) == MANIFEST_NAME:
+          continue
+        entry = manifest.get(os.path.relpath(img, self.work_dir))
+        if entry is not None and entry['mtime'] == os.path.getmtime(img) and entry['sizes'] == key:
+          skipped += 1
+          continue
+        targets = [(width, height, target_path(img, self.work_dir, self.out_dir, (width, height), multi))
+                   for width, height in self.sizes]
+        jobs.append((img, targets))
+    return jobs, skipped
+
+  def run(self):
+    r""" Resize every picture below ``work_dir``.
+
+    Returns:
+        A report dict with the number of converted, skipped and failed pictures
+        and the throughput in images per second.
+    """
+    manifest = self.load_manifest()
+    jobs, skipped = self.jobs(manifest)
+    key = [list(size) for size in self.sizes]
+    failed = 0
+    start = time.time()
+    try:
+      with ProcessPoolExecutor(max_workers=self.workers) as pool:
+        for done, (file, error) in enumerate(pool.map(convert_sizes, jobs, chunksize=64), 1):
+          if error is not None:
+            failed += 1
+            print(f"'{file}': {error}")
+          else:
+            # in-place resizing changes the mtime, record the new one
+            manifest[os.path.relpath(file, self.work_dir)] = {'mtime': os.path.getmtime(file), 'sizes': key}
+          if self.save_every and done % self.save_every == 0:
+            self.save_manifest(manifest)
+    finally:
+      self.save_manifest(manifest)
+    elapsed = time.time() - start
+
+    converted = len(jobs) - failed
+    report = {
+      'converted': converted,
+      'skipped': skipped,
+      'failed': failed,
+      'seconds': elapsed,
+      'images_per_sec': converted / elapsed if elapsed > 0 else 0.,
+    }
+    print(f"{report['converted']} resized, {report['skipped']} skipped, {report['failed']} failed "
+          f"in {elapsed:.1f}s ({report['images_per_sec']:.1f} img/s).")
+    return report
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Resize a folder dataset with one decode per image.')
+  parser.add_argument('--work_dir', required=True, help='dataset root, one sub folder per class')
+  parser.add_argument('--size', type=int, nargs=2, default=None, metavar=('WIDTH', 'HIGH'),
+                      help='single target size, resized in place unless --outf is given')
+  parser.add_argument('--sizes', type=int, nargs='+', default=None,
+                      help='square target sizes written to <outf>/<s>x<s>, e.g. 64 128 256')
+  parser.add_argument('--outf', default=None, help='output folder')
+  parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+  opt = parser.parse_args()
+
+  sizes = [(s, s) for s in opt.sizes or []]
+  if opt.size is not None:
+    width, high = opt.size
+  elif sizes:
+    width, high = sizes.pop(0)
+  else:
+    parser.error('one of --size or --sizes is required')
+  if sizes and opt.outf is None:
+    parser.error('--outf is required for several target sizes')
+  Resize(opt.work_dir, high, width, opt.outf, sizes, opt.workers).run()
@@ -1,5 +1,8 @@
+import argparse
 import os
 import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 import cv2
 import numpy as np
@@ -14,81 +17,164 @@ CIFAR10_VAL_DIR = CIFAR10_DIR + '/' + 'val'
 CIFAR100_TRAIN_DIR = CIFAR100_DIR + '/' + 'trains'
 CIFAR100_VAL_DIR = CIFAR100_DIR + '/' + 'val'
 
-dir_list = [CIFAR10_TRAIN_DIR, CIFAR100_TRAIN_DIR, CIFAR10_VAL_DIR, CIFAR100_VAL_DIR]
-
-# check file name is exist
-for dir_index in range(0, 4):
-  if not os.path.exists(dir_list[dir_index]):
-    os.makedirs(dir_list[dir_index])
+# every CIFAR record is a flat 3 x 32 x 32 uint8 row (channel planes R, G, B).
+IMAGE_SHAPE = (3, 32, 32)
 
 
 # extract the binaries, encoding must is 'bytes'!
 def unpickle(file):
-  fo = open(file, 'rb')
-  data = pickle.load(fo, encoding='bytes')
-  fo.close()
-  return data
-
-
-class CIFAR10(object):
-  def __init__(self):
-    # generate training data sets.
-    for j in range(1, 6):
-      # Read five files in turn.
-      data_dir = CIFAR10_DIR + '/' + "data_batch_" + str(j)
-      train_data = unpickle(data_dir)
-      print(data_dir + " is loading...")
-
-      for i in range(0, 10000):
-        # binary files are converted to images.
-        img = np.reshape(train_data[b'data'][i], (3, 32, 32))
-        img = img.transpose(1, 2, 0)
-        img_path = CIFAR10_TRAIN_DIR + '/' + str(train_data[b'labels'][i]) + '_' + str(
-          i + (j - 1) * 10000) + '.jpg'
-        cv2.imwrite(img_path, img)
-      print(data_dir + " loaded.")
-
-    print("test_batch is loading...")
-
-    # generate the validation data set.
-    val_data = CIFAR10_DIR + '/' + 'test_batch'
-    val_data = unpickle(val_data)
-    for i in range(0, 10000):
-      # binary files are converted to images
-      img = np.reshape(val_data[b'data'][i], (3, 32, 32))
-      img = img.transpose(1, 2, 0)
-      img_path = CIFAR10_VAL_DIR + '/' + str(val_data[b'labels'][i]) + '_' + str(i) + '.jpg'
-      cv2.imwrite(img_path, img)
-    print("test_batch loaded.")
-    return
-
-
-class CIFAR100(object):
-  def __init__(self):
-    # generate training data sets.
-
-    data_dir = CIFAR100_DIR + '/' + 'train'
-    train_data = unpickle(data_dir)
-    print(data_dir + " is loading...")
-
-    for i in range(0, 50000):
-      # binary files are converted to images.
-      img = np.reshape(train_data[b'data'][i], (3, 32, 32))
-      img = img.transpose(1, 2, 0)
-      img_path = CIFAR100_TRAIN_DIR + '/' + str(train_data[b'fine_labels'][i]) + '_' + str(i) + '.jpg'
-      cv2.imwrite(img_path, img)
-    print(data_dir + " loaded.")
-
-    print("test_batch is loading...")
-
-    # generate the validation data set.
-    val_data = CIFAR100_DIR + '/' + 'test'
-    val_data = unpickle(val_data)
-    for i in range(0, 10000):
-      # binary files are converted to images
-      img = np.reshape(val_data[b'data'][i], (3, 32, 32))
-      img = img.transpose(1, 2, 0)
-      img_path = CIFAR100_VAL_DIR + '/' + str(val_data[b'fine_labels'][i]) + '_' + str(i) + '.jpg'
-      cv2.imwrite(img_path, img)
-    print("test_batch loaded.")
-    return
+  with open(file, 'rb') as fo:
+    return pickle.load(fo, encoding='bytes')
+
+
+def load_batches(files, label_key):
+  r""" Read CIFAR pickles and convert every record in a single NumPy operation.
+
+  Args:
+      files: Pickled CIFAR batch files, read in order.
+      label_key: Label entry of the pickle (``b'labels'`` or ``b'fine_labels'``).
+
+  Returns:
+      A ``(N, 32, 32, 3)`` contiguous uint8 RGB array and a ``(N,)`` int64 label array.
+  """
+  images, labels = [], []
+  for file in files:
+    batch = unpickle(file)
+    images.append(np.asarray(batch[b'data'], dtype=np.uint8).reshape((-1,) + IMAGE_SHAPE))
+    labels.append(np.asarray(batch[label_key], dtype=np.int64))
+  # NCHW -> NHWC for the whole split at once.
+  images = np.ascontiguousarray(np.concatenate(images).transpose(0, 2, 3, 1))
+  return images, np.concatenate(labels)
+
+
+def _write_chunk(job):
+  out_dir, start, images, labels = job
+  for offset, (img, label) in enumerate(zip(images, labels)):
+    img_path = out_dir + '/' + str(label) + '_' + str(start + offset) + '.jpg'
+    # records are RGB, cv2 expects BGR.
+    cv2.imwrite(img_path, img[..., ::-1])
+  return len(images)
+
+
+def write_images(images, labels, out_dir, workers=None, chunk_size=1000):
+  r""" Encode images as ``<label>_<index>.jpg`` files through a process pool.
+
+  Args:
+      images: ``(N, 32, 32, 3)`` uint8 RGB array.
+      labels: ``(N,)`` label array.
+      out_dir: Directory the JPEG files are written to.
+      workers: Number of worker processes. default: ``os.cpu_count()``.
+      chunk_size: Number of images handed to a worker at a time.
+
+  Returns:
+      The number of images written.
+  """
+  os.makedirs(out_dir, exist_ok=True)
+  jobs = [(out_dir, start, images[start:start + chunk_size], labels[start:start + chunk_size])
+          for start in range(0, len(images), chunk_size)]
+  with ProcessPoolExecutor(max_workers=workers) as pool:
+    return sum(pool.map(_write_chunk, jobs))
+
+
+def write_packed(images, labels, out_dir):
+  r""" Store a split as ``images.npy`` and ``labels.npy`` in ``out_dir``.
+
+  The image file can be mapped back without copying with :func:`load_packed`.
+  """
+  os.makedirs(out_dir, exist_ok=True)
+  np.save(os.path.join(out_dir, 'images.npy'), images)
+  np.save(os.path.join(out_dir, 'labels.npy'), labels)
+  return len(images)
+
+
+def load_packed(out_dir, mmap_mode='r'):
+  r""" Map a split written by :func:`write_packed`.
+
+  Returns:
+      A read-only memory-mapped ``(N, 32, 32, 3)`` uint8 array and the label array.
+  """
+  images = np.load(os.path.join(out_dir, 'images.npy'), mmap_mode=mmap_mode)
+  labels = np.load(os.path.join(out_dir, 'labels.npy'))
+  return images, labels
+
+
+class _CIFAR(object):
+  r""" Unpack the python version of a CIFAR archive.
+
+  Args:
+      root: Directory holding the extracted pickles.
+      train_dir: Output directory of the training split.
+      val_dir: Output directory of the validation split.
+      packed: Write ``images.npy``/``labels.npy`` per split instead of loose JPEG files.
+      workers: Number of processes used to encode JPEG files.
+
+  """
+  train_files = ()
+  test_files = ()
+  label_key = b'labels'
+
+  def __init__(self, root, train_dir, val_dir, packed=False, workers=None):
+    self.root = root
+    self.train_dir = train_dir
+    self.val_dir = val_dir
+    self.packed = packed
+    self.workers = workers
+
+  def load(self, train=True):
+    files = self.train_files if train else self.test_files
+    return load_batches([self.root + '/' + file for file in files], self.label_key)
+
+  def unpack(self):
+    for train, out_dir in ((True, self.train_dir), (False, self.val_dir)):
+      start = time.time()
+      print(f"'{out_dir}' is loading...")
+      images, labels = self.load(train)
+      if self.packed:
+        count = write_packed(images, labels, out_dir)
+      else:
+        count = write_images(images, labels, out_dir, self.workers)
+      print(f"'{out_dir}' loaded. {count} images in {time.time() - start:.1f}s.")
+
+
+class CIFAR10(_CIFAR):
+  train_files = tuple('data_batch_' + str(j) for j in range(1, 6))
+  test_files = ('test_batch',)
+  label_key = b'labels'
+
+  def __init__(self, root=CIFAR10_DIR, train_dir=CIFAR10_TRAIN_DIR, val_dir=CIFAR10_VAL_DIR,
+               packed=False, workers=None):
+    super(CIFAR10, self).__init__(root, train_dir, val_dir, packed, workers)
+
+
+class CIFAR100(_CIFAR):
+  train_files = ('train',)
+  test_files = ('test',)
+  label_key = b'fine_labels'
+
+  def __init__(self, root=CIFAR100_DIR, train_dir=CIFAR100_TRAIN_DIR, val_dir=CIFAR100_VAL_DIR,
+               packed=False, workers=None):
+    super(CIFAR100, self).__init__(root, train_dir, val_dir, packed, workers)
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Unpack the python version of CIFAR10/CIFAR100.')
+  parser.add_argument('--dataset', default='cifar10', choices=['cifar10', 'cifar100'])
+  parser.add_argument('--root', default=None, help='directory holding the extracted pickles')
+  parser.add_argument('--outf', default=None, help='output directory, default: <root>')
+  parser.add_argument('--packed', action='store_true',
+                      help='write images.npy/labels.npy per split instead of JPEG files')
+  parser.add_argument('--workers', type=int, default=None, help='number of encoding processes')
+  opt = parser.parse_args()
+
+  if opt.dataset == 'cifar10':
+    dataset, train_name = CIFAR10, 'train'
+  else:
+    dataset, train_name = CIFAR100, 'trains'
+  kwargs = {'packed': opt.packed, 'workers': opt.workers}
+  if opt.root is not None:
+    kwargs['root'] = opt.root
+  outf = opt.outf or opt.root
+  if outf is not None:
+    kwargs['train_dir'] = outf + '/' + train_name
+    kwargs['val_dir'] = outf + '/' + 'val'
+  dataset(**kwargs).unpack()
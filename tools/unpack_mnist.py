@@ -1,47 +1,129 @@
+import argparse
 import os
 import struct
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 from PIL import Image
 
-data_file = '/tmp/mnist/t10k-images-idx3-ubyte'
-# It's 47040016B, but we should set to 47040000B
-data_file_size = 7840016
-data_file_size = str(data_file_size - 16) + 'B'
+try:
+  from torch.utils.data import Dataset
+except ImportError:
+  Dataset = object
 
-data_buf = open(data_file, 'rb').read()
+# IDX type codes, see http://yann.lecun.com/exdb/mnist/
+IDX_DTYPES = {
+  0x08: np.dtype('>u1'),
+  0x09: np.dtype('>i1'),
+  0x0B: np.dtype('>i2'),
+  0x0C: np.dtype('>i4'),
+  0x0D: np.dtype('>f4'),
+  0x0E: np.dtype('>f8'),
+}
 
-magic, numImages, numRows, numColumns = struct.unpack_from(
-  '>IIII', data_buf, 0)
-datas = struct.unpack_from(
-  '>' + data_file_size, data_buf, struct.calcsize('>IIII'))
-datas = np.array(datas).astype(np.uint8).reshape(
-  numImages, 1, numRows, numColumns)
+SPLITS = {
+  'train': ('train-images-idx3-ubyte', 'train-labels-idx1-ubyte'),
+  'val': ('t10k-images-idx3-ubyte', 't10k-labels-idx1-ubyte'),
+}
 
-label_file = '/tmp/mnist/t10k-labels-idx1-ubyte'
 
-# It's 60008B, but we should set to 60000B
-label_file_size = 10008
-label_file_size = str(label_file_size - 8) + 'B'
+def read_idx_header(file):
+  r""" Parse the header of an IDX file.
 
-label_buf = open(label_file, 'rb').read()
+  Returns:
+      ``(dtype, shape, offset)`` where ``offset`` is the byte position of the payload.
+  """
+  with open(file, 'rb') as f:
+    zero, type_code, ndim = struct.unpack('>HBB', f.read(4))
+    if zero != 0 or type_code not in IDX_DTYPES:
+      raise ValueError(f"'{file}' is not an IDX file.")
+    shape = struct.unpack('>' + 'I' * ndim, f.read(4 * ndim))
+  return IDX_DTYPES[type_code], shape, 4 + 4 * ndim
 
-magic, numLabels = struct.unpack_from('>II', label_buf, 0)
-labels = struct.unpack_from(
-  '>' + label_file_size, label_buf, struct.calcsize('>II'))
-labels = np.array(labels).astype(np.int64)
 
-datas_root = 'val'
-if not os.path.exists(datas_root):
-  os.mkdir(datas_root)
+def read_idx(file):
+  r""" Memory-map the payload of an IDX file without copying it.
 
-for i in range(10):
-  file_name = datas_root + os.sep + str(i)
-  if not os.path.exists(file_name):
-    os.mkdir(file_name)
+  Args:
+      file: Path to any IDX file (images or labels, any split).
 
-for ii in range(numLabels):
-  img = Image.fromarray(datas[ii, 0, 0:28, 0:28])
-  label = labels[ii]
-  file_name = datas_root + os.sep + str(label) + os.sep + str(ii) + '.png'
-  img.save(file_name)
+  Returns:
+      A read-only ``np.memmap`` with the shape stored in the header.
+  """
+  dtype, shape, offset = read_idx_header(file)
+  return np.memmap(file, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+
+def _save_chunk(job):
+  out_dir, start, images, labels = job
+  for offset, (img, label) in enumerate(zip(images, labels)):
+    Image.fromarray(img).save(out_dir + os.sep + str(label) + os.sep + str(start + offset) + '.png')
+  return len(images)
+
+
+def export_png(images_file, labels_file, out_dir, workers=None, chunk_size=1000):
+  r""" Write ``<out_dir>/<label>/<index>.png`` for every sample through a process pool.
+
+  Each worker maps the files itself, so only index ranges cross process boundaries.
+  """
+  labels = read_idx(labels_file)
+  for label in np.unique(labels):
+    os.makedirs(out_dir + os.sep + str(label), exist_ok=True)
+  starts = range(0, len(labels), chunk_size)
+  with ProcessPoolExecutor(max_workers=workers) as pool:
+    return sum(pool.map(_export_range, [(images_file, labels_file, out_dir, start, chunk_size)
+                                        for start in starts]))
+
+
+def _export_range(job):
+  images_file, labels_file, out_dir, start, chunk_size = job
+  images = read_idx(images_file)[start:start + chunk_size]
+  labels = read_idx(labels_file)[start:start + chunk_size]
+  return _save_chunk((out_dir, start, np.asarray(images), np.asarray(labels)))
+
+
+class IDXDataset(Dataset):
+  r""" MNIST/FashionMNIST dataset served straight from the memory-mapped IDX files.
+
+  Args:
+      root: Directory holding the uncompressed IDX files.
+      train: Use the training split, otherwise the t10k split.
+      transform: A function/transform that takes in a PIL image and returns a transformed version.
+      target_transform: A function/transform that takes in the target and transforms it.
+
+  """
+
+  def __init__(self, root, train=True, transform=None, target_transform=None):
+    images_file, labels_file = SPLITS['train' if train else 'val']
+    self.images = read_idx(os.path.join(root, images_file))
+    self.targets = read_idx(os.path.join(root, labels_file))
+    if len(self.images) != len(self.targets):
+      raise ValueError('Image and label files have a different number of samples.')
+    self.transform = transform
+    self.target_transform = target_transform
+
+  def __getitem__(self, index):
+    img = Image.fromarray(np.asarray(self.images[index]))
+    target = int(self.targets[index])
+    if self.transform is not None:
+      img = self.transform(img)
+    if self.target_transform is not None:
+      target = self.target_transform(target)
+    return img, target
+
+  def __len__(self):
+    return len(self.targets)
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Export MNIST/FashionMNIST IDX files to PNG folders.')
+  parser.add_argument('--root', default='/tmp/mnist', help='directory holding the IDX files')
+  parser.add_argument('--split', default='val', choices=list(SPLITS))
+  parser.add_argument('--outf', default=None, help='output directory, default: <split>')
+  parser.add_argument('--workers', type=int, default=None, help='number of encoding processes')
+  opt = parser.parse_args()
+
+  images_name, labels_name = SPLITS[opt.split]
+  count = export_png(os.path.join(opt.root, images_name), os.path.join(opt.root, labels_name),
+                     opt.outf or opt.split, opt.workers)
+  print(f'{count} images exported.')